@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'benchmarks' measures the speed of BioSim.
+
+The package makes synthetic islands and populations of any size, and times headless simulations
+of them as well as the single kernels of the simulation. The results are written as JSON, and can
+be compared with a stored baseline to find regressions. Run 'python -m benchmarks.macro --help' or
+'python -m benchmarks.micro --help' from the top directory of the repository for the command line
+interfaces.
+
+This package contains the following modules:
+
+    *   geography - Makes synthetic island geographies.
+
+    *   population - Makes initial populations for synthetic islands.
+
+    *   macro - Times whole simulations and compares the results with a baseline.
+
+    *   micro - Times the single kernels of the simulation.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'benchmarks.geography' makes synthetic island geographies for benchmarks.
+
+The geographies have a border of water, as required by Island, and land everywhere else with a
+given probability. The land cells are divided between lowland, highland and desert.
+
+This file can be imported as a module and contains the following functions:
+
+    *   synthetic_geography - Returns a random geography of a given size and land fraction.
+
+    *   land_cells - Returns the locations of the land cells of a geography.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+
+DEFAULT_LANDSCAPES = {"L": 0.6, "H": 0.3, "D": 0.1}
+
+
+def synthetic_geography(rows, cols, land_fraction=0.8, landscapes=None, seed=0):
+    """Returns a random island geography.
+
+    Parameters
+    ----------
+    rows : int
+            Number of rows, including the border of water. At least 3.
+    cols : int
+            Number of columns, including the border of water. At least 3.
+    land_fraction : float
+            Probability that a cell inside the border is land.
+    landscapes : dict
+            Probability of each land type, 'L', 'H' and 'D', for land cells. The default has
+            mostly lowland.
+    seed : int
+            Seed for the random numbers. The same seed gives the same geography.
+
+    Returns
+    -------
+    str
+        Multi-line string with the geography, with at least one land cell.
+    """
+    if rows < 3 or cols < 3:
+        raise ValueError("The island must have at least 3 rows and 3 columns.")
+    if not 0 < land_fraction <= 1:
+        raise ValueError("land_fraction must be larger than 0 and at most 1.")
+
+    if landscapes is None:
+        landscapes = DEFAULT_LANDSCAPES
+    types = list(landscapes)
+    weights = np.array([landscapes[name] for name in types], dtype=float)
+
+    rng = np.random.default_rng(seed)
+    grid = np.full((rows, cols), "W")
+    inner = rng.choice(types, size=(rows - 2, cols - 2), p=weights / weights.sum())
+    water = rng.random((rows - 2, cols - 2)) >= land_fraction
+    water[(rows - 2) // 2, (cols - 2) // 2] = False
+    inner[water] = "W"
+    grid[1:-1, 1:-1] = inner
+    return "\n".join("".join(row) for row in grid)
+
+
+def land_cells(geography):
+    """Returns the locations (row, column) of the land cells, as used for populations.
+
+    Parameters
+    ----------
+    geography : str
+            Multi-line string with the geography.
+    """
+    return [
+        (row, col)
+        for row, line in enumerate(geography.splitlines(), start=1)
+        for col, cell_type in enumerate(line, start=1)
+        if cell_type != "W"
+    ]
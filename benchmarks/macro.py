@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'benchmarks.macro' times whole simulations across a matrix of sizes.
+
+Each case of the matrix is a synthetic island of a given size, a population with a given number
+of herbivores and carnivores in every land cell, and a number of years. The case is simulated
+headless with BioSim.simulate a number of times, and the wall times are summarized. For each
+population and number of years, the scaling exponent of the time with the number of land cells
+is fitted, so the scaling of the simulation is measured instead of guessed.
+
+The results are written as JSON. A later run can be compared with a stored baseline, and the
+cases that became slower than a threshold are reported as regressions.
+
+Usage from the top directory of the repository::
+
+    python -m benchmarks.macro run --sizes 10x10 20x20 --populations 10:0 20:5 --years 20 \\
+        --output results.json
+    python -m benchmarks.macro compare baseline.json results.json --threshold 0.1
+
+This file can be imported as a module and contains the following functions:
+
+    *   run_case - Times one case.
+
+    *   run_matrix - Times all the cases of a matrix and fits the scaling exponents.
+
+    *   compare - Finds the cases that are slower than in a baseline.
+
+    *   main - Command line interface.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import argparse
+import datetime
+import json
+import numpy as np
+import platform
+import statistics
+import sys
+import time
+
+from benchmarks.geography import land_cells, synthetic_geography
+from benchmarks.population import synthetic_population
+from biosim.simulation import BioSim
+
+
+def run_case(
+    rows, cols, herbivores, carnivores, years, repeat=3, land_fraction=0.8, seed=0, warmup=1
+):
+    """Times headless simulations of one synthetic island.
+
+    Every repetition starts from the same island, population and random number seed, so they
+    simulate exactly the same years. The warm-up simulations are not timed, so imports and caches
+    filled by the first simulation of a process do not count.
+
+    Parameters
+    ----------
+    rows : int
+            Number of rows of the island.
+    cols : int
+            Number of columns of the island.
+    herbivores : int
+            Number of herbivores in each land cell.
+    carnivores : int
+            Number of carnivores in each land cell.
+    years : int
+            Number of years simulated.
+    repeat : int
+            Number of timed simulations.
+    land_fraction : float
+            Probability that a cell inside the border is land.
+    seed : int
+            Seed for the geography, the population and the simulation.
+    warmup : int
+            Number of simulations run before the timed ones.
+
+    Returns
+    -------
+    dict
+        The settings of the case, the wall time of each repetition in 'seconds', their 'min',
+        'median', 'mean' and 'stdev', 'years_per_second' from the median and the population
+        before and after the simulation.
+    """
+    geography = synthetic_geography(rows, cols, land_fraction, seed=seed)
+    population = synthetic_population(geography, herbivores, carnivores, seed=seed)
+
+    seconds = []
+    for run in range(warmup + repeat):
+        sim = BioSim(island_map=geography, ini_pop=population, seed=seed)
+        initial = sim.num_animals_per_species
+        start = time.perf_counter()
+        sim.simulate(years, vis_years=None)
+        if run >= warmup:
+            seconds.append(time.perf_counter() - start)
+
+    median = statistics.median(seconds)
+    return {
+        "name": f"{rows}x{cols}-h{herbivores}-c{carnivores}-y{years}",
+        "rows": rows,
+        "cols": cols,
+        "land_cells": len(land_cells(geography)),
+        "herbivores": herbivores,
+        "carnivores": carnivores,
+        "years": years,
+        "seconds": seconds,
+        "min": min(seconds),
+        "median": median,
+        "mean": statistics.mean(seconds),
+        "stdev": statistics.stdev(seconds) if repeat > 1 else 0.0,
+        "years_per_second": years / median,
+        "initial_population": initial,
+        "final_population": sim.num_animals_per_species,
+    }
+
+
+def run_matrix(
+    sizes, populations, years, repeat=3, land_fraction=0.8, seed=0, warmup=1, verbose=False
+):
+    """Times all combinations of sizes, populations and years.
+
+    Parameters
+    ----------
+    sizes : list
+            List of (rows, columns).
+    populations : list
+            List of (herbivores, carnivores) in each land cell.
+    years : list
+            List of numbers of years.
+    repeat : int
+            Number of timed simulations of each case.
+    land_fraction : float
+            Probability that a cell inside the border is land.
+    seed : int
+            Seed for the geographies, populations and simulations.
+    warmup : int
+            Number of untimed simulations before the timed ones of each case.
+    verbose : bool
+            If True, each case is printed when it is done.
+
+    Returns
+    -------
+    dict
+        Dictionary with 'metadata' about the machine and the run, 'results' with one dictionary
+        per case made by run_case, and 'scaling' with the fitted scaling exponents.
+    """
+    results = []
+    for num_years in years:
+        for herbivores, carnivores in populations:
+            for rows, cols in sizes:
+                result = run_case(
+                    rows,
+                    cols,
+                    herbivores,
+                    carnivores,
+                    num_years,
+                    repeat,
+                    land_fraction,
+                    seed,
+                    warmup,
+                )
+                results.append(result)
+                if verbose:
+                    print(f"{result['name']:<30} {result['median']:10.4f} s")
+
+    return {
+        "metadata": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "repeat": repeat,
+            "warmup": warmup,
+            "land_fraction": land_fraction,
+            "seed": seed,
+        },
+        "results": results,
+        "scaling": scaling(results),
+    }
+
+
+def scaling(results):
+    """Fits the exponent b in time = a * land_cells ** b for each population and number of years.
+
+    Parameters
+    ----------
+    results : list
+            Results made by run_case.
+
+    Returns
+    -------
+    list
+        One dictionary for each population and number of years with at least two island sizes,
+        with 'herbivores', 'carnivores', 'years' and 'exponent'.
+    """
+    groups = {}
+    for result in results:
+        key = (result["herbivores"], result["carnivores"], result["years"])
+        groups.setdefault(key, []).append(result)
+
+    fits = []
+    for (herbivores, carnivores, years), group in groups.items():
+        cells = np.array([result["land_cells"] for result in group], dtype=float)
+        if len(np.unique(cells)) < 2:
+            continue
+        medians = np.array([result["median"] for result in group])
+        exponent = np.polyfit(np.log(cells), np.log(medians), 1)[0]
+        fits.append(
+            {
+                "herbivores": herbivores,
+                "carnivores": carnivores,
+                "years": years,
+                "exponent": float(exponent),
+            }
+        )
+    return fits
+
+
+def compare(baseline, current, threshold=0.1):
+    """Compares the median times of the cases in two runs.
+
+    Parameters
+    ----------
+    baseline : dict
+            Results of the baseline run, as made by run_matrix.
+    current : dict
+            Results of the new run.
+    threshold : float
+            Relative slowdown of the median time reported as a regression.
+
+    Returns
+    -------
+    list
+        One dictionary per case found in both runs, with 'name', 'baseline', 'current', 'ratio'
+        of the median times and 'regression'.
+    """
+    baseline_medians = {result["name"]: result["median"] for result in baseline["results"]}
+    comparison = []
+    for result in current["results"]:
+        if result["name"] not in baseline_medians:
+            continue
+        ratio = result["median"] / baseline_medians[result["name"]]
+        comparison.append(
+            {
+                "name": result["name"],
+                "baseline": baseline_medians[result["name"]],
+                "current": result["median"],
+                "ratio": ratio,
+                "regression": ratio > 1 + threshold,
+            }
+        )
+    return comparison
+
+
+def _size(text):
+    """Parses a size given as ROWSxCOLS."""
+    rows, cols = text.lower().split("x")
+    return int(rows), int(cols)
+
+
+def _population(text):
+    """Parses a population given as HERBIVORES:CARNIVORES."""
+    herbivores, _, carnivores = text.partition(":")
+    return int(herbivores), int(carnivores or 0)
+
+
+def main(argv=None):
+    """Runs the command line interface, and returns the exit status.
+
+    Parameters
+    ----------
+    argv : list
+            Command line arguments, sys.argv[1:] if None.
+    """
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.macro", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="time a matrix of simulations")
+    run_parser.add_argument("--sizes", nargs="+", type=_size, default=[(10, 10), (20, 20)])
+    run_parser.add_argument("--populations", nargs="+", type=_population, default=[(10, 0)])
+    run_parser.add_argument("--years", nargs="+", type=int, default=[10])
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--land-fraction", type=float, default=0.8)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--warmup", type=int, default=1)
+    run_parser.add_argument("--output", help="JSON file for the results")
+
+    compare_parser = commands.add_parser("compare", help="compare results with a baseline")
+    compare_parser.add_argument("baseline", help="JSON file with the baseline results")
+    compare_parser.add_argument("current", help="JSON file with the new results")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        results = run_matrix(
+            args.sizes,
+            args.populations,
+            args.years,
+            args.repeat,
+            args.land_fraction,
+            args.seed,
+            args.warmup,
+            verbose=True,
+        )
+        for fit in results["scaling"]:
+            print(
+                f"h{fit['herbivores']}-c{fit['carnivores']}-y{fit['years']}: "
+                f"time ~ land_cells ** {fit['exponent']:.2f}"
+            )
+        if args.output is not None:
+            with open(args.output, "w") as output_file:
+                json.dump(results, output_file, indent=2)
+        return 0
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    with open(args.current) as current_file:
+        current = json.load(current_file)
+    comparison = compare(baseline, current, args.threshold)
+    for case in comparison:
+        flag = "REGRESSION" if case["regression"] else ""
+        print(
+            f"{case['name']:<30} {case['baseline']:10.4f} s {case['current']:10.4f} s "
+            f"{case['ratio']:6.2f}x {flag}"
+        )
+    return 1 if any(case["regression"] for case in comparison) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
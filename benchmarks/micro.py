@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'benchmarks.micro' times the single kernels of the simulation.
+
+Each benchmark times one kernel, like Carnivore.eat or Landscape.herbivore_reproduce, for one or
+more sizes. A benchmark is a setup function that builds the animals, cells or island the kernel
+works on, and returns a function that runs the kernel once. Only the kernel is timed. The setup is
+run again before every timed run, so kernels that change their input, like the carnivores eating
+the herbivores, always start from the same state.
+
+The random number generator is seeded before every setup and every timed run, so all runs draw the
+same random numbers. Warm-up runs are made before the timed runs, which excludes the compile time
+of the numba functions and the filling of caches.
+
+The results are summarized with minimum, median, mean, standard deviation and interquartile range,
+and can be written as JSON and compared with a baseline like the results of benchmarks.macro.
+
+Usage from the top directory of the repository::
+
+    python -m benchmarks.micro run --output micro.json
+    python -m benchmarks.micro run --only carnivore_eat animals_fitness --repeat 50
+    python -m benchmarks.micro compare baseline.json micro.json
+
+This file can be imported as a module and contains the following functions:
+
+    *   run_benchmark - Times one benchmark for one size.
+
+    *   run_all - Times all or some of the benchmarks for all their sizes.
+
+    *   main - Command line interface.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import argparse
+import json
+import numpy as np
+import platform
+import statistics
+import sys
+import time
+
+from benchmarks.geography import synthetic_geography
+from benchmarks.macro import compare
+from benchmarks.population import synthetic_population
+from biosim.animals import Animals, Herbivore, Carnivore
+from biosim.island import Island
+from biosim.landscapes import Lowland
+from biosim.simulation import BioSim
+
+
+def _herbivores(number):
+    """Makes herbivores with random ages and weights."""
+    return [
+        Herbivore(age=int(age), weight=float(weight))
+        for age, weight in zip(np.random.randint(0, 20, number), np.random.uniform(5, 60, number))
+    ]
+
+
+def _carnivores(number):
+    """Makes carnivores with random ages and weights."""
+    return [
+        Carnivore(age=int(age), weight=float(weight))
+        for age, weight in zip(np.random.randint(0, 10, number), np.random.uniform(10, 60, number))
+    ]
+
+
+def _lowland(herbivores, carnivores=0):
+    """Makes a lowland cell with food and animals."""
+    cell = Lowland()
+    cell.food_grows()
+    cell.herbivore_list = _herbivores(herbivores)
+    cell.carnivore_list = _carnivores(carnivores)
+    return cell
+
+
+def animals_fitness(animals):
+    """Computes Animals.fitness for each animal."""
+    herbivores = _herbivores(animals)
+
+    def run():
+        for herbivore in herbivores:
+            herbivore.fitness
+
+    return run
+
+
+def animals_q(calls):
+    """Calls Animals.q with scalar arguments."""
+    values = np.random.uniform(0, 60, calls).tolist()
+
+    def run():
+        for value in values:
+            Animals.q(+1, value, 40.0, 0.6)
+
+    return run
+
+
+def carnivore_eat(herbivores, carnivores):
+    """All carnivores of a cell eat from the herbivores, sorted like Landscape.carnivore_eats."""
+    prey = sorted(_herbivores(herbivores), key=lambda animal: animal.fitness)
+    predators = sorted(_carnivores(carnivores), key=lambda animal: animal.fitness, reverse=True)
+
+    def run():
+        remaining = prey
+        for carnivore in predators:
+            remaining = carnivore.eat(remaining)
+
+    return run
+
+
+def landscape_herbivore_eats(herbivores):
+    """Landscape.herbivore_eats of a lowland cell."""
+    return _lowland(herbivores).herbivore_eats
+
+
+def landscape_herbivore_reproduce(herbivores):
+    """Landscape.herbivore_reproduce of a lowland cell."""
+    return _lowland(herbivores).herbivore_reproduce
+
+
+def landscape_animals_die(herbivores, carnivores):
+    """Landscape.animals_die of a lowland cell."""
+    return _lowland(herbivores, carnivores).animals_die
+
+
+def island_migrate_animals(herbivores, carnivores):
+    """Island.migrate_animals of the middle cell of a lowland island."""
+    island = Island("WWWWW\nWLLLW\nWLLLW\nWLLLW\nWWWWW", [])
+    cell = island.island_map[(3, 3)]
+    cell.herbivore_list = _herbivores(herbivores)
+    cell.carnivore_list = _carnivores(carnivores)
+    return lambda: island.migrate_animals((3, 3))
+
+
+def _synthetic_island(size, herbivores, carnivores):
+    """Makes a synthetic island with the same number of animals in every land cell."""
+    geography = synthetic_geography(size, size, seed=0)
+    return geography, synthetic_population(geography, herbivores, carnivores, seed=0)
+
+
+def island_fitness_age_weight(size, herbivores, carnivores):
+    """Island.fitness_age_weight of a synthetic island."""
+    island = Island(*_synthetic_island(size, herbivores, carnivores))
+    return lambda: island.fitness_age_weight
+
+
+def biosim_animal_distribution(size, herbivores, carnivores):
+    """BioSim.animal_distribution of a synthetic island."""
+    geography, population = _synthetic_island(size, herbivores, carnivores)
+    sim = BioSim(island_map=geography, ini_pop=population, seed=0)
+    return lambda: sim.animal_distribution
+
+
+BENCHMARKS = {
+    "animals_fitness": (animals_fitness, [{"animals": 1000}]),
+    "animals_q": (animals_q, [{"calls": 1000}]),
+    "carnivore_eat": (
+        carnivore_eat,
+        [
+            {"herbivores": herbivores, "carnivores": carnivores}
+            for herbivores in (10, 100, 1000)
+            for carnivores in (1, 10, 50)
+        ],
+    ),
+    "landscape_herbivore_eats": (
+        landscape_herbivore_eats,
+        [{"herbivores": 100}, {"herbivores": 1000}],
+    ),
+    "landscape_herbivore_reproduce": (
+        landscape_herbivore_reproduce,
+        [{"herbivores": 100}, {"herbivores": 1000}],
+    ),
+    "landscape_animals_die": (
+        landscape_animals_die,
+        [{"herbivores": 100, "carnivores": 10}, {"herbivores": 1000, "carnivores": 100}],
+    ),
+    "island_migrate_animals": (
+        island_migrate_animals,
+        [{"herbivores": 100, "carnivores": 10}, {"herbivores": 1000, "carnivores": 100}],
+    ),
+    "island_fitness_age_weight": (
+        island_fitness_age_weight,
+        [{"size": size, "herbivores": 10, "carnivores": 2} for size in (10, 30)],
+    ),
+    "biosim_animal_distribution": (
+        biosim_animal_distribution,
+        [{"size": size, "herbivores": 10, "carnivores": 2} for size in (10, 30)],
+    ),
+}
+
+
+def run_benchmark(name, params, repeat=20, warmup=3, seed=0):
+    """Times one benchmark for one size.
+
+    Parameters
+    ----------
+    name : str
+            Name of the benchmark, a key of BENCHMARKS.
+    params : dict
+            Keyword arguments of the setup function, giving the size.
+    repeat : int
+            Number of timed runs.
+    warmup : int
+            Number of runs before the timed runs.
+    seed : int
+            Seed of the random number generator before every setup. The run is seeded with
+            seed + 1.
+
+    Returns
+    -------
+    dict
+        The 'name' of the case, the benchmark and its parameters, the time of each run in
+        'seconds' and their 'min', 'median', 'mean', 'stdev' and 'iqr'.
+    """
+    setup = BENCHMARKS[name][0]
+    seconds = []
+    random_state = np.random.get_state()
+    try:
+        for run in range(warmup + repeat):
+            np.random.seed(seed)
+            kernel = setup(**params)
+            np.random.seed(seed + 1)
+            start = time.perf_counter()
+            kernel()
+            if run >= warmup:
+                seconds.append(time.perf_counter() - start)
+    finally:
+        np.random.set_state(random_state)
+
+    quartiles = np.percentile(seconds, [25, 75])
+    label = ",".join(f"{key}={value}" for key, value in params.items())
+    return {
+        "name": f"{name}[{label}]",
+        "benchmark": name,
+        "params": params,
+        "seconds": seconds,
+        "min": min(seconds),
+        "median": statistics.median(seconds),
+        "mean": statistics.mean(seconds),
+        "stdev": statistics.stdev(seconds) if repeat > 1 else 0.0,
+        "iqr": float(quartiles[1] - quartiles[0]),
+    }
+
+
+def run_all(names=None, repeat=20, warmup=3, seed=0, verbose=False):
+    """Times benchmarks for all their sizes.
+
+    Parameters
+    ----------
+    names : list
+            Names of the benchmarks, all benchmarks if None.
+    repeat : int
+            Number of timed runs of each case.
+    warmup : int
+            Number of runs before the timed runs of each case.
+    seed : int
+            Seed of the random number generator.
+    verbose : bool
+            If True, each case is printed when it is done.
+
+    Returns
+    -------
+    dict
+        Dictionary with 'metadata' about the machine and the run, and 'results' with one
+        dictionary per case made by run_benchmark.
+    """
+    if names is None:
+        names = list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            raise KeyError(f"Unknown benchmark {name}.")
+
+    results = []
+    for name in names:
+        for params in BENCHMARKS[name][1]:
+            result = run_benchmark(name, params, repeat, warmup, seed)
+            results.append(result)
+            if verbose:
+                print(
+                    f"{result['name']:<70} {1e6 * result['median']:12.1f} us "
+                    f"+- {1e6 * result['iqr'] / 2:8.1f}"
+                )
+
+    return {
+        "metadata": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "warmup": warmup,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def main(argv=None):
+    """Runs the command line interface, and returns the exit status.
+
+    Parameters
+    ----------
+    argv : list
+            Command line arguments, sys.argv[1:] if None.
+    """
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.micro", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="time the kernels")
+    run_parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS))
+    run_parser.add_argument("--repeat", type=int, default=20)
+    run_parser.add_argument("--warmup", type=int, default=3)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", help="JSON file for the results")
+
+    compare_parser = commands.add_parser("compare", help="compare results with a baseline")
+    compare_parser.add_argument("baseline", help="JSON file with the baseline results")
+    compare_parser.add_argument("current", help="JSON file with the new results")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        results = run_all(args.only, args.repeat, args.warmup, args.seed, verbose=True)
+        if args.output is not None:
+            with open(args.output, "w") as output_file:
+                json.dump(results, output_file, indent=2)
+        return 0
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    with open(args.current) as current_file:
+        current = json.load(current_file)
+    comparison = compare(baseline, current, args.threshold)
+    for case in comparison:
+        flag = "REGRESSION" if case["regression"] else ""
+        print(f"{case['name']:<70} {case['ratio']:6.2f}x {flag}")
+    return 1 if any(case["regression"] for case in comparison) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
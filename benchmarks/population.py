@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'benchmarks.population' makes initial populations for synthetic islands.
+
+The populations are made by the Population class of examples/population_generator.py, with the
+same number of animals in every land cell of the geography.
+
+This file can be imported as a module and contains the following function:
+
+    *   synthetic_population - Returns an initial population with a given density.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import importlib.util
+import numpy as np
+import os
+
+from benchmarks.geography import land_cells
+
+_GENERATOR_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "examples",
+    "population_generator.py",
+)
+
+
+def _population_class():
+    """Loads the Population class from the examples directory, which is not a package."""
+    spec = importlib.util.spec_from_file_location("population_generator", _GENERATOR_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.Population
+
+
+Population = _population_class()
+
+
+def synthetic_population(geography, herbivores=10, carnivores=0, seed=0):
+    """Returns an initial population with the same number of animals in every land cell.
+
+    The ages and weights are drawn by Population.get_animals from the legacy numpy random number
+    generator. It is seeded here and its state is restored afterwards, so making a population
+    does not change the random numbers of anything else.
+
+    Parameters
+    ----------
+    geography : str
+            Multi-line string with the geography.
+    herbivores : int
+            Number of herbivores in each land cell.
+    carnivores : int
+            Number of carnivores in each land cell.
+    seed : int
+            Seed for the ages and weights.
+
+    Returns
+    -------
+    list
+        List of dictionaries with 'loc' and 'pop', as used by BioSim.
+    """
+    cells = land_cells(geography)
+    state = np.random.get_state()
+    np.random.seed(seed)
+    try:
+        return Population(herbivores, cells, carnivores, cells).get_animals()
+    finally:
+        np.random.set_state(state)
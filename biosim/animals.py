@@ -31,6 +31,7 @@ __email__ = "johansta@nmbu.no, sabinal@nmbu.no"
 
 import numpy as np
 
+from biosim import pools
 from numba import jit
 
 
@@ -39,6 +40,7 @@ class Animals:
     This is the Superclass for animals in BioSim
     """
 
+    __slots__ = ("_age", "_weight", "has_moved")
     params = {}
 
     @classmethod
@@ -89,6 +91,35 @@ class Animals:
         if self._age < 0:
             raise ValueError("Age must be a positive integer!")
 
+    @classmethod
+    def from_arrays(cls, ages, weights):
+        """Creates a list of animals from sequences of ages and weights.
+
+        The values are assumed to come from a simulation state, so they are not validated and no
+        birth weights are drawn. This keeps the random number stream untouched when a state is
+        restored.
+
+        Parameters
+        ----------
+        ages : sequence
+                The ages of the animals.
+        weights : sequence
+                The weights of the animals.
+
+        Returns
+        -------
+        list
+            List of new instances of the species.
+        """
+        animals = []
+        for age, weight in zip(ages, weights):
+            animal = cls.__new__(cls)
+            animal._age = age
+            animal._weight = weight
+            animal.has_moved = False
+            animals.append(animal)
+        return animals
+
     @staticmethod
     def weight_birth(weight, sigma):
         """ Calculates a birth _weight for the animal class based on Gaussian distribution.
@@ -104,7 +135,7 @@ class Animals:
         float
             The birth weight of a new animal.
         """
-        return np.random.normal(weight, sigma)
+        return pools.normal(weight, sigma)
 
     @staticmethod
     @jit
@@ -195,6 +226,28 @@ class Animals:
                 -1, self.weight, self.params["w_half"], self.params["phi_weight"]
             )
 
+    @classmethod
+    def fitness_of(cls, ages, weights):
+        """ Determines the fitness of many animals at once, like Animals.fitness.
+
+        Parameters
+        ----------
+        ages : ndarray
+                The ages of the animals.
+        weights : ndarray
+                The weights of the animals.
+
+        Returns
+        -------
+        ndarray
+            The fitness of each animal.
+        """
+        params = cls.params
+        weights = np.asarray(weights, dtype=float)
+        q_age = 1.0 / (1.0 + np.exp(params["phi_age"] * (ages - params["a_half"])))
+        q_weight = 1.0 / (1.0 + np.exp(-params["phi_weight"] * (weights - params["w_half"])))
+        return np.where(weights <= 0, 0.0, q_age * q_weight)
+
     def birth(self, nr_animals):
         r"""
         Determines if the animal should reproduce or not. Then updating the weight of the
@@ -235,7 +288,7 @@ class Animals:
             return None
 
         b_prob = min(1, self.params["gamma"] * self.fitness * (nr_animals - 1))
-        if np.random.random() < b_prob:
+        if pools.uniform() < b_prob:
             new_baby = type(self)()
             if new_baby.weight * self.params["xi"] < self.weight:
                 self._weight -= new_baby.weight * self.params["xi"]
@@ -269,11 +322,11 @@ class Animals:
             return True
 
         prob_death = self.params["omega"] * (1 - self.fitness)
-        return np.random.random() < prob_death
+        return pools.uniform() < prob_death
 
     def move(self):
         """Checks if the animal will move or not."""
-        return np.random.random() < self.fitness * self.params["mu"]
+        return pools.uniform() < self.fitness * self.params["mu"]
 
     def reset_has_moved(self):
         """Reset the 'has_moved§ value for the animal."""
@@ -283,6 +336,7 @@ class Animals:
 class Herbivore(Animals):
     """ Subclass of class Animals. This is the class for the herbivore species in Biosim."""
 
+    __slots__ = ()
     params = {
         "w_birth": 8.0,
         "sigma_birth": 1.5,
@@ -323,6 +377,7 @@ class Herbivore(Animals):
 class Carnivore(Animals):
     """Subclass of class Animals. This is the class for the carnivore species in Biosim."""
 
+    __slots__ = ()
     params = {
         "w_birth": 6.0,
         "sigma_birth": 1.0,
@@ -368,7 +423,7 @@ class Carnivore(Animals):
         bool
             Should the herbivore be killed or not.
         """
-        return np.random.random() < (self.fitness - herb.fitness) / self.params["DeltaPhiMax"]
+        return pools.uniform() < (self.fitness - herb.fitness) / self.params["DeltaPhiMax"]
 
     def eat(self, herb_sorted_least_fit):
         r"""
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'biosim.balance' splits the cells of an island into work units of about the same cost.
+
+The animals are spread very unevenly over an island. The lowland cells of BioSim.default_geography
+hold many animals each, while the desert and highland cells hold few or none, so the time it takes
+to do a cell differs a lot between the cells. Splitting the cells between the threads in parts with
+the same number of cells leaves most threads waiting for the one with the lowlands.
+
+CostModel estimates the cost of each cell from the number of animals in it and a factor for the
+cell, learned from the measured time of the work units. The cells are split into more work units
+than there are threads, with about the same estimated cost each, see CostModel.partition. Each
+thread starts on its own share of the work units, and takes work units from the end of the share
+of another thread when it runs out, see steal_work.
+
+This file can be imported as a module and contains the following class and functions:
+
+    *   CostModel - Class with the estimated cost of each cell.
+
+    *   balanced_slices - Splits costs into contiguous parts with about the same sum.
+
+    *   steal_work - Runs tasks on threads that steal tasks from each other.
+
+Notes
+-----
+    The work units are contiguous ranges of cells, and the results are returned in the order of
+    the work units, so the result of a simulation does not depend on how the work was split or
+    which thread did it.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+import time
+
+from collections import deque
+
+
+def balanced_slices(costs, parts):
+    """Splits a sequence of costs into contiguous parts with about the same total cost.
+
+    Parameters
+    ----------
+    costs : ndarray
+            Cost of each item.
+    parts : int
+            Largest number of parts.
+
+    Returns
+    -------
+    list
+        Slices of the parts, in order, none of them empty. A single item with a large cost is
+        never split, so there may be fewer parts than asked for.
+    """
+    if len(costs) == 0:
+        return []
+    cumulative = np.cumsum(costs)
+    targets = cumulative[-1] * np.arange(1, parts) / parts
+    cuts = np.searchsorted(cumulative, targets, side="right")
+    edges = np.unique(np.concatenate([[0], np.clip(cuts, 1, len(costs)), [len(costs)]]))
+    return [slice(start, stop) for start, stop in zip(edges[:-1], edges[1:])]
+
+
+class CostModel:
+    """Class for the estimated cost of doing each cell of an island."""
+
+    def __init__(self, cells, smoothing=0.5):
+        """Constructor that initiates CostModel class instances.
+
+        Parameters
+        ----------
+        cells : int
+                Number of cells of the island.
+        smoothing : float
+                Weight of the newest measurement when the factor of a cell is updated, between 0
+                and 1.
+        """
+        if not 0 <= smoothing <= 1:
+            raise ValueError("smoothing must be between 0 and 1")
+        self.factor = np.ones(cells)
+        self.smoothing = smoothing
+
+    def estimate(self, cells, animals):
+        """Returns the estimated cost of cells, which is one plus the number of animals, times
+        the factor of the cell.
+
+        Parameters
+        ----------
+        cells : ndarray
+                The cells.
+        animals : ndarray
+                Number of animals in each of the cells.
+        """
+        return self.factor[cells] * (1.0 + animals)
+
+    def partition(self, cells, animals, units):
+        """Splits cells into work units with about the same estimated cost.
+
+        Parameters
+        ----------
+        cells : ndarray
+                The cells, in the order they are done.
+        animals : ndarray
+                Number of animals in each of the cells.
+        units : int
+                Largest number of work units.
+
+        Returns
+        -------
+        list
+            Slices of cells of the work units, see balanced_slices.
+        """
+        return balanced_slices(self.estimate(cells, animals), units)
+
+    def update(self, cells, animals, units, seconds):
+        """Updates the factors of the cells from the measured time of each work unit.
+
+        The factors of the cells of a work unit that took longer than estimated, compared with
+        the other work units, are increased, and the factors of a faster work unit are decreased.
+
+        Parameters
+        ----------
+        cells : ndarray
+                The cells.
+        animals : ndarray
+                Number of animals in each of the cells.
+        units : list
+                Slices of cells of the work units.
+        seconds : list
+                Measured time of each work unit.
+        """
+        estimates = self.estimate(cells, animals)
+        predicted = np.array([estimates[unit].sum() for unit in units])
+        seconds = np.asarray(seconds, dtype=float)
+        if len(units) < 2 or np.any(seconds <= 0):
+            return
+        rates = seconds / predicted
+        rates /= rates.mean()
+        for unit, rate in zip(units, rates):
+            self.factor[cells[unit]] *= 1 - self.smoothing + self.smoothing * rate
+
+
+def steal_work(executor, threads, tasks):
+    """Runs tasks on threads, where each thread does its own share of the tasks first, and then
+    steals tasks from the end of the shares of the other threads.
+
+    Parameters
+    ----------
+    executor : concurrent.futures.ThreadPoolExecutor
+            Pool with at least threads threads.
+    threads : int
+            Number of threads.
+    tasks : list
+            Functions without arguments.
+
+    Returns
+    -------
+    results : list
+            Return value of each task, in the order of the tasks.
+    seconds : list
+            Time each task took.
+    stolen : int
+            Number of tasks done by another thread than the one they were given to.
+    """
+    shares = [deque(share.tolist()) for share in np.array_split(np.arange(len(tasks)), threads)]
+    results = [None] * len(tasks)
+    seconds = [0.0] * len(tasks)
+    stolen = [0] * threads
+
+    def work(thread):
+        while True:
+            try:
+                task = shares[thread].popleft()
+            except IndexError:
+                for other in range(thread + 1, thread + threads):
+                    try:
+                        task = shares[other % threads].pop()
+                        stolen[thread] += 1
+                        break
+                    except IndexError:
+                        continue
+                else:
+                    return
+            start = time.perf_counter()
+            results[task] = tasks[task]()
+            seconds[task] = time.perf_counter() - start
+
+    for future in [executor.submit(work, thread) for thread in range(threads)]:
+        future.result()
+    return results, seconds, sum(stolen)
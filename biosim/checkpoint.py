@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'biosim.checkpoint' stores the state of a simulation in a compact binary file.
+
+A checkpoint holds the state made by BioSim.get_state, together with the parameters of the animals
+and landscapes. The island is stored as numpy arrays: the geography, the food in each cell and the
+cell index, age and weight of every animal of each species. The random number state, the counters
+for visualization and images and the plotted animal counts are stored as well, so a simulation
+resumed from a checkpoint continues exactly like the simulation that was saved. No Python objects
+are pickled, so checkpoints are small, fast to write and safe to load.
+
+Checkpoints are written with numpy.savez, optionally compressed. Uncompressed checkpoints can be
+memory-mapped when loaded, so the animal arrays are read from disk only when they are used. Every
+checkpoint holds a SHA-256 checksum of its arrays, which is verified when it is loaded.
+
+During a simulation, checkpoints can be written by a CheckpointWriter. It writes in a background
+thread, so the simulation continues with the next year while the last state is written to disk.
+
+This file can be imported as a module and contains the following class and functions:
+
+    *   CheckpointWriter - Class that writes checkpoints to a directory in a background thread.
+
+    *   save_checkpoint - Writes a simulation state to a checkpoint file.
+
+    *   load_checkpoint - Reads a simulation state from a checkpoint file.
+
+    *   get_parameters - Returns the current parameters of the animals and landscapes.
+
+    *   set_parameters - Sets the parameters of the animals and landscapes.
+
+    *   checkpoint_file - Returns the file name of a checkpoint.
+
+    *   latest_checkpoint - Returns the newest checkpoint in a directory.
+
+Notes
+-----
+    To run this script, its required to have 'numpy' installed in the Python environment that
+    your going to run this script in.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import glob
+import hashlib
+import json
+import numpy as np
+import os
+import queue
+import struct
+import threading
+import zipfile
+
+from biosim.animals import Herbivore, Carnivore
+from biosim.landscapes import Lowland, Highland
+
+# Version 2 added the random number state, the counters and the history, version 3 the engine,
+# version 4 the seed of the random streams and version 5 the random pool.
+CHECKPOINT_VERSION = 5
+
+_PARAMETER_CLASSES = {
+    "Herbivore": Herbivore,
+    "Carnivore": Carnivore,
+    "Lowland": Lowland,
+    "Highland": Highland,
+}
+_SPECIES = ("Herbivore", "Carnivore")
+_ANIMAL_ARRAYS = ("cell", "age", "weight")
+_POOL_ARRAYS = ("uniforms", "normals", "directions")
+_WRITER_PREFIX = "checkpoint_"
+
+
+class CheckpointWriter:
+    """Class that writes checkpoints to a directory in a background thread."""
+
+    def __init__(self, directory, keep=None, compress=False, max_pending=2):
+        """Constructor that initiates CheckpointWriter class instances and starts the thread.
+
+        Parameters
+        ----------
+        directory : str
+                Directory the checkpoints are written to. It is made if it does not exist.
+        keep : int
+                Number of the checkpoints written by this writer that are kept. The oldest of them
+                are removed when more are written, other files in the directory are never removed.
+                If None, all checkpoints are kept.
+        compress : bool
+                If True, the checkpoints are compressed.
+        max_pending : int
+                Number of states that can wait to be written. When the queue is full, submit
+                waits for the writer, so memory use stays bounded if the disk is slow.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.keep = keep
+        self.compress = compress
+        self.written = []
+        self._error = None
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def submit(self, state):
+        """Hands a simulation state to the writer thread.
+
+        The state must not be changed after it is submitted. States made by BioSim.get_state are
+        copies, so they can be submitted while the simulation continues. The parameters are
+        stored as they are when the state is submitted.
+
+        Parameters
+        ----------
+        state : dict
+                Simulation state made by BioSim.get_state.
+        """
+        self._raise_error()
+        self._queue.put((state, get_parameters()))
+
+    def close(self):
+        """Waits until all submitted states are written, and stops the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        """Raises the error that stopped the writer thread, if there is one."""
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Writing checkpoint failed.") from error
+
+    def _run(self):
+        """Writes states from the queue until close is called."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is None:
+                try:
+                    self._write(*item)
+                except Exception as err:
+                    self._error = err
+
+    def _write(self, state, params):
+        """Writes one checkpoint to a temporary file and renames it when it is complete."""
+        file = os.path.join(self.directory, f"{_WRITER_PREFIX}{state['year']:08d}.npz")
+        temporary_file = file + ".tmp"
+        with open(temporary_file, "wb") as save_file:
+            save_checkpoint(save_file, state, self.compress, params)
+            save_file.flush()
+            os.fsync(save_file.fileno())
+        os.replace(temporary_file, file)
+        if file in self.written:
+            self.written.remove(file)
+        self.written.append(file)
+
+        if self.keep is not None:
+            while len(self.written) > self.keep:
+                os.remove(self.written.pop(0))
+
+
+def get_parameters():
+    """Returns a copy of the current parameters of the animals and landscapes.
+
+    Returns
+    -------
+    dict
+        Dictionary with one parameter dictionary for each species and landscape type.
+    """
+    return {name: dict(cls.params) for name, cls in _PARAMETER_CLASSES.items()}
+
+
+def set_parameters(params):
+    """Sets the parameters of the animals and landscapes from a dictionary made by get_parameters.
+
+    Parameters
+    ----------
+    params : dict
+            Dictionary with one parameter dictionary for each species and landscape type.
+    """
+    for name, values in params.items():
+        _PARAMETER_CLASSES[name].params.update(values)
+
+
+def checkpoint_file(name):
+    """Returns the file name of a checkpoint, adding the '.npz' extension if it is missing."""
+    return name if name.endswith(".npz") else name + ".npz"
+
+
+def latest_checkpoint(directory):
+    """Returns the newest checkpoint written to a directory by a CheckpointWriter.
+
+    Parameters
+    ----------
+    directory : str
+            Directory with checkpoints.
+
+    Returns
+    -------
+    str
+        File name of the checkpoint with the highest year, or None if there are no checkpoints.
+    """
+    files = sorted(glob.glob(os.path.join(directory, _WRITER_PREFIX + "*.npz")))
+    return files[-1] if files else None
+
+
+def save_checkpoint(file, state, compress=False, params=None):
+    """Writes a simulation state and the parameters to a checkpoint file.
+
+    Parameters
+    ----------
+    file : str or file
+            File name or open binary file the checkpoint is written to.
+    state : dict
+            Simulation state made by BioSim.get_state.
+    compress : bool
+            If True, the arrays are compressed. Compressed checkpoints can not be memory-mapped.
+    params : dict
+            Parameters made by get_parameters. If None, the current parameters are stored.
+    """
+    if params is None:
+        params = get_parameters()
+
+    island = state["island"]
+    arrays = {
+        "version": np.array(CHECKPOINT_VERSION),
+        "year": np.array(state["year"]),
+        "engine": np.array(state.get("engine", "reference")),
+        "geography": np.array(island["geography"]),
+        "params": np.array(json.dumps(params)),
+        "food": island["food"],
+    }
+    for species in _SPECIES:
+        for name in _ANIMAL_ARRAYS:
+            arrays[f"{species}_{name}"] = island[species][name]
+
+    if state.get("random_state") is not None:
+        _, key, pos, has_gauss, cached_gaussian = state["random_state"]
+        arrays["random_key"] = key
+        arrays["random_values"] = np.array([pos, has_gauss, cached_gaussian], dtype=float)
+    if state.get("random_streams") is not None:
+        # A seed drawn from the operating system is too large for an integer array.
+        arrays["random_streams"] = np.array(str(state["random_streams"]))
+    if state.get("random_pool") is not None:
+        pool = state["random_pool"]
+        arrays["pool_generator"] = np.array(json.dumps([pool["block"], pool["bit_generator"]]))
+        for name in _POOL_ARRAYS:
+            arrays[f"pool_{name}"] = pool[name]
+    for name in ("count", "image_counter"):
+        if name in state:
+            arrays[name] = np.array(state[name])
+    if state.get("history") is not None:
+        for species in _SPECIES:
+            arrays[f"history_{species}"] = state["history"][species]
+    arrays["checksum"] = np.array(_checksum(arrays))
+
+    if compress:
+        np.savez_compressed(file, **arrays)
+    else:
+        np.savez(file, **arrays)
+
+
+def load_checkpoint(file, mmap=False, verify=True):
+    """Reads a simulation state from a checkpoint file.
+
+    Parameters
+    ----------
+    file : str
+            File name of the checkpoint.
+    mmap : bool
+            If True, the arrays of an uncompressed checkpoint are memory-mapped read-only instead
+            of read into memory.
+    verify : bool
+            If True, the checksum stored in the checkpoint is verified. This reads all the arrays,
+            so it can be turned off to keep memory-mapped arrays on disk.
+
+    Returns
+    -------
+    dict
+        Simulation state with the same layout as BioSim.get_state, and the parameters stored with
+        the checkpoint under the key 'params'. Checkpoints of version 1 have no random number
+        state, counters or history, and checkpoints before version 3 have no engine, so they are
+        resumed with the reference engine.
+    """
+    if mmap:
+        arrays = _memory_map_npz(file)
+    else:
+        with np.load(file) as npz:
+            arrays = {key: npz[key] for key in npz.files}
+
+    version = int(arrays["version"])
+    if version > CHECKPOINT_VERSION:
+        raise ValueError(f"Checkpoint version {version} is not supported by this version.")
+
+    checksum = arrays.pop("checksum", None)
+    if verify and checksum is not None and str(checksum) != _checksum(arrays):
+        raise ValueError(f"Checkpoint {file} is corrupt, the checksum does not match.")
+
+    island = {"geography": str(arrays["geography"]), "food": arrays["food"]}
+    for species in _SPECIES:
+        island[species] = {name: arrays[f"{species}_{name}"] for name in _ANIMAL_ARRAYS}
+
+    state = {
+        "year": int(arrays["year"]),
+        "engine": str(arrays["engine"]) if "engine" in arrays else "reference",
+        "island": island,
+        "params": json.loads(str(arrays["params"])),
+    }
+    if "random_key" in arrays:
+        pos, has_gauss, cached_gaussian = np.asarray(arrays["random_values"]).tolist()
+        state["random_state"] = (
+            "MT19937",
+            np.array(arrays["random_key"], dtype=np.uint32),
+            int(pos),
+            int(has_gauss),
+            cached_gaussian,
+        )
+    if "random_streams" in arrays:
+        state["random_streams"] = int(str(arrays["random_streams"]))
+    if "pool_generator" in arrays:
+        block, bit_generator = json.loads(str(arrays["pool_generator"]))
+        state["random_pool"] = {"block": block, "bit_generator": bit_generator}
+        for name in _POOL_ARRAYS:
+            state["random_pool"][name] = np.array(arrays[f"pool_{name}"])
+    for name in ("count", "image_counter"):
+        if name in arrays:
+            state[name] = int(arrays[name])
+    if "history_Herbivore" in arrays:
+        state["history"] = {species: np.array(arrays[f"history_{species}"]) for species in _SPECIES}
+    return state
+
+
+def _checksum(arrays):
+    """Returns the SHA-256 checksum of the names, types, shapes and data of the arrays."""
+    digest = hashlib.sha256()
+    for key in sorted(arrays):
+        array = np.ascontiguousarray(arrays[key])
+        digest.update(f"{key}:{array.dtype.str}:{array.shape};".encode())
+        digest.update(array.reshape(-1).view(np.uint8))
+    return digest.hexdigest()
+
+
+def _memory_map_npz(file):
+    """Memory-maps the arrays of an uncompressed npz file, and reads compressed arrays."""
+    arrays = {}
+    with zipfile.ZipFile(file) as archive, open(file, "rb") as raw:
+        for info in archive.infolist():
+            key = info.filename[: -len(".npy")]
+            if info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    arrays[key] = np.lib.format.read_array(member)
+                continue
+
+            raw.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack("<HH", raw.read(4))
+            raw.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(raw)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(raw)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(raw)
+
+            if dtype.hasobject or 0 in shape or shape == ():
+                raw.seek(info.header_offset + 30 + name_length + extra_length)
+                arrays[key] = np.lib.format.read_array(raw)
+            else:
+                arrays[key] = np.memmap(
+                    file,
+                    dtype=dtype,
+                    mode="r",
+                    offset=raw.tell(),
+                    shape=shape,
+                    order="F" if fortran_order else "C",
+                )
+    return arrays
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'biosim.compiled' provides an annual cycle of Rossumøya with compiled kernels.
+
+CompiledIsland stores the animals as arrays like VectorizedIsland, and uses the same vectorized
+phases. The hunting of the carnivores, where each carnivore changes the chances of the next one,
+can not be done for all animals at once. It is done by a kernel compiled with numba instead, which
+goes through the carnivores and herbivores one at a time like the reference engine, without the
+cost of Python objects.
+
+The kernels are compiled the first time they are used, and the compiled code is cached on disk.
+
+This file can be imported as a module and contains the following class and functions:
+
+    *   hunt_cell - Kernel for the hunting in one cell.
+
+    *   hunt_kernel - Kernel for the hunting in many cells.
+
+    *   CompiledIsland - Class with the annual cycle of Rossumøya using compiled kernels.
+
+Notes
+-----
+    To run this script, its required to have 'numpy' and 'numba' installed in the Python
+    environment that your going to run this script in.
+
+    Numba has its own random number generator. The kernels are seeded with a number drawn from
+    the global numpy generator, so simulations are still reproducible from the seed of BioSim.
+    With random streams, the hunting kernel is seeded for each cell from the stream of the cell.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+
+from biosim.animals import Herbivore, Carnivore
+from biosim.vectorized import VectorizedIsland
+from numba import njit
+
+
+@njit(cache=True, nogil=True)
+def _weight_fitness(weight, w_half, phi_weight):
+    """The weight factor of the fitness."""
+    return 1.0 / (1.0 + np.exp(-phi_weight * (weight - w_half)))
+
+
+@njit(cache=True, nogil=True)
+def hunt_cell(
+    alive,
+    herb_start,
+    herb_stop,
+    herb_fitness,
+    herb_weight,
+    carn_start,
+    carn_stop,
+    carn_age_fitness,
+    carn_weight,
+    appetite,
+    beta,
+    delta_phi_max,
+    w_half,
+    phi_weight,
+):
+    """Lets the carnivores of one cell hunt the herbivores of the cell, like
+    Landscape.carnivore_eats and Carnivore.eat.
+
+    The weights of the carnivores are updated in place, and the herbivores that are killed are
+    set to False in alive. The arguments are described in hunt_kernel.
+    """
+    prey = herb_start + np.argsort(herb_fitness[herb_start:herb_stop], kind="mergesort")
+
+    carn_fitness = np.empty(carn_stop - carn_start)
+    for hunter in range(carn_start, carn_stop):
+        weight = carn_weight[hunter]
+        if weight <= 0:
+            carn_fitness[hunter - carn_start] = 0.0
+        else:
+            carn_fitness[hunter - carn_start] = carn_age_fitness[hunter] * _weight_fitness(
+                weight, w_half, phi_weight
+            )
+    hunters = carn_start + np.argsort(-carn_fitness, kind="mergesort")
+
+    for hunter in hunters:
+        weight = carn_weight[hunter]
+        eaten = 0.0
+        for herb in prey:
+            if not alive[herb]:
+                continue
+            if eaten >= appetite:
+                break
+            if weight <= 0:
+                fitness = 0.0
+            else:
+                fitness = carn_age_fitness[hunter] * _weight_fitness(weight, w_half, phi_weight)
+            if herb_fitness[herb] >= fitness:
+                break
+            if np.random.random() < (fitness - herb_fitness[herb]) / delta_phi_max:
+                alive[herb] = False
+                if herb_weight[herb] + eaten < appetite:
+                    eaten += herb_weight[herb]
+                    weight += herb_weight[herb] * beta
+                else:
+                    weight += (appetite - eaten) * beta
+                    eaten = appetite
+        carn_weight[hunter] = weight
+
+
+@njit(cache=True)
+def hunt_kernel(
+    seeds,
+    cells,
+    herb_starts,
+    herb_stops,
+    herb_fitness,
+    herb_weight,
+    carn_starts,
+    carn_stops,
+    carn_age_fitness,
+    carn_weight,
+    appetite,
+    beta,
+    delta_phi_max,
+    w_half,
+    phi_weight,
+):
+    """Lets the carnivores of each cell hunt the herbivores of the cell, like
+    Landscape.carnivore_eats and Carnivore.eat.
+
+    The weights of the carnivores are updated in place.
+
+    Parameters
+    ----------
+    seeds : ndarray
+            Seeds of the random number generator of numba. With one seed for each cell, the
+            generator is seeded again before each cell, otherwise it is seeded once with the
+            first seed.
+    cells : ndarray
+            The cells with both herbivores and carnivores.
+    herb_starts, herb_stops : ndarray
+            The range of the herbivores of each of these cells in the herbivore arrays.
+    herb_fitness, herb_weight : ndarray
+            Fitness and weight of all herbivores.
+    carn_starts, carn_stops : ndarray
+            The range of the carnivores of each of these cells in the carnivore arrays.
+    carn_age_fitness : ndarray
+            The age factor of the fitness of all carnivores, which does not change while they
+            eat.
+    carn_weight : ndarray
+            Weight of all carnivores.
+    appetite, beta, delta_phi_max, w_half, phi_weight : float
+            Parameters of the carnivores.
+
+    Returns
+    -------
+    ndarray
+        Boolean array, True for the herbivores that are still alive.
+    """
+    if len(seeds) > 0:
+        np.random.seed(seeds[0])
+    alive = np.ones(len(herb_fitness), dtype=np.bool_)
+    for index in range(len(cells)):
+        if len(seeds) == len(cells):
+            np.random.seed(seeds[index])
+        hunt_cell(
+            alive,
+            herb_starts[index],
+            herb_stops[index],
+            herb_fitness,
+            herb_weight,
+            carn_starts[index],
+            carn_stops[index],
+            carn_age_fitness,
+            carn_weight,
+            appetite,
+            beta,
+            delta_phi_max,
+            w_half,
+            phi_weight,
+        )
+    return alive
+
+
+class CompiledIsland(VectorizedIsland):
+    """Class for the island of Rossumøya with the hunting done by compiled kernels."""
+
+    def _carnivores_eat(self, cells):
+        """The carnivores of each cell hunt, fittest first, for the least fit herbivores.
+
+        Parameters
+        ----------
+        cells: dict
+                Arrays of the animals of each species in the cells that are done, sorted by cell.
+        """
+        herbivores, carnivores = cells["Herbivore"], cells["Carnivore"]
+        if len(herbivores["cell"]) == 0 or len(carnivores["cell"]) == 0:
+            return
+        params = Carnivore.params
+
+        hunted = np.intersect1d(herbivores["cell"], carnivores["cell"])
+        if len(hunted) == 0:
+            return
+        carn_age_fitness = 1.0 / (
+            1.0 + np.exp(params["phi_age"] * (carnivores["age"] - params["a_half"]))
+        )
+        if self.streams is None:
+            seeds = np.array([np.random.randint(2 ** 31)])
+        else:
+            seeds = self.streams.integers(self.year, "carnivore_eats", hunted, 2 ** 31)
+        alive = hunt_kernel(
+            seeds,
+            hunted,
+            np.searchsorted(herbivores["cell"], hunted),
+            np.searchsorted(herbivores["cell"], hunted, side="right"),
+            self._fitness(Herbivore.params, herbivores["age"], herbivores["weight"]),
+            herbivores["weight"],
+            np.searchsorted(carnivores["cell"], hunted),
+            np.searchsorted(carnivores["cell"], hunted, side="right"),
+            carn_age_fitness,
+            carnivores["weight"],
+            float(params["F"]),
+            float(params["beta"]),
+            float(params["DeltaPhiMax"]),
+            float(params["w_half"]),
+            float(params["phi_weight"]),
+        )
+        for key in herbivores:
+            herbivores[key] = herbivores[key][alive]
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'biosim.golden' records golden trajectories of simulations, and finds where a new run differs.
+
+A refactoring that should not change the behaviour of the simulation, like a faster
+Island.cycle_island or faster methods of the cells, must give exactly the same simulation for the
+same seed. A GoldenRecorder is attached to a simulation like the other recorders, and keeps for
+every year the number of animals of each species and a hash of the animals in each cell. The
+animals of a cell are sorted by age and weight before they are hashed, so the hash only depends on
+which animals are in the cell, not on their order in the cell.
+
+A recorder saved to a golden file is compared with a new run by GoldenRecorder.diff, which gives
+the first year that differs and the cells that differ in that year.
+
+Usage from the top directory of the repository::
+
+    python -m biosim.golden record golden.json --scenario check_sim --seed 123456 --years 50
+    python -m biosim.golden check golden.json
+
+This file can be imported as a module and contains the following class and functions:
+
+    *   GoldenRecorder - Class that records the counts and hashes of the cells of a simulation.
+
+    *   record_golden - Simulates a scenario and saves its golden trajectory.
+
+    *   check_golden - Simulates the scenario of a golden file again and compares the runs.
+
+    *   main - Command line interface.
+
+Notes
+-----
+    The weights are hashed exactly, so a change in the order of floating point operations gives a
+    different hash. With decimals, the weights are rounded before they are hashed.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import argparse
+import hashlib
+import json
+import numpy as np
+import sys
+
+from biosim.validation import SCENARIOS, simulate_scenario
+
+
+class GoldenRecorder:
+    """Class for recording the counts and the hashes of the cells of every year of a simulation."""
+
+    species = ("Herbivore", "Carnivore")
+
+    def __init__(self, decimals=None, metadata=None):
+        """Constructor that initiates GoldenRecorder class instances.
+
+        Parameters
+        ----------
+        decimals : int
+                Number of decimals the weights are rounded to before they are hashed. If None,
+                the weights are hashed exactly.
+        metadata : dict
+                Information saved with the recorder, like the scenario and the seed.
+        """
+        self.decimals = decimals
+        self.metadata = {} if metadata is None else dict(metadata)
+        self.years = []
+
+    def __len__(self):
+        return len(self.years)
+
+    def record(self, sim):
+        """Records the current year of a simulation.
+
+        Parameters
+        ----------
+        sim : BioSim
+                The simulation that is recorded.
+        """
+        state = sim.island.get_state()
+        self.years.append(
+            {
+                "year": sim.year,
+                "counts": dict(sim.num_animals_per_species),
+                "cells": self.cell_hashes(state),
+            }
+        )
+
+    def cell_hashes(self, state):
+        """Returns the hashes of the animals in each cell.
+
+        Parameters
+        ----------
+        state : dict
+                State of an island, made by Island.get_state.
+
+        Returns
+        -------
+        dict
+            Dictionary from the location 'row,col' of each cell with animals to the hash of its
+            animals.
+        """
+        cols = len(state["geography"].splitlines()[0])
+        hashes = {}
+        for index, name in enumerate(self.species):
+            animals = state[name]
+            cells = np.asarray(animals["cell"], dtype=np.int64)
+            ages = np.asarray(animals["age"], dtype=np.int64)
+            weights = np.asarray(animals["weight"], dtype=np.float64)
+            if self.decimals is not None:
+                weights = np.round(weights, self.decimals)
+            order = np.lexsort((weights, ages, cells))
+            cells, ages, weights = cells[order], ages[order], weights[order]
+
+            starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]]) if len(cells) else []
+            stops = list(starts[1:]) + [len(cells)]
+            for start, stop in zip(starts, stops):
+                digest = hashes.setdefault(int(cells[start]), hashlib.sha1())
+                digest.update(bytes([index]))
+                digest.update(ages[start:stop].tobytes())
+                digest.update(weights[start:stop].tobytes())
+
+        return {
+            f"{cell // cols + 1},{cell % cols + 1}": digest.hexdigest()[:16]
+            for cell, digest in sorted(hashes.items())
+        }
+
+    def diff(self, other):
+        """Finds the first year where another recorder differs from this one.
+
+        Parameters
+        ----------
+        other : GoldenRecorder
+                Recorder of the new run.
+
+        Returns
+        -------
+        dict
+            None if the runs are the same. Otherwise the first 'year' that differs, the 'counts'
+            of both runs in that year as (golden, new), and the 'cells' that differ as (row, col)
+            locations. If one run has more years than the other, 'cells' is empty for the first
+            year that is missing.
+        """
+        for golden, new in zip(self.years, other.years):
+            if golden == new:
+                continue
+            locations = set(golden["cells"]) | set(new["cells"])
+            cells = [
+                tuple(int(number) for number in location.split(","))
+                for location in locations
+                if golden["cells"].get(location) != new["cells"].get(location)
+            ]
+            return {
+                "year": golden["year"],
+                "counts": (golden["counts"], new["counts"]),
+                "cells": sorted(cells),
+            }
+
+        if len(self.years) != len(other.years):
+            longer = self.years if len(self.years) > len(other.years) else other.years
+            missing = longer[min(len(self.years), len(other.years))]
+            return {"year": missing["year"], "counts": None, "cells": []}
+        return None
+
+    def save(self, file):
+        """Saves the recorder to a JSON file.
+
+        Parameters
+        ----------
+        file : str
+                Name of the golden file.
+        """
+        with open(file, "w") as golden_file:
+            json.dump(
+                {"decimals": self.decimals, "metadata": self.metadata, "years": self.years},
+                golden_file,
+                indent=1,
+            )
+
+    @classmethod
+    def load(cls, file):
+        """Reads a recorder from a golden file.
+
+        Parameters
+        ----------
+        file : str
+                Name of the golden file.
+        """
+        with open(file) as golden_file:
+            data = json.load(golden_file)
+        recorder = cls(data["decimals"], data["metadata"])
+        recorder.years = data["years"]
+        return recorder
+
+
+def record_golden(
+    file, scenario="check_sim", seed=123456, years=None, engine="reference", decimals=None
+):
+    """Simulates a scenario and saves its golden trajectory.
+
+    Parameters
+    ----------
+    file : str
+            Name of the golden file.
+    scenario : str
+            Name of a scenario in biosim.validation.SCENARIOS.
+    seed : int
+            Seed of the simulation.
+    years : int
+            Number of years simulated, all the years of the scenario if None.
+    engine : str
+            Name of the engine, a key of BioSim.engines.
+    decimals : int
+            Number of decimals of the weights, exact if None.
+
+    Returns
+    -------
+    GoldenRecorder
+        The recorder that was saved.
+    """
+    metadata = {"scenario": scenario, "seed": seed, "years": years, "engine": engine}
+    recorder = GoldenRecorder(decimals, metadata)
+    simulate_scenario(_scenario(scenario, years), engine, seed, [recorder])
+    recorder.save(file)
+    return recorder
+
+
+def check_golden(file, engine=None):
+    """Simulates the scenario of a golden file again and compares the runs.
+
+    Parameters
+    ----------
+    file : str
+            Name of the golden file.
+    engine : str
+            Name of the engine, the engine of the golden file if None.
+
+    Returns
+    -------
+    dict
+        The first difference, see GoldenRecorder.diff, None if the runs are the same.
+    """
+    golden = GoldenRecorder.load(file)
+    metadata = golden.metadata
+    recorder = GoldenRecorder(golden.decimals, metadata)
+    simulate_scenario(
+        _scenario(metadata["scenario"], metadata["years"]),
+        metadata["engine"] if engine is None else engine,
+        metadata["seed"],
+        [recorder],
+    )
+    return golden.diff(recorder)
+
+
+def _scenario(name, years):
+    """Returns a named scenario, shortened to years if given."""
+    if name not in SCENARIOS:
+        raise KeyError(f"Unknown scenario {name}, use one of {', '.join(SCENARIOS)}.")
+    scenario = SCENARIOS[name]()
+    if years is not None:
+        scenario["years"] = years
+    return scenario
+
+
+def main(argv=None):
+    """Runs the command line interface, and returns the exit status.
+
+    Parameters
+    ----------
+    argv : list
+            Command line arguments, sys.argv[1:] if None.
+    """
+    parser = argparse.ArgumentParser(prog="python -m biosim.golden", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="record a golden file")
+    record_parser.add_argument("file")
+    record_parser.add_argument("--scenario", choices=list(SCENARIOS), default="check_sim")
+    record_parser.add_argument("--seed", type=int, default=123456)
+    record_parser.add_argument("--years", type=int)
+    record_parser.add_argument("--engine", default="reference")
+    record_parser.add_argument("--decimals", type=int)
+
+    check_parser = commands.add_parser("check", help="compare a new run with a golden file")
+    check_parser.add_argument("file")
+    check_parser.add_argument("--engine")
+
+    args = parser.parse_args(argv)
+    if args.command == "record":
+        recorder = record_golden(
+            args.file, args.scenario, args.seed, args.years, args.engine, args.decimals
+        )
+        print(f"Recorded {len(recorder)} years to {args.file}")
+        return 0
+
+    difference = check_golden(args.file, args.engine)
+    if difference is None:
+        print("Same as the golden file")
+        return 0
+    print(f"First difference in year {difference['year']}")
+    if difference["counts"] is not None:
+        golden, new = difference["counts"]
+        print(f"Counts: golden {golden}, new {new}")
+    for row, col in difference["cells"]:
+        print(f"Cell ({row}, {col})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'biosim.history' stores the number of animals in every cell for every year on disk.
+
+The counts are appended to a preallocated numpy.memmap with shape (years, rows, columns, species),
+so the history of a run can be much larger than the memory of the machine. A small index holds the
+sums of the counts over square tiles of cells for every year. Queries use the index to find the
+years that can match, and only read those parts of the history from disk.
+
+A history is attached to a simulation by BioSim.add_recorder, like a TimeSeriesRecorder. It is
+stored in three files sharing a base name:
+
+    *   base.json - Shape, tile size, stride, first year and number of years recorded.
+    *   base.dat - The counts, as int32 in C order.
+    *   base.idx - The tile sums, as int64 in C order.
+
+This file can be imported as a module and contains the following class:
+
+    *   CellHistory - Class that records and queries the counts of every cell.
+
+Notes
+-----
+    To run this script, its required to have 'numpy' installed in the Python environment that
+    your going to run this script in.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import json
+import numpy as np
+import os
+
+
+class CellHistory:
+    """Class for the memory-mapped history of the animal counts in every cell."""
+
+    species = ("Herbivore", "Carnivore")
+
+    def __init__(self, base, stride=1, capacity=1024, tile=8):
+        """Constructor that initiates CellHistory class instances for a new history.
+
+        The files are made when the first year is recorded. Use CellHistory.open to read or
+        continue an existing history.
+
+        Parameters
+        ----------
+        base : str
+                Beginning of the file names, including path.
+        stride : int
+                Years between recorded years. Years that are a multiple of stride are recorded.
+        capacity : int
+                Number of years the files are made for. The files grow when they are full.
+        tile : int
+                Number of rows and columns of cells summed in each tile of the index.
+        """
+        if stride < 1 or capacity < 1 or tile < 1:
+            raise ValueError("stride, capacity and tile must be positive integers")
+
+        self.base = base
+        self.stride = stride
+        self.tile = tile
+        self.start = None
+        self.shape = None
+        self._capacity = capacity
+        self._length = 0
+        self._mode = "w+"
+        self._data = None
+        self._index = None
+
+    @classmethod
+    def open(cls, base, mode="r"):
+        """Opens an existing history.
+
+        Parameters
+        ----------
+        base : str
+                Beginning of the file names, including path.
+        mode : str
+                'r' to only read the history, 'r+' to also record more years.
+
+        Returns
+        -------
+        CellHistory
+            The history.
+        """
+        with open(base + ".json") as meta_file:
+            meta = json.load(meta_file)
+
+        history = cls(base, meta["stride"], meta["capacity"], meta["tile"])
+        history.start = meta["start"]
+        history.shape = tuple(meta["shape"])
+        history._length = meta["length"]
+        history._mode = mode
+        history._map_files()
+        return history
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        """Number of years recorded."""
+        return self._length
+
+    @property
+    def years(self):
+        """Array with the recorded years."""
+        if self.start is None:
+            return np.zeros(0, dtype=int)
+        return self.start + self.stride * np.arange(self._length)
+
+    def record(self, sim):
+        """Records the counts of the current year of a simulation if it is a multiple of stride.
+
+        Parameters
+        ----------
+        sim : BioSim
+                The simulation that is recorded.
+        """
+        if sim.year % self.stride == 0:
+            self.append(sim.year, sim.island.count_grid())
+
+    def append(self, year, grid):
+        """Appends the counts of one year to the history.
+
+        Parameters
+        ----------
+        year : int
+                The year of the counts. It must follow the last recorded year by stride years.
+        grid : ndarray
+                Array with shape (rows, columns, species) with the counts of every cell.
+        """
+        if self._mode == "r":
+            raise ValueError("The history is opened read-only.")
+
+        if self.start is None:
+            self.start = year
+            self.shape = grid.shape
+            self._map_files()
+        elif year != self.start + self._length * self.stride:
+            raise ValueError(
+                f"Year {year} does not follow the last recorded year "
+                f"{self.start + (self._length - 1) * self.stride}."
+            )
+        elif grid.shape != self.shape:
+            raise ValueError("The counts must have the same shape for every year.")
+
+        if self._length == self._capacity:
+            self._capacity *= 2
+            self._map_files()
+
+        self._data[self._length] = grid
+        self._index[self._length] = self._tile_sums(grid)
+        self._length += 1
+
+    def flush(self):
+        """Writes the recorded years and the description of the history to disk."""
+        if self._data is None or self._mode == "r":
+            return
+
+        self._data.flush()
+        self._index.flush()
+        meta = {
+            "shape": list(self.shape),
+            "tile": self.tile,
+            "stride": self.stride,
+            "start": self.start,
+            "length": self._length,
+            "capacity": self._capacity,
+        }
+        with open(self.base + ".json", "w") as meta_file:
+            json.dump(meta, meta_file)
+
+    def close(self):
+        """Writes the history to disk and closes the memory maps."""
+        self.flush()
+        self._data = None
+        self._index = None
+
+    def grid(self, year):
+        """Returns the counts of every cell for one year.
+
+        Parameters
+        ----------
+        year : int
+                A recorded year.
+
+        Returns
+        -------
+        ndarray
+            Array with shape (rows, columns, species), row and column 0 is location (1, 1).
+        """
+        return np.array(self._data[self._position(year)])
+
+    def cell_series(self, loc, species="Herbivore", start=None, stop=None):
+        """Returns the counts of one cell for a range of years.
+
+        Parameters
+        ----------
+        loc : tuple
+                The location (row, column) of the cell, as used for populations.
+        species : str
+                Name of the species.
+        start : int
+                First year of the range, the first recorded year if None.
+        stop : int
+                Last year of the range, the last recorded year if None.
+
+        Returns
+        -------
+        years : ndarray
+                The recorded years in the range.
+        counts : ndarray
+                The number of animals in the cell in these years.
+        """
+        rows = self._year_range(start, stop)
+        counts = self._data[rows, loc[0] - 1, loc[1] - 1, self.species.index(species)]
+        return self.years[rows], np.array(counts)
+
+    def years_exceeding(self, region, threshold, species="Herbivore", start=None, stop=None):
+        """Finds the years where the number of animals in a region exceeded a threshold.
+
+        The tile sums in the index give an upper limit for the number of animals in the region.
+        Only the years where the limit exceeds the threshold are read from the history, and none
+        are read if the region is made of whole tiles.
+
+        Parameters
+        ----------
+        region : tuple
+                ((first row, last row), (first column, last column)) of the region, using the
+                locations as used for populations, including the last row and column.
+        threshold : int
+                The number of animals the region must have more than.
+        species : str
+                Name of the species.
+        start : int
+                First year of the range, the first recorded year if None.
+        stop : int
+                Last year of the range, the last recorded year if None.
+
+        Returns
+        -------
+        ndarray
+            The years where the region had more than threshold animals.
+        """
+        (row_min, row_max), (col_min, col_max) = region
+        row_min, row_max, col_min, col_max = row_min - 1, row_max - 1, col_min - 1, col_max - 1
+        kind = self.species.index(species)
+        rows = self._year_range(start, stop)
+
+        tiles = self._index[
+            rows,
+            row_min // self.tile : row_max // self.tile + 1,
+            col_min // self.tile : col_max // self.tile + 1,
+            kind,
+        ]
+        limits = tiles.sum(axis=(1, 2))
+        candidates = np.arange(rows.start, rows.stop)[limits > threshold]
+
+        if not self._whole_tiles(row_min, row_max, self.shape[0]) or not self._whole_tiles(
+            col_min, col_max, self.shape[1]
+        ):
+            counts = self._data[candidates, row_min : row_max + 1, col_min : col_max + 1, kind]
+            candidates = candidates[counts.sum(axis=(1, 2)) > threshold]
+        return self.start + self.stride * candidates
+
+    def _whole_tiles(self, first, last, size):
+        """Checks if a range of rows or columns is made of whole tiles."""
+        return first % self.tile == 0 and ((last + 1) % self.tile == 0 or last == size - 1)
+
+    def _position(self, year):
+        """Returns the position of a year in the history."""
+        position, remainder = divmod(year - self.start, self.stride)
+        if remainder != 0 or not 0 <= position < self._length:
+            raise KeyError(f"Year {year} is not recorded.")
+        return position
+
+    def _year_range(self, start, stop):
+        """Returns the slice of positions for a range of years."""
+        first = 0
+        if start is not None:
+            first = max(0, -(-(start - self.start) // self.stride))
+        last = self._length
+        if stop is not None:
+            last = min(self._length, (stop - self.start) // self.stride + 1)
+        return slice(first, max(first, last))
+
+    def _tile_sums(self, grid):
+        """Sums the counts of a grid over the tiles of the index."""
+        rows, cols, species = grid.shape
+        padded = np.zeros(
+            (-(-rows // self.tile) * self.tile, -(-cols // self.tile) * self.tile, species),
+            dtype=np.int64,
+        )
+        padded[:rows, :cols] = grid
+        tile_rows, tile_cols = padded.shape[0] // self.tile, padded.shape[1] // self.tile
+        tiles = padded.reshape(tile_rows, self.tile, tile_cols, self.tile, species)
+        return tiles.sum(axis=(1, 3))
+
+    def _map_files(self):
+        """Memory-maps the data and index files, making or growing them as needed."""
+        rows, cols, species = self.shape
+        index_shape = (-(-rows // self.tile), -(-cols // self.tile), species)
+        if self._data is not None:
+            self._data.flush()
+            self._index.flush()
+
+        for suffix, dtype, shape, attribute in (
+            (".dat", np.int32, (rows, cols, species), "_data"),
+            (".idx", np.int64, index_shape, "_index"),
+        ):
+            file = self.base + suffix
+            if self._mode == "r":
+                setattr(self, attribute, np.memmap(file, dtype, "r", shape=(self._length,) + shape))
+                continue
+
+            size = self._capacity * int(np.prod(shape)) * np.dtype(dtype).itemsize
+            new_file = self._mode == "w+" and getattr(self, attribute) is None
+            with open(file, "wb" if new_file else "r+b") as raw:
+                if os.path.getsize(file) < size:
+                    raw.truncate(size)
+            setattr(self, attribute, np.memmap(file, dtype, "r+", shape=(self._capacity,) + shape))
@@ -24,6 +24,8 @@ __email__ = "johansta@nmbu.no, sabinal@nmbu.no"
 import numpy as np
 import textwrap
 
+from biosim import pools
+from biosim.animals import Herbivore, Carnivore
 from biosim.landscapes import Water, Lowland, Highland, Desert
 
 
@@ -31,6 +33,11 @@ class Island:
     """Class for Island in Biosim"""
 
     valid_landscapes = {"W": Water, "D": Desert, "L": Lowland, "H": Highland}
+    valid_species = {
+        "Herbivore": (Herbivore, "herbivore_list"),
+        "Carnivore": (Carnivore, "carnivore_list"),
+    }
+    profiler = None
 
     def __init__(self, island_map, ini_pop=None):
         """Constructor that initiates Island class instances.
@@ -49,32 +56,44 @@ class Island:
         self.num_herbivores = []
         self.num_carnivores = []
 
-        for lines in self.island_lines:
+        self.check_geography(self.island_lines)
+
+        self.initial_pop = ini_pop
+        self.create_island_map()
+        self.set_population_in_cell(self.initial_pop)
+
+    @classmethod
+    def check_geography(cls, island_lines):
+        """Checks that the geography only has valid cell types, that all rows are equally long
+        and that the island is surrounded by water.
+
+        Parameters
+        ----------
+        island_lines: list
+                The lines of the geography string.
+        """
+        for lines in island_lines:
             for cell_type in lines:
-                if cell_type not in self.valid_landscapes.keys():
+                if cell_type not in cls.valid_landscapes.keys():
                     raise ValueError(f"Cell type {cell_type} does not exist")
 
-        row = len(self.island_lines[0])
-        for lines in self.island_lines:
+        row = len(island_lines[0])
+        for lines in island_lines:
             if len(lines) is not row:
                 raise ValueError("Each row in the multiline string should be equal in length")
 
-        for index in range(len(self.island_lines[0])):
-            if self.island_lines[0][index] != "W" or self.island_lines[-1][index] != "W":
+        for index in range(len(island_lines[0])):
+            if island_lines[0][index] != "W" or island_lines[-1][index] != "W":
                 raise ValueError(
                     "This island is out out boundary. Islands should be " "surrounded by water"
                 )
 
-        for index in range(len(self.island_lines)):
-            if self.island_lines[index][0] != "W" or self.island_lines[index][-1] != "W":
+        for index in range(len(island_lines)):
+            if island_lines[index][0] != "W" or island_lines[index][-1] != "W":
                 raise ValueError(
                     "This island is out out boundary. Islands should be " "surrounded by water"
                 )
 
-        self.initial_pop = ini_pop
-        self.create_island_map()
-        self.set_population_in_cell(self.initial_pop)
-
     def set_population_in_cell(self, new_pop=None):
         """Makes it possible to put out a 'new' set of population in any cell on the island
 
@@ -107,6 +126,76 @@ class Island:
                 self.island_map[(1 + y_loc, 1 + x_loc)] = self.valid_landscapes[cell_type]()
         return self.island_map
 
+    def get_state(self):
+        """Returns the state of the island as numpy arrays instead of landscape and animal objects.
+
+        The animals of each species are stored as arrays of cell index, age and weight. The cell
+        index counts the cells of the map row by row, starting at 0 in the upper left corner. The
+        animals keep their order within each cell, so an island made by Island.from_state will
+        continue exactly like this one.
+
+        Returns
+        -------
+        state: dict
+                Dictionary with the geography, the available food in each cell and one dictionary
+                of arrays for each species.
+        """
+        cells = list(self.island_map.values())
+        state = {
+            "geography": self.geography,
+            "food": np.array([cell.available_food for cell in cells], dtype=float),
+        }
+        for species, (_, list_name) in self.valid_species.items():
+            animal_lists = [getattr(cell, list_name) for cell in cells]
+            animals = [animal for animal_list in animal_lists for animal in animal_list]
+            state[species] = {
+                "cell": np.repeat(
+                    np.arange(len(cells)), [len(animal_list) for animal_list in animal_lists]
+                ),
+                "age": np.array([animal.age for animal in animals], dtype=int),
+                "weight": np.array([animal.weight for animal in animals], dtype=float),
+            }
+        return state
+
+    def population_arrays(self):
+        """Returns the cell index, age and weight of all animals as numpy arrays.
+
+        The arrays are made from the animal objects, like in Island.get_state.
+
+        Returns
+        -------
+        dict
+            Dictionary with one dictionary of 'cell', 'age' and 'weight' arrays for each species.
+        """
+        state = self.get_state()
+        return {species: state[species] for species in self.valid_species}
+
+    @classmethod
+    def from_state(cls, state):
+        """Creates an island from a state made by Island.get_state.
+
+        Parameters
+        ----------
+        state: dict
+                Dictionary with the geography, food and animal arrays of an island.
+
+        Returns
+        -------
+        island: Island
+                New island with the same geography, food and animals as the state.
+        """
+        island = cls(state["geography"], [])
+        cells = list(island.island_map.values())
+        for cell, food in zip(cells, state["food"].tolist()):
+            cell.available_food = food
+
+        for species, (species_class, list_name) in cls.valid_species.items():
+            arrays = state[species]
+            animals = species_class.from_arrays(arrays["age"].tolist(), arrays["weight"].tolist())
+            for index, animal in zip(arrays["cell"].tolist(), animals):
+                getattr(cells[index], list_name).append(animal)
+        return island
+
     def nr_animals_pr_species(self):
         """Create function returning the total nr of herbivores and carnivores in a dict."""
         nr_herbs = 0
@@ -119,6 +208,23 @@ class Island:
         nr_animals = {"Herbivore": nr_herbs, "Carnivore": nr_carns}
         return nr_animals
 
+    def count_grid(self):
+        """Returns the number of animals of each species in each cell.
+
+        Returns
+        -------
+        grid: ndarray
+                Array with shape (rows, columns, 2), where the last axis holds the number of
+                herbivores and carnivores. Row and column 0 is the cell at location (1, 1).
+        """
+        counts = [
+            (len(cell.herbivore_list), len(cell.carnivore_list))
+            for cell in self.island_map.values()
+        ]
+        return np.array(counts, dtype=int).reshape(
+            len(self.island_lines), len(self.island_lines[0]), 2
+        )
+
     def nr_animals(self):
         """Create function which returns total nr of animals on island."""
         total_species = self.nr_animals_pr_species()
@@ -142,8 +248,7 @@ class Island:
 
         list_ = [loc_1, loc_2, loc_3, loc_4]
 
-        chosen_cell = np.random.choice(len(list_))
-        chosen_cell = list_[chosen_cell]
+        chosen_cell = list_[pools.direction()]
 
         return chosen_cell
 
@@ -183,6 +288,10 @@ class Island:
 
     def cycle_island(self):
         """Simulates annual cycle of Rossumøya for all the cells the island i made out of."""
+        if self.profiler is not None:
+            self._cycle_island_profiled()
+            return
+
         for cell in self.island_map:
             self.island_map[cell].food_grows()
             self.island_map[cell].herbivore_eats()
@@ -196,6 +305,51 @@ class Island:
 
         self.reset_migration()
 
+    def _cycle_island_profiled(self):
+        """Simulates the annual cycle like cycle_island, and adds the time spent in each phase of
+        each cell to the profiler."""
+        for loc, cell in self.island_map.items():
+            self._timed("food_grows", loc, 1, cell.food_grows)
+            self._timed("herbivore_eats", loc, len(cell.herbivore_list), cell.herbivore_eats)
+            self._timed(
+                "carnivore_eats",
+                loc,
+                len(cell.herbivore_list) + len(cell.carnivore_list),
+                cell.carnivore_eats,
+            )
+            self._timed(
+                "reproduce",
+                loc,
+                len(cell.herbivore_list) + len(cell.carnivore_list),
+                cell.herbivore_reproduce,
+                cell.carnivore_reproduce,
+            )
+            self._timed(
+                "migrate_animals",
+                loc,
+                len(cell.herbivore_list) + len(cell.carnivore_list),
+                lambda: self.migrate_animals(loc),
+            )
+            self._timed(
+                "age_weight_die",
+                loc,
+                len(cell.herbivore_list) + len(cell.carnivore_list),
+                cell.animals_age,
+                cell.animals_lose_weight,
+                cell.animals_die,
+            )
+
+        start = self.profiler.begin()
+        self.reset_migration()
+        self.profiler.end("reset_migration", start)
+
+    def _timed(self, phase, loc, animals, *steps):
+        """Calls the steps of a phase for a cell and adds the time spent to the profiler."""
+        start = self.profiler.begin()
+        for step in steps:
+            step()
+        self.profiler.end(phase, start, animals, loc)
+
     @property
     def fitness_age_weight(self):
         """ Function that retrieves the fitness, age and weight for all animals and
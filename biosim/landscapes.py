@@ -31,9 +31,8 @@ Notes
 __author__ = "Johan Stabekk, Sabina Langås"
 __email__ = "johansta@nmbu.no, sabinal@nmbu.no"
 
-import numpy as np
-
 from .animals import Herbivore, Carnivore
+from biosim import pools
 
 
 class Landscape:
@@ -104,7 +103,7 @@ class Landscape:
     def herbivore_eats(self):
         """Cycle where all herbivores eats fodder in a random order according to how much
         the parameters defines. If there is no fodder left then no more herbivores get to eat."""
-        np.random.shuffle(self.herbivore_list)
+        pools.shuffle(self.herbivore_list)
 
         for herbivore in self.herbivore_list:
             if self.available_food == 0:                      # Put this in Herbivores, Animals
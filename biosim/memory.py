@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'biosim.memory' estimates the memory used by a simulation.
+
+Every animal on the island of the reference engine is a Python object, while the array engines
+keep the animals in arrays, so the memory of a simulation grows with the population. memory_report
+estimates the bytes used by the animals, both as objects and as the arrays of Island.get_state, and
+the bytes held by the recorders and the graphics of a simulation.
+If the simulation is profiled by a PhaseProfiler with trace_memory=True, the memory allocated in
+each phase is included as well.
+
+A MemoryBudget is attached to a simulation by BioSim.add_recorder, and checks the population and
+the estimated memory after every year. It warns, or stops the simulation, when they exceed the
+budget.
+
+This file can be imported as a module and contains the following class and functions:
+
+    *   MemoryBudget - Class that warns or stops a simulation that exceeds a memory budget.
+
+    *   memory_report - Returns the estimated memory used by a simulation.
+
+    *   bytes_per_animal - Returns the estimated bytes per animal for each representation.
+
+Notes
+-----
+    The estimates only count the animals and the numpy arrays of recorders and graphics. Recorders
+    writing to memory-mapped files, like CellHistory, are not counted since their data is kept
+    on disk.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+import sys
+import warnings
+
+from biosim.animals import Herbivore
+from biosim.island import Island
+
+
+def bytes_per_animal():
+    """Returns the estimated bytes used by one animal for each representation.
+
+    Returns
+    -------
+    dict
+        Dictionary with 'object', the animal object with its weight and its place in the list of
+        its cell, and 'arrays', the cell index, age and weight in the arrays of Island.get_state.
+    """
+    animal = Herbivore.from_arrays([5], [20.0])[0]
+    pointer = np.dtype(np.intp).itemsize
+    arrays = np.dtype(int).itemsize * 2 + np.dtype(float).itemsize
+    return {
+        "object": sys.getsizeof(animal) + sys.getsizeof(animal.weight) + pointer,
+        "arrays": arrays,
+    }
+
+
+def memory_report(sim):
+    """Returns the estimated memory used by a simulation.
+
+    Parameters
+    ----------
+    sim : BioSim
+            The simulation.
+
+    Returns
+    -------
+    dict
+        Dictionary with the population, 'bytes_per_animal' and 'animal_bytes' for each
+        representation, 'representation', 'object' for the reference engine and 'arrays' for the
+        array engines, 'recorder_bytes' with the bytes of each recorder, 'visualization_bytes'
+        and 'total_bytes', the sum for the animals in the representation of the engine, the
+        recorders and the graphics. If the simulation is profiled with traced memory, 'phases'
+        holds the allocated and peak bytes of each phase.
+    """
+    population = sim.num_animals_per_species
+    animals = sum(population.values())
+    per_animal = bytes_per_animal()
+    animal_bytes = {name: animals * nbytes for name, nbytes in per_animal.items()}
+    recorder_bytes = [_nbytes(vars(recorder)) for recorder in sim.recorders]
+    visualization_bytes = sim.vis.nbytes
+    representation = "object" if isinstance(sim.island, Island) else "arrays"
+
+    report = {
+        "population": population,
+        "bytes_per_animal": per_animal,
+        "animal_bytes": animal_bytes,
+        "representation": representation,
+        "recorder_bytes": recorder_bytes,
+        "visualization_bytes": visualization_bytes,
+        "total_bytes": animal_bytes[representation] + sum(recorder_bytes) + visualization_bytes,
+    }
+    profiler = sim.profiler
+    if profiler is not None and profiler.trace_memory:
+        report["phases"] = {
+            phase: {key: values[key] for key in ("allocated_bytes", "peak_bytes")}
+            for phase, values in profiler.summary().items()
+            if "peak_bytes" in values
+        }
+    return report
+
+
+def _nbytes(value):
+    """Counts the bytes of the numpy arrays in memory in a value, leaving out memory maps."""
+    if isinstance(value, np.memmap):
+        return 0
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_nbytes(item) for item in value.values())
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(item) for item in value)
+    return 0
+
+
+class MemoryBudget:
+    """Class for checking a simulation against a population and memory budget."""
+
+    def __init__(self, max_animals=None, max_bytes=None, action="warn"):
+        """Constructor that initiates MemoryBudget class instances.
+
+        Parameters
+        ----------
+        max_animals : int
+                Largest allowed number of animals, None for no limit.
+        max_bytes : int
+                Largest allowed estimated memory in bytes, the 'total_bytes' of memory_report.
+                None for no limit.
+        action : str
+                'warn' to give a RuntimeWarning, 'abort' to raise a RuntimeError that stops the
+                simulation at the end of the year.
+        """
+        if action not in ("warn", "abort"):
+            raise ValueError(f"Unknown action {action}, use 'warn' or 'abort'.")
+
+        self.max_animals = max_animals
+        self.max_bytes = max_bytes
+        self.action = action
+        self.exceeded = []
+
+    def record(self, sim):
+        """Checks the simulation after a year. Called by the simulation like a recorder.
+
+        Parameters
+        ----------
+        sim : BioSim
+                The simulation.
+        """
+        messages = []
+        if self.max_animals is not None and sim.num_animals > self.max_animals:
+            messages.append(f"{sim.num_animals} animals exceed the budget of {self.max_animals}")
+        if self.max_bytes is not None:
+            total = memory_report(sim)["total_bytes"]
+            if total > self.max_bytes:
+                messages.append(f"{total} bytes exceed the budget of {self.max_bytes}")
+        if not messages:
+            return
+
+        message = f"Year {sim.year}: " + ", ".join(messages) + "."
+        self.exceeded.append(sim.year)
+        if self.action == "abort":
+            raise RuntimeError(message)
+        warnings.warn(message, RuntimeWarning)
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'biosim.profiler' measures where the time of a simulation is spent.
+
+A profiler is attached to a simulation with 'sim.profiler = PhaseProfiler()'. While it is attached,
+Island.cycle_island times every phase of the annual cycle in every cell, and BioSim.simulate times
+the statistics, the visualization and the saving of images. For each phase, the profiler keeps
+the total wall time, the number of calls and the number of animals processed.
+
+Without a profiler, the annual cycle runs exactly as before, so profiling costs nothing when it is
+not used.
+
+With per_cell=True, the profiler also keeps the time spent in each cell for each phase. The times
+are returned as grids aligned with the geography of the island, which shows the hotspots of the
+map. The grids can be saved to a '.npz' file, and plotted as heat maps like the animal
+distributions of the visualization.
+
+With trace_memory=True, the memory allocated in each phase is measured with tracemalloc as well.
+Tracing makes the simulation several times slower, so it is only meant for finding the phases that
+allocate the most.
+
+This file can be imported as a module and contains the following class:
+
+    *   PhaseProfiler - Class that accumulates the time spent in each phase of a simulation.
+
+Notes
+-----
+    To run this script, its required to have 'numpy', 'pandas' and 'matplotlib.pyplot' installed
+    in the Python environment that your going to run this script in.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+import pandas as pd
+import time
+import tracemalloc
+
+from biosim.visualization import Visualization
+from contextlib import contextmanager
+
+
+class PhaseProfiler:
+    """Class for the wall time, calls and animals processed in each phase of a simulation."""
+
+    def __init__(self, per_cell=False, trace_memory=False):
+        """Constructor that initiates PhaseProfiler class instances without any measurements.
+
+        Parameters
+        ----------
+        per_cell : bool
+                If True, the time spent in each cell is kept for each phase as well. Only the
+                reference engine measures the time in each cell.
+        trace_memory : bool
+                If True, the memory allocated in each phase is measured with tracemalloc, which
+                is started if it is not running.
+        """
+        self.per_cell = per_cell
+        self.trace_memory = trace_memory
+        self._phases = {}
+        self._cells = {}
+        self._memory = {}
+
+    def __contains__(self, phase):
+        return phase in self._phases
+
+    def reset(self):
+        """Removes all measurements."""
+        self._phases = {}
+        self._cells = {}
+        self._memory = {}
+
+    def begin(self):
+        """Starts measuring one call of a phase.
+
+        Returns
+        -------
+            Start value that is given to PhaseProfiler.end.
+        """
+        if not self.trace_memory:
+            return time.perf_counter()
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        return time.perf_counter(), tracemalloc.get_traced_memory()[0]
+
+    def end(self, phase, start, animals=0, loc=None):
+        """Stops measuring one call of a phase and adds it.
+
+        Parameters
+        ----------
+        phase : str
+                Name of the phase.
+        start :
+                Value returned by PhaseProfiler.begin.
+        animals : int
+                Number of animals processed by the call.
+        loc : tuple
+                Location of the cell the call was made for.
+        """
+        if not self.trace_memory:
+            self.add(phase, time.perf_counter() - start, animals, loc)
+            return
+
+        start_time, start_memory = start
+        seconds = time.perf_counter() - start_time
+        current, peak = tracemalloc.get_traced_memory()
+        entry = self._memory.get(phase)
+        if entry is None:
+            entry = self._memory[phase] = [0, 0]
+        entry[0] += current - start_memory
+        entry[1] = max(entry[1], peak - start_memory)
+        self.add(phase, seconds, animals, loc)
+
+    def add(self, phase, seconds, animals=0, loc=None):
+        """Adds one call of a phase.
+
+        Parameters
+        ----------
+        phase : str
+                Name of the phase.
+        seconds : float
+                Wall time of the call.
+        animals : int
+                Number of animals processed by the call.
+        loc : tuple
+                Location of the cell the call was made for, None for calls that are not made for
+                a single cell.
+        """
+        entry = self._phases.get(phase)
+        if entry is None:
+            entry = self._phases[phase] = [0.0, 0, 0]
+        entry[0] += seconds
+        entry[1] += 1
+        entry[2] += animals
+
+        if self.per_cell and loc is not None:
+            cells = self._cells.setdefault(phase, {})
+            cells[loc] = cells.get(loc, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, phase, animals=0):
+        """Context manager that adds the time spent in its block as one call of a phase.
+
+        Parameters
+        ----------
+        phase : str
+                Name of the phase.
+        animals : int
+                Number of animals processed in the block.
+        """
+        start = self.begin()
+        try:
+            yield
+        finally:
+            self.end(phase, start, animals)
+
+    @property
+    def total_seconds(self):
+        """Wall time of all the phases together."""
+        return sum(entry[0] for entry in self._phases.values())
+
+    def summary(self):
+        """Returns the measurements of each phase.
+
+        Returns
+        -------
+        dict
+            Dictionary with a dictionary for each phase, holding 'seconds', 'calls', 'animals',
+            'seconds_per_call' and 'share', the fraction of the total time spent in the phase.
+            When memory is traced, it also holds 'allocated_bytes', the memory allocated and not
+            freed by all the calls together, and 'peak_bytes', the largest memory use above the
+            start of a single call.
+        """
+        total = self.total_seconds
+        summary = {
+            phase: {
+                "seconds": seconds,
+                "calls": calls,
+                "animals": animals,
+                "seconds_per_call": seconds / calls,
+                "share": seconds / total if total > 0 else 0.0,
+            }
+            for phase, (seconds, calls, animals) in self._phases.items()
+        }
+        for phase, (allocated, peak) in self._memory.items():
+            summary[phase]["allocated_bytes"] = allocated
+            summary[phase]["peak_bytes"] = peak
+        return summary
+
+    def to_frame(self):
+        """Returns the summary as a DataFrame with one row for each phase, slowest phase first."""
+        columns = ["seconds", "calls", "animals", "seconds_per_call", "share"]
+        if self._memory:
+            columns += ["allocated_bytes", "peak_bytes"]
+        frame = pd.DataFrame.from_dict(self.summary(), orient="index", columns=columns)
+        frame.index.name = "phase"
+        return frame.sort_values("seconds", ascending=False)
+
+    def cost_grid(self, phase=None):
+        """Returns the time spent in each cell.
+
+        Parameters
+        ----------
+        phase : str
+                Name of the phase, None for the sum of all phases.
+
+        Returns
+        -------
+        ndarray
+            Array with shape (rows, columns) with the seconds spent in each cell. Row and column 0
+            is the cell at location (1, 1).
+        """
+        if not self._cells:
+            raise ValueError(
+                "No time per cell is measured, use PhaseProfiler(per_cell=True) with the "
+                "reference engine, and simulate at least one year."
+            )
+
+        locations = [loc for cells in self._cells.values() for loc in cells]
+        rows = max(loc[0] for loc in locations)
+        cols = max(loc[1] for loc in locations)
+        grid = np.zeros((rows, cols))
+        for name in self._cells if phase is None else (phase,):
+            for (row, col), seconds in self._cells[name].items():
+                grid[row - 1, col - 1] += seconds
+        return grid
+
+    def save_cost_grids(self, file):
+        """Saves the time spent in each cell to a '.npz' file, with one grid for each phase and
+        the sum of all phases as 'total'.
+
+        Parameters
+        ----------
+        file : str
+                File name of the '.npz' file.
+        """
+        grids = {phase: self.cost_grid(phase) for phase in self._cells}
+        grids["total"] = self.cost_grid()
+        np.savez(file, **grids)
+
+    def plot_cost_grid(self, phase=None, ax=None):
+        """Plots the time spent in each cell as a heat map.
+
+        Parameters
+        ----------
+        phase : str
+                Name of the phase, None for the sum of all phases.
+        ax : matplotlib.axes.Axes
+                Axes the heat map is drawn in. If None, a new figure is made.
+
+        Returns
+        -------
+        matplotlib.axes.Axes
+            The axes with the heat map.
+        """
+        title = "Seconds per cell" if phase is None else f"Seconds per cell, {phase}"
+        return Visualization.plot_heatmap(self.cost_grid(phase), title, ax=ax)
+
+    def __str__(self):
+        return self.to_frame().to_string()
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'biosim.progress' reports the progress of long simulations.
+
+A ProgressMonitor is given to BioSim.simulate, and is told about every simulated year. At a fixed
+wall-clock interval, not every year, it makes a report with the simulated years per second, the
+animal-years per second, the current population, the peak memory use of the process and the
+estimated time left. The estimate uses an exponentially smoothed rate, so it follows changes in
+the speed of the simulation without jumping around.
+
+The reports are handed to callbacks and written to a logger. PrometheusSink is a callback that
+writes the reports to a file in the Prometheus text format, which the textfile collector of a
+node exporter can scrape.
+
+This file can be imported as a module and contains the following classes and function:
+
+    *   ProgressMonitor - Class that measures the progress of a simulation and makes reports.
+
+    *   PrometheusSink - Class that writes reports to a file in the Prometheus text format.
+
+    *   peak_rss - Returns the peak resident memory of the process.
+
+Notes
+-----
+    The peak memory is read with the 'resource' module, which is not available on Windows. The
+    reports have no peak memory there.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import logging
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+def peak_rss():
+    """Returns the peak resident memory of the process in bytes, None if it is not available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class ProgressMonitor:
+    """Class for measuring the progress of a simulation."""
+
+    def __init__(self, interval=10.0, callbacks=None, log=logger, smoothing=0.3):
+        """Constructor that initiates ProgressMonitor class instances.
+
+        Parameters
+        ----------
+        interval : float
+                Seconds of wall-clock time between reports.
+        callbacks : list
+                Functions called with each report.
+        log : logging.Logger
+                Logger the reports are written to at level INFO. If None, the reports are not
+                logged.
+        smoothing : float
+                Weight of the newest rate in the exponentially smoothed rate, between 0 and 1.
+        """
+        if interval < 0:
+            raise ValueError("interval can not be negative")
+        if not 0 < smoothing <= 1:
+            raise ValueError("smoothing must be larger than 0 and at most 1")
+
+        self.interval = interval
+        self.callbacks = list(callbacks) if callbacks is not None else []
+        self.log = log
+        self.smoothing = smoothing
+        self.reports = 0
+        self.last_report = None
+        self._final_year = None
+        self._start_time = None
+        self._last_time = None
+        self._last_year = None
+        self._animal_years = 0
+        self._rate = None
+
+    def start(self, sim, final_year):
+        """Starts measuring a simulation. Called by BioSim.simulate before the first year.
+
+        Parameters
+        ----------
+        sim : BioSim
+                The simulation.
+        final_year : int
+                The year the simulation stops at.
+        """
+        self._final_year = final_year
+        self._start_time = self._last_time = time.perf_counter()
+        self._last_year = sim.year
+        self._animal_years = 0
+
+    def update(self, sim):
+        """Counts a simulated year, and reports if the interval has passed since the last report.
+
+        Parameters
+        ----------
+        sim : BioSim
+                The simulation, after the year is simulated.
+        """
+        population = sim.num_animals_per_species
+        self._animal_years += population["Herbivore"] + population["Carnivore"]
+        now = time.perf_counter()
+        if now - self._last_time >= self.interval:
+            self._report(sim, population, now)
+
+    def finish(self, sim):
+        """Makes the last report. Called by BioSim.simulate after the last year.
+
+        Parameters
+        ----------
+        sim : BioSim
+                The simulation.
+        """
+        if sim.year != self._last_year:
+            self._report(sim, sim.num_animals_per_species, time.perf_counter())
+
+    def _report(self, sim, population, now):
+        """Makes a report, and hands it to the callbacks and the logger."""
+        seconds = max(now - self._last_time, 1e-12)
+        years_per_second = (sim.year - self._last_year) / seconds
+        if self._rate is None:
+            self._rate = years_per_second
+        else:
+            self._rate = self.smoothing * years_per_second + (1 - self.smoothing) * self._rate
+
+        remaining = self._final_year - sim.year
+        report = {
+            "year": sim.year,
+            "final_year": self._final_year,
+            "elapsed_seconds": now - self._start_time,
+            "years_per_second": years_per_second,
+            "animal_years_per_second": self._animal_years / seconds,
+            "population": dict(population),
+            "peak_rss_bytes": peak_rss(),
+            "eta_seconds": remaining / self._rate if self._rate > 0 else None,
+        }
+        self._last_time = now
+        self._last_year = sim.year
+        self._animal_years = 0
+        self.reports += 1
+        self.last_report = report
+
+        for callback in self.callbacks:
+            callback(report)
+        if self.log is not None:
+            eta = report["eta_seconds"]
+            self.log.info(
+                "year %d/%d, %.2f years/s, %.0f animal-years/s, %d herbivores, %d carnivores, "
+                "ETA %s",
+                report["year"],
+                report["final_year"],
+                years_per_second,
+                report["animal_years_per_second"],
+                population["Herbivore"],
+                population["Carnivore"],
+                "unknown" if eta is None else f"{eta:.0f} s",
+            )
+
+
+class PrometheusSink:
+    """Class for writing progress reports to a file in the Prometheus text format."""
+
+    def __init__(self, file, prefix="biosim", labels=None):
+        """Constructor that initiates PrometheusSink class instances.
+
+        Parameters
+        ----------
+        file : str
+                The file the metrics are written to. For a node exporter, it must end with '.prom'
+                and be in the directory of the textfile collector.
+        prefix : str
+                Beginning of the metric names.
+        labels : dict
+                Labels added to every metric, for example to tell several simulations apart.
+        """
+        self.file = file
+        self.prefix = prefix
+        self.labels = dict(labels) if labels is not None else {}
+
+    def __call__(self, report):
+        """Writes a report to the file, replacing the last one.
+
+        The report is written to a temporary file that is renamed, so the file is never read
+        while it is half written.
+
+        Parameters
+        ----------
+        report : dict
+                Report made by a ProgressMonitor.
+        """
+        metrics = [
+            ("year", "gauge", "Current simulated year.", report["year"], {}),
+            ("final_year", "gauge", "Year the simulation stops at.", report["final_year"], {}),
+            (
+                "years_per_second",
+                "gauge",
+                "Simulated years per second.",
+                report["years_per_second"],
+                {},
+            ),
+            (
+                "animal_years_per_second",
+                "gauge",
+                "Simulated animal-years per second.",
+                report["animal_years_per_second"],
+                {},
+            ),
+            (
+                "peak_rss_bytes",
+                "gauge",
+                "Peak resident memory of the process.",
+                report["peak_rss_bytes"],
+                {},
+            ),
+            ("eta_seconds", "gauge", "Estimated seconds left.", report["eta_seconds"], {}),
+        ]
+        for species, count in report["population"].items():
+            metrics.append(
+                ("population", "gauge", "Number of animals.", count, {"species": species})
+            )
+
+        lines = []
+        for name, kind, description, value, labels in metrics:
+            if value is None:
+                continue
+            full_name = f"{self.prefix}_{name}"
+            if not any(line.startswith(f"# HELP {full_name} ") for line in lines):
+                lines.append(f"# HELP {full_name} {description}")
+                lines.append(f"# TYPE {full_name} {kind}")
+            lines.append(f"{full_name}{self._format_labels(labels)} {float(value)!r}")
+
+        temporary_file = self.file + ".tmp"
+        with open(temporary_file, "w") as metrics_file:
+            metrics_file.write("\n".join(lines) + "\n")
+        os.replace(temporary_file, self.file)
+
+    def _format_labels(self, labels):
+        """Formats the labels of a metric, including the labels of the sink."""
+        labels = {**self.labels, **labels}
+        if not labels:
+            return ""
+        text = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+        return "{" + text + "}"
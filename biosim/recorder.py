@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'biosim.recorder' records the history of a simulation as columns of numbers.
+
+A recorder is attached to a simulation by BioSim.add_recorder, and is called after every simulated
+year. It keeps the year and the total number of animals of each species, and optionally the
+number of animals of each species in each cell, for every stride years. The values are stored in
+preallocated numpy columns that grow when they are full.
+
+If a file is given, the columns are written to it in chunks of chunk_size rows, so the memory
+used by the recorder stays the same no matter how many years are simulated. Files ending with
+'.csv' get one line per recorded year. For other file names, each chunk is written as a separate
+'.npz' file numbered consecutively. TimeSeriesRecorder.load reads the whole history back from the
+files. A new recorder with the same file replaces the files of the earlier one.
+
+This file can be imported as a module and contains the following class:
+
+    *   TimeSeriesRecorder - Class that records the animal counts of a simulation.
+
+Notes
+-----
+    To run this script, its required to have 'numpy' and 'pandas' installed in the Python
+    environment that your going to run this script in.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import glob
+import numpy as np
+import os
+import pandas as pd
+
+
+class TimeSeriesRecorder:
+    """Class for recording the animal counts of a simulation."""
+
+    species = ("Herbivore", "Carnivore")
+
+    def __init__(self, stride=1, per_cell=False, file=None, chunk_size=1024):
+        """Constructor that initiates TimeSeriesRecorder class instances.
+
+        Parameters
+        ----------
+        stride : int
+                Years between recorded years. Years that are a multiple of stride are recorded.
+        per_cell : bool
+                If True, the number of animals of each species in each cell is recorded as well.
+        file : str
+                File the columns are written to. Names ending with '.csv' are written as CSV,
+                other names are used as the beginning of numbered '.npz' files. Files left by an
+                earlier recorder with the same file are replaced, the '.npz' files of it are
+                removed. If None, all columns are kept in memory.
+        chunk_size : int
+                Number of rows written to file at a time.
+        """
+        if stride < 1:
+            raise ValueError("stride must be a positive integer")
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be a positive integer")
+
+        self.stride = stride
+        self.per_cell = per_cell
+        self.file = file
+        self.chunk_size = chunk_size
+        self._length = 0
+        self._columns = None
+        self._chunks_written = 0
+        self._csv_file = None
+        if file is not None and not file.endswith(".csv"):
+            for chunk_file in self._chunk_files(file):
+                os.remove(chunk_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        """Number of rows kept in memory."""
+        return self._length
+
+    @property
+    def columns(self):
+        """Dictionary with the rows kept in memory, as views of the columns.
+
+        Without a file these are all recorded years. With a file, rows already written to it are
+        not included, use TimeSeriesRecorder.load to read them.
+        """
+        if self._columns is None:
+            return {}
+        return {name: column[: self._length] for name, column in self._columns.items()}
+
+    def record(self, sim):
+        """Records the current year of a simulation if it is a multiple of stride.
+
+        Parameters
+        ----------
+        sim : BioSim
+                The simulation that is recorded.
+        """
+        if sim.year % self.stride != 0:
+            return
+
+        counts = sim.num_animals_per_species
+        grid = sim.island.count_grid() if self.per_cell else None
+        if self._columns is None:
+            self._allocate(self.chunk_size, grid)
+        elif self._length == len(self._columns["year"]):
+            if self.file is None:
+                self._grow()
+            else:
+                self.flush()
+
+        row = self._length
+        self._columns["year"][row] = sim.year
+        for species in self.species:
+            self._columns[species][row] = counts[species]
+        if grid is not None:
+            self._columns["cells"][row] = grid
+        self._length += 1
+
+    def flush(self):
+        """Writes the rows kept in memory to the file, and empties the columns."""
+        if self.file is None or self._length == 0:
+            return
+
+        columns = self.columns
+        if self.file.endswith(".csv"):
+            self._write_csv(columns)
+        else:
+            np.savez(f"{self.file}_{self._chunks_written:05d}.npz", **columns)
+        self._chunks_written += 1
+        self._length = 0
+
+    def close(self):
+        """Writes the remaining rows and closes the file."""
+        self.flush()
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file = None
+
+    def to_frame(self):
+        """Returns the year and species totals kept in memory as a DataFrame."""
+        columns = self.columns
+        return pd.DataFrame({name: columns.get(name, []) for name in ("year",) + self.species})
+
+    @classmethod
+    def load(cls, file):
+        """Reads all the recorded rows from the file of a recorder.
+
+        Parameters
+        ----------
+        file : str
+                The file given to the recorder.
+
+        Returns
+        -------
+        dict
+            Dictionary with the columns 'year', 'Herbivore' and 'Carnivore', and 'cells' with
+            shape (years, rows, columns, 2) if the counts per cell were recorded to '.npz' files.
+            Counts per cell in CSV files are returned as one column per cell and species.
+        """
+        if file.endswith(".csv"):
+            frame = pd.read_csv(file)
+            return {name: frame[name].to_numpy() for name in frame.columns}
+
+        chunks = []
+        for chunk_file in cls._chunk_files(file):
+            with np.load(chunk_file) as npz:
+                chunks.append({key: npz[key] for key in npz.files})
+        if not chunks:
+            return {}
+        return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+    @staticmethod
+    def _chunk_files(file):
+        """Returns the numbered '.npz' files of a file, in order."""
+        return sorted(glob.glob(f"{file}_[0-9][0-9][0-9][0-9][0-9].npz"))
+
+    def _allocate(self, capacity, grid):
+        """Allocates the columns."""
+        self._columns = {"year": np.zeros(capacity, dtype=np.int64)}
+        for species in self.species:
+            self._columns[species] = np.zeros(capacity, dtype=np.int64)
+        if grid is not None:
+            self._columns["cells"] = np.zeros((capacity,) + grid.shape, dtype=np.int32)
+
+    def _grow(self):
+        """Doubles the capacity of the columns."""
+        for name, column in self._columns.items():
+            grown = np.zeros((2 * len(column),) + column.shape[1:], dtype=column.dtype)
+            grown[: len(column)] = column
+            self._columns[name] = grown
+
+    def _write_csv(self, columns):
+        """Appends the rows to the CSV file through a buffered file object."""
+        table = [columns["year"]] + [columns[species] for species in self.species]
+        header = ["year"] + list(self.species)
+        if "cells" in columns:
+            cells = columns["cells"]
+            rows, cols = cells.shape[1:3]
+            for index, species in enumerate(self.species):
+                table.extend(cells[:, :, :, index].reshape(len(cells), -1).T)
+                header.extend(
+                    f"{species}_{row}_{col}"
+                    for row in range(1, rows + 1)
+                    for col in range(1, cols + 1)
+                )
+
+        if self._csv_file is None:
+            self._csv_file = open(self.file, "w", buffering=1 << 20)
+            self._csv_file.write(",".join(header) + "\n")
+        np.savetxt(self._csv_file, np.column_stack(table), fmt="%d", delimiter=",")
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'biosim.scenario' lets the user explore several what-if scenarios from one simulation.
+
+A scenario tree starts with one simulation, the trunk. While the trunk is simulated, the state of
+the simulation is kept in memory as checkpoints. A new branch can be started from any retained
+checkpoint, and will continue with the same random number stream as the simulation it was taken
+from. All branches therefore share the years that were simulated before they were started, and
+exploring many interventions at year 200 only costs the first 200 years once.
+
+Simulations can also be forked into separate processes, which share the state with the parent
+process copy-on-write and can run in parallel.
+
+This file can be imported as a module and contains the following classes:
+
+    *   ScenarioTree - Class that holds the branches and the retained checkpoints.
+
+    *   ForkedSimulation - Class that runs a function on a simulation in a forked process.
+
+Notes
+-----
+    The parameters of the animals and landscapes are class attributes, so they are shared by all
+    branches. Interventions in a branch should therefore change the population, not the
+    parameters.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+import os
+import pickle
+import traceback
+
+from collections import OrderedDict
+
+
+class ScenarioTree:
+    """Class for a tree of simulations sharing a common simulated prefix."""
+
+    def __init__(self, sim, keep_every=1, max_bytes=None):
+        """Constructor that initiates ScenarioTree class instances.
+
+        Parameters
+        ----------
+        sim : BioSim
+                The simulation that becomes the trunk of the tree.
+
+        keep_every : int
+                Years between retained checkpoints. Checkpoints are kept for every year that is a
+                multiple of keep_every.
+
+        max_bytes : int
+                Upper limit for the memory used by checkpoints. The least recently used
+                checkpoints are removed when the limit is exceeded. If None, no checkpoints are
+                removed.
+        """
+        if keep_every < 1:
+            raise ValueError("keep_every must be a positive integer")
+
+        self.keep_every = keep_every
+        self.max_bytes = max_bytes
+        self._branches = {"trunk": sim}
+        self._origins = {"trunk": None}
+        self._checkpoints = OrderedDict()
+        self.nbytes = 0
+
+        if sim.year % self.keep_every == 0:
+            self.checkpoint("trunk")
+
+    def __getitem__(self, name):
+        """Returns the simulation of the branch with the given name."""
+        return self._branches[name]
+
+    @property
+    def branches(self):
+        """Names of the branches in the tree."""
+        return list(self._branches)
+
+    @property
+    def checkpoints(self):
+        """Sorted list of (branch, year) for all retained checkpoints."""
+        return sorted(self._checkpoints)
+
+    def checkpoint(self, branch="trunk"):
+        """Retains a checkpoint of the current year of a branch.
+
+        Parameters
+        ----------
+        branch : str
+                Name of the branch.
+        """
+        key = (branch, self._branches[branch].year)
+        if key in self._checkpoints:
+            self.nbytes -= self._state_nbytes(self._checkpoints.pop(key))
+
+        state = self._branches[branch].get_state()
+        self._checkpoints[key] = state
+        self.nbytes += self._state_nbytes(state)
+        self._evict()
+
+    def simulate(self, num_years, branch="trunk", vis_years=None, img_years=None):
+        """Simulates a branch and retains checkpoints according to keep_every.
+
+        Parameters
+        ----------
+        num_years : int
+                Number of years to simulate.
+        branch : str
+                Name of the branch to simulate.
+        vis_years : int or None
+                Years between visualization updates, passed on to BioSim.simulate.
+        img_years : int
+                Years between visualizations saved to files, passed on to BioSim.simulate.
+        """
+        sim = self._branches[branch]
+        final_year = sim.year + num_years
+
+        while sim.year < final_year:
+            years = min(self.keep_every - sim.year % self.keep_every, final_year - sim.year)
+            sim.simulate(years, vis_years=vis_years, img_years=img_years)
+            if sim.year % self.keep_every == 0:
+                self.checkpoint(branch)
+
+    def branch(self, name, year, parent="trunk", img_base=None):
+        """Starts a new branch from a retained checkpoint.
+
+        Checkpoints are shared with the parents of a branch for the years before it was started,
+        so a branch can be started from any year of its simulated history that has a checkpoint.
+
+        Parameters
+        ----------
+        name : str
+                Name of the new branch.
+        year : int
+                The year of the checkpoint the branch starts from.
+        parent : str
+                Name of the branch the checkpoint is taken from.
+        img_base : str
+                Beginning of file name for the figures of the new branch. If None, no figures are
+                written to file.
+
+        Returns
+        -------
+        sim : BioSim
+                The simulation of the new branch, positioned at the given year.
+        """
+        if name in self._branches:
+            raise ValueError(f"Branch {name} already exists.")
+
+        key = self._find_checkpoint(parent, year)
+        state = self._checkpoints[key]
+        self._checkpoints.move_to_end(key)
+
+        sim = self._branches[parent]._spawn(state)
+        sim._image_base = img_base
+
+        self._branches[name] = sim
+        self._origins[name] = (parent, year)
+        return sim
+
+    def _find_checkpoint(self, branch, year):
+        """Finds the checkpoint for a year of a branch, looking through the parents for the years
+        that the branch shares with them."""
+        while branch is not None:
+            if (branch, year) in self._checkpoints:
+                return branch, year
+            origin = self._origins[branch]
+            if origin is None or year > origin[1]:
+                break
+            branch = origin[0]
+
+        raise KeyError(f"No retained checkpoint for year {year}.")
+
+    def _evict(self):
+        """Removes the least recently used checkpoints until the memory limit is met."""
+        if self.max_bytes is None:
+            return
+
+        while self.nbytes > self.max_bytes and len(self._checkpoints) > 1:
+            _, state = self._checkpoints.popitem(last=False)
+            self.nbytes -= self._state_nbytes(state)
+
+    @classmethod
+    def _state_nbytes(cls, state):
+        """Counts the bytes of the numpy arrays in a state."""
+        if isinstance(state, np.ndarray):
+            return state.nbytes
+        if isinstance(state, dict):
+            return sum(cls._state_nbytes(value) for value in state.values())
+        if isinstance(state, (tuple, list)):
+            return sum(cls._state_nbytes(value) for value in state)
+        return 0
+
+
+class ForkedSimulation:
+    """Class for a simulation running in a forked process."""
+
+    def __init__(self, sim, target, seed=None):
+        """Constructor that forks the process and runs the target in the child process.
+
+        Parameters
+        ----------
+        sim : BioSim
+                The simulation that is copied into the child process.
+        target : callable
+                Function called with the simulation in the child process.
+        seed : int
+                Random number seed for the simulation in the child process. If None, it continues
+                with the random number state of sim.
+        """
+        if not hasattr(os, "fork"):
+            raise RuntimeError("Forked simulations require os.fork, which is not available.")
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            try:
+                if seed is not None:
+                    sim._reseed(seed)
+                result = (True, target(sim))
+            except BaseException:
+                result = (False, traceback.format_exc())
+            try:
+                with os.fdopen(write_fd, "wb") as pipe:
+                    pickle.dump(result, pipe, pickle.HIGHEST_PROTOCOL)
+            finally:
+                os._exit(0)
+
+        os.close(write_fd)
+        self.pid = pid
+        self._read_fd = read_fd
+        self._finished = False
+        self._result = None
+
+    def join(self):
+        """Waits for the forked process to finish.
+
+        Returns
+        -------
+            The return value of the target function.
+        """
+        if not self._finished:
+            with os.fdopen(self._read_fd, "rb") as pipe:
+                data = pipe.read()
+            os.waitpid(self.pid, 0)
+            self._finished = True
+            if not data:
+                raise RuntimeError("The forked simulation exited without a result.")
+
+            succeeded, self._result = pickle.loads(data)
+            if not succeeded:
+                raise RuntimeError("The forked simulation failed:\n" + self._result)
+        return self._result
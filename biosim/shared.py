@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'biosim.shared' places the state of a running simulation in shared memory for other processes.
+
+Analysis processes usually get the state of a simulation from files written by
+BioSim.save_simulation, which copies and serializes all the animals. A SharedState instead keeps
+the cell, age and weight of every animal and the number of animals of each species in each cell in
+blocks of multiprocessing.shared_memory. It is attached to the simulation like the recorders, and
+writes the state into the blocks after every year.
+
+Other processes attach to the blocks with a small descriptor, a dictionary with the name of the
+blocks and the shape of the island, which can be sent to them as JSON or through a pipe. A
+SharedStateReader gives read-only numpy arrays on the blocks, so the processes compute statistics
+or render frames on the live state without copying or serializing it.
+
+The blocks are written while the readers may be reading them. The first number of the blocks is a
+sequence number, which is odd while the state is written. SharedStateReader.read runs a function
+on the arrays, and runs it again if the state was written while it ran, so the function always
+sees the state of one year.
+
+This file can be imported as a module and contains the following classes:
+
+    *   SharedState - Class that writes the state of a simulation to shared memory every year.
+
+    *   SharedStateReader - Class that reads the state from shared memory in another process.
+
+Notes
+-----
+    The population grows and shrinks, so the blocks have room for more animals than there are.
+    When there are more animals than there is room for, a new and larger block is made, and the
+    readers attach to it the next time they read. Each data block starts with its capacity, so
+    the readers never pair a block with the capacity of another.
+
+    The blocks are removed by SharedState.close, so the simulation process should close it when
+    the readers are done. Readers that read after that get a RuntimeError.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+import secrets
+import time
+
+from multiprocessing import resource_tracker, shared_memory
+
+_SEQUENCE, _YEAR, _GENERATION, _CAPACITY = range(4)
+_KEYS = (("cell", np.int64), ("age", np.int64), ("weight", np.float64))
+_created = set()
+
+
+def _layout(species, capacity, shape):
+    """Returns the dtype, offset and length of each array in a data block, and its size. The
+    first number of a data block is its capacity."""
+    layout = {}
+    offset = 8
+    for name in species:
+        for key, dtype in _KEYS:
+            layout[name, key] = (dtype, offset, capacity)
+            offset += capacity * 8
+    cells = shape[0] * shape[1] * len(species)
+    layout["counts"] = (np.int64, offset, cells)
+    return layout, offset + cells * 8
+
+
+def _attach(name):
+    """Attaches to a shared memory block made by another process, without letting the resource
+    tracker of this process remove it at exit."""
+    block = shared_memory.SharedMemory(name=name)
+    if name not in _created:
+        resource_tracker.unregister(block._name, "shared_memory")
+    return block
+
+
+def _create(name, size):
+    """Makes a new shared memory block."""
+    block = shared_memory.SharedMemory(name=name, create=True, size=max(size, 8))
+    _created.add(name)
+    return block
+
+
+class SharedState:
+    """Class for the state of a simulation in shared memory, written after every year."""
+
+    def __init__(self, sim, capacity=1024, name=None):
+        """Constructor that makes the blocks and writes the current state of the simulation.
+
+        Parameters
+        ----------
+        sim : BioSim
+                The simulation. Use sim.add_recorder to write the state after every year, or
+                BioSim.share_state, which does both.
+        capacity : int
+                Number of animals of each species there is room for at first.
+        name : str
+                Name of the header block, a random name if None.
+        """
+        self.name = name if name is not None else f"biosim_{secrets.token_hex(6)}"
+        self.species = tuple(sim.num_animals_per_species)
+        self.shape = sim.island.count_grid().shape[:2]
+        self._header = _create(self.name, (4 + len(self.species)) * 8)
+        self.header = np.ndarray(4 + len(self.species), dtype=np.int64, buffer=self._header.buf)
+        self.header[:] = 0
+        self._data = None
+        self._allocate(capacity)
+        self.record(sim)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def descriptor(self):
+        """Dictionary with the name of the header block, the species and the shape of the
+        island, which SharedStateReader attaches with."""
+        return {"name": self.name, "species": list(self.species), "shape": list(self.shape)}
+
+    def _allocate(self, capacity):
+        """Makes a new data block with room for capacity animals of each species."""
+        generation = int(self.header[_GENERATION]) + 1
+        layout, size = _layout(self.species, capacity, self.shape)
+        data = _create(f"{self.name}_{generation}", size)
+        np.ndarray(1, dtype=np.int64, buffer=data.buf)[0] = capacity
+        self._arrays = {
+            key: np.ndarray(length, dtype=dtype, buffer=data.buf, offset=offset)
+            for key, (dtype, offset, length) in layout.items()
+        }
+        if self._data is not None:
+            self._data.close()
+            self._data.unlink()
+        self._data = data
+        self.header[_CAPACITY] = capacity
+        self.header[_GENERATION] = generation
+
+    def record(self, sim):
+        """Writes the current state of a simulation to the blocks.
+
+        Parameters
+        ----------
+        sim : BioSim
+                The simulation.
+        """
+        population = sim.population_arrays()
+        needed = max(len(population[name]["cell"]) for name in self.species)
+        self.header[_SEQUENCE] += 1
+        if needed > self.header[_CAPACITY]:
+            self._allocate(max(2 * needed, 2 * int(self.header[_CAPACITY])))
+        for index, name in enumerate(self.species):
+            number = len(population[name]["cell"])
+            for key, _ in _KEYS:
+                self._arrays[name, key][:number] = population[name][key]
+            self.header[4 + index] = number
+        self._arrays["counts"][:] = sim.island.count_grid().ravel()
+        self.header[_YEAR] = sim.year
+        self.header[_SEQUENCE] += 1
+
+    def close(self):
+        """Removes the blocks. Readers that are still attached keep the memory until they close,
+        but can not read new years."""
+        self._arrays = {}
+        self.header[_GENERATION] = 0
+        self.header = None
+        for block in (self._data, self._header):
+            block.close()
+            block.unlink()
+            _created.discard(block.name)
+
+
+class SharedStateReader:
+    """Class for reading the state of a simulation from shared memory, without copying it."""
+
+    def __init__(self, descriptor):
+        """Constructor that attaches to the blocks of a SharedState.
+
+        Parameters
+        ----------
+        descriptor : dict
+                SharedState.descriptor of the simulation.
+        """
+        self.name = descriptor["name"]
+        self.species = tuple(descriptor["species"])
+        self.shape = tuple(descriptor["shape"])
+        self._header = _attach(self.name)
+        self.header = np.ndarray(
+            4 + len(self.species), dtype=np.int64, buffer=self._header.buf.toreadonly()
+        )
+        self._data = None
+        self._generation = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _reattach(self, deadline):
+        """Attaches to the newest data block if the simulation has made a new one.
+
+        The capacity is read from the data block itself, so the layout always fits the block.
+        If the simulation makes another block while attaching, it attaches again, until the
+        deadline from time.monotonic.
+        """
+        while True:
+            generation = int(self.header[_GENERATION])
+            if generation == self._generation:
+                return
+            if generation == 0:
+                raise RuntimeError("The shared state is closed by the simulation.")
+            self._arrays = {}
+            self._generation = None
+            if self._data is not None:
+                self._data.close()
+                self._data = None
+            try:
+                data = _attach(f"{self.name}_{generation}")
+            except FileNotFoundError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(
+                        f"The data block {self.name}_{generation} of the shared state is removed."
+                    ) from None
+                time.sleep(0.001)
+                continue
+            buffer = data.buf.toreadonly()
+            capacity = int(np.ndarray(1, dtype=np.int64, buffer=buffer)[0])
+            if int(self.header[_GENERATION]) != generation:
+                del buffer
+                data.close()
+                continue
+            layout, _ = _layout(self.species, capacity, self.shape)
+            self._data = data
+            self._arrays = {
+                key: np.ndarray(length, dtype=dtype, buffer=buffer, offset=offset)
+                for key, (dtype, offset, length) in layout.items()
+            }
+            self._generation = generation
+
+    def arrays(self, timeout=10.0):
+        """Returns read-only views of the current state.
+
+        The views change when the simulation writes a new year, see SharedStateReader.read for
+        reading the state of one year.
+
+        Parameters
+        ----------
+        timeout : float
+                Seconds to keep trying to attach to a new data block of the simulation.
+
+        Returns
+        -------
+        dict
+            Dictionary with 'year', a dictionary of 'cell', 'age' and 'weight' arrays for each
+            species, and 'counts', the number of animals of each species in each cell with shape
+            (rows, columns, species) like Island.count_grid. A RuntimeError is raised if the
+            SharedState is closed, or its data block is missing for longer than timeout.
+        """
+        self._reattach(time.monotonic() + timeout)
+        state = {
+            "year": int(self.header[_YEAR]),
+            "counts": self._arrays["counts"].reshape(self.shape + (len(self.species),)),
+        }
+        for index, name in enumerate(self.species):
+            number = int(self.header[4 + index])
+            state[name] = {key: self._arrays[name, key][:number] for key, _ in _KEYS}
+        return state
+
+    def read(self, function, timeout=10.0):
+        """Runs a function on the state of one year.
+
+        Parameters
+        ----------
+        function : callable
+                Function taking the dictionary of SharedStateReader.arrays. It must not keep the
+                arrays, since they change when the next year is written.
+        timeout : float
+                Seconds to keep trying while the simulation writes new years.
+
+        Returns
+        -------
+            The return value of the function, computed on a state that was not written while
+            the function ran.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            sequence = int(self.header[_SEQUENCE])
+            if sequence % 2 == 0:
+                result = function(self.arrays(max(deadline - time.monotonic(), 0.0)))
+                if int(self.header[_SEQUENCE]) == sequence:
+                    return result
+            if time.monotonic() > deadline:
+                raise TimeoutError("The shared state was written during every read.")
+            time.sleep(0.001)
+
+    def close(self):
+        """Detaches from the blocks. Views returned by arrays must be deleted first."""
+        self._arrays = {}
+        self.header = None
+        for block in (self._data, self._header):
+            if block is not None:
+                block.close()
@@ -30,17 +30,39 @@ Notes
 __author__ = "Johan Stabekk, Sabina Langås"
 __email__ = "johansta@nmbu.no, sabinal@nmbu.no"
 
+import asyncio
+import contextlib
+import copy
 import numpy as np
 import pandas as pd
-import pickle
 import matplotlib.pyplot as plt
+import threading
+from biosim.checkpoint import (
+    CheckpointWriter,
+    checkpoint_file,
+    get_parameters,
+    load_checkpoint,
+    save_checkpoint,
+    set_parameters,
+)
+from biosim.compiled import CompiledIsland
 from biosim.island import Island
+from biosim.memory import memory_report
+from biosim.pools import RandomPool
+from biosim import pools
+from biosim.scenario import ForkedSimulation
+from biosim.shared import SharedState
+from biosim.snapshot import YearSnapshot
+from biosim.streams import RandomStreams
+from biosim.threaded import ThreadedIsland
+from biosim.vectorized import VectorizedIsland
 from biosim.visualization import Visualization
 from biosim.animals import Herbivore, Carnivore
 from biosim.landscapes import Lowland, Highland
 
 import os
 import subprocess
+from concurrent.futures import ProcessPoolExecutor
 
 
 # update these variables to point to your ffmpeg and convert binaries
@@ -54,10 +76,21 @@ _DEFAULT_IMAGE_FORMAT = "png"
 _DEFAULT_MOVIE_FORMAT = "mp4"
 DEFAULT_IMAGE_BASE = os.path.join(_DEFAULT_GRAPHICS_DIR, _DEFAULT_IMAGE_NAME)
 
+# all simulations share the global numpy random number generator, so only one of them may simulate
+# at a time when they run in different threads
+_RANDOM_STATE_LOCK = threading.RLock()
+
 
 class BioSim:
     """Simulation interface class."""
 
+    engines = {
+        "reference": Island,
+        "vectorized": VectorizedIsland,
+        "compiled": CompiledIsland,
+        "threaded": ThreadedIsland,
+    }
+
     default_pop = [
         {
             "loc": (4, 4),
@@ -94,6 +127,9 @@ class BioSim:
         hist_specs=None,
         img_base=None,
         img_fmt=None,
+        engine="reference",
+        random_streams=False,
+        random_pool=False,
     ):
         """
         Parameters
@@ -122,6 +158,21 @@ class BioSim:
         img_fmt : str
                 String with file type for figures, e.g. 'png'
 
+        engine : str
+                Name of the engine simulating the island, a key of BioSim.engines. 'reference'
+                keeps every animal as an object, 'vectorized' keeps the animals as numpy arrays,
+                'compiled' adds compiled kernels to the vectorized engine and 'threaded' does the
+                cells with compiled kernels on several threads.
+
+        random_streams : bool
+                If True, each cell draws its random numbers from its own stream for each year and
+                phase, made from the seed, see biosim.streams. The result then does not depend on
+                the order the cells are done in. Only for the array engines, not 'reference'.
+
+        random_pool : bool
+                If True, the animals draw their random numbers from a pool of numbers drawn in
+                blocks, made from the seed, see biosim.pools. Only for the 'reference' engine.
+
         If ymax_animals is None, the y-axis limit should be adjusted automatically.
 
         If cmax_animals is None, sensible, fixed default values should be used.
@@ -136,6 +187,16 @@ class BioSim:
         .format(img_base, img_no, img_fmt) where img_no are consecutive image numbers starting from
         0. img_base should contain a path and beginning of a file name.
         """
+        if engine not in self.engines:
+            raise ValueError(f"Unknown engine {engine}, use one of {', '.join(self.engines)}.")
+        self.engine = engine
+        if random_streams and not hasattr(self.engines[engine], "streams"):
+            raise ValueError(f"The {engine} engine does not support random streams.")
+        self._streams = RandomStreams(seed) if random_streams else None
+        if random_pool and not issubclass(self.engines[engine], Island):
+            raise ValueError(f"The {engine} engine does not use a random pool.")
+        self._pool = RandomPool(seed) if random_pool else None
+
         np.random.seed(seed)
 
         if ini_pop is None:
@@ -157,7 +218,9 @@ class BioSim:
         else:
             self.hist_specs = hist_specs
 
-        self.island = Island(self.island_map, self.ini_pop)
+        self.island = self.engines[engine](self.island_map, self.ini_pop)
+        if self._streams is not None:
+            self.island.streams = self._streams
         self.num_images = 0
         self._current_year = 0
         self.ymax_animals = ymax_animals
@@ -182,6 +245,9 @@ class BioSim:
 
         self._image_counter = 0
         self.vis = Visualization(self.cmax_animals, self.hist_specs)
+        self._random_state = np.random.get_state()
+        self.recorders = []
+        self._profiler = None
 
     @staticmethod
     def set_animal_parameters(species, params):
@@ -217,46 +283,385 @@ class BioSim:
         elif landscape == "Highland":
             Highland.set_params(params)
 
-    def simulate(self, num_years, vis_years=1, img_years=None):
+    def simulate(
+        self,
+        num_years,
+        vis_years=1,
+        img_years=None,
+        checkpoint_every=None,
+        checkpoint_dir=None,
+        checkpoint_keep=None,
+        progress=None,
+    ):
         """Run simulation while visualizing the result.
 
         Parameters
         ----------
         num_years : int
                 Number of years to simulate
-        vis_years : int
-                Years between visualization updates
+        vis_years : int or None
+                Years between visualization updates, None simulates without any graphics
         img_years : int
                 Years between visualizations saved to files (default: vis_years)
+        checkpoint_every : int
+                Years between checkpoints written to checkpoint_dir. If None, no checkpoints are
+                written.
+        checkpoint_dir : str
+                Directory for the checkpoints
+        checkpoint_keep : int
+                Number of the checkpoints of this run kept in checkpoint_dir, None keeps all of
+                them
+        progress : ProgressMonitor
+                Monitor that reports the progress of the simulation at a wall-clock interval. If
+                None, no progress is reported.
 
         Image files will be numbered consecutively.
+
+        Checkpoints are written by a background thread while the simulation continues, and are
+        named checkpoint_{year:08d}.npz. Use BioSim.resume_simulation to continue from one of
+        them.
         """
+        if img_years is None:
+            img_years = vis_years
+
+        if checkpoint_every is not None and checkpoint_dir is None:
+            raise ValueError("checkpoint_dir must be given with checkpoint_every.")
+
         num_years = self._current_year + num_years
-        self.vis.set_graphics(self.ymax_animals, num_years + 1, self.year)
-        self.vis.standard_map(self.island_map)
-        self.vis.update_herb_heatmap(self.animal_distribution)
-        self.vis.update_carn_heatmap(self.animal_distribution)
-        self.vis.update_fitness(
-            self.island.fitness_age_weight[0], self.island.fitness_age_weight[1]
+        if vis_years is not None:
+            self.vis.set_graphics(self.ymax_animals, num_years + 1, self.year)
+            self.vis.standard_map(self.island_map)
+            self.vis.update_herb_heatmap(self.animal_distribution)
+            self.vis.update_carn_heatmap(self.animal_distribution)
+            self.vis.update_fitness(
+                self.island.fitness_age_weight[0], self.island.fitness_age_weight[1]
+            )
+            self.vis.update_age(
+                self.island.fitness_age_weight[0], self.island.fitness_age_weight[1]
+            )
+            self.vis.update_weight(
+                self.island.fitness_age_weight[0], self.island.fitness_age_weight[1]
+            )
+
+        writer = None
+        if checkpoint_every is not None:
+            writer = CheckpointWriter(checkpoint_dir, keep=checkpoint_keep)
+
+        if progress is not None:
+            progress.start(self, num_years)
+
+        try:
+            with self._random_numbers():
+                while self._current_year < num_years:
+                    self.island.cycle_island()
+                    self._current_year += 1
+                    for recorder in self.recorders:
+                        recorder.record(self)
+                    if progress is not None:
+                        progress.update(self)
+                    if vis_years is not None:
+                        if self._count % vis_years == 0:
+                            with self._timer("fitness_age_weight"):
+                                herb_attributes, carn_attributes = self.island.fitness_age_weight
+                            with self._timer("visualization"):
+                                self.vis.update_graphics(
+                                    self.animal_distribution,
+                                    self.num_animals_per_species,
+                                    self.year,
+                                    herb_attributes,
+                                    carn_attributes,
+                                )
+
+                        if self._count % img_years == 0:
+                            with self._timer("_save_file"):
+                                self._save_file()
+                    self._count += 1
+
+                    if writer is not None and self._current_year % checkpoint_every == 0:
+                        self._random_state = np.random.get_state()
+                        writer.submit(self.get_state())
+        finally:
+            if progress is not None:
+                progress.finish(self)
+            if writer is not None:
+                writer.close()
+
+    def iter_years(self, num_years, stats=("num_animals_per_species",)):
+        """Simulates one year for each step of the iteration, without any graphics.
+
+        Each step yields a YearSnapshot of the year just simulated. The snapshot only gives the
+        statistics named in stats, and computes them the first time they are used, which must be
+        before the next step. Stopping the iteration early leaves the simulation at the last year
+        simulated, so it can be continued later.
+
+        Parameters
+        ----------
+        num_years : int
+                Number of years to simulate
+        stats : tuple
+                Names of the statistics in the snapshots, see YearSnapshot.statistics
+
+        Yields
+        ------
+        YearSnapshot
+            Read-only snapshot of the year just simulated.
+        """
+        final_year = self._current_year + num_years
+        snapshot = None
+
+        while self._current_year < final_year:
+            if snapshot is not None:
+                snapshot.expire()
+            self._advance(1)
+            snapshot = YearSnapshot(self, stats)
+            yield snapshot
+
+    async def run_async(
+        self,
+        num_years,
+        chunk=1,
+        stats=("num_animals_per_species",),
+        executor=None,
+        max_ahead=0,
+    ):
+        """Simulates in blocks of years in an executor, without blocking the event loop.
+
+        Use as 'async for snapshot in sim.run_async(years, chunk=k)'. Each block of chunk years
+        is simulated in the executor, and a YearSnapshot of the last year of the block is yielded.
+        The statistics of the snapshot are computed in the executor as well, so they can be used
+        at any time.
+
+        At most max_ahead snapshots are simulated before the consumer asks for them, so a slow
+        consumer holds the simulation back instead of letting snapshots pile up. If the iteration
+        is stopped or cancelled, the simulation stops at the end of the year being simulated, and
+        can be continued later.
+
+        Parameters
+        ----------
+        num_years : int
+                Number of years to simulate
+        chunk : int
+                Number of years in each block
+        stats : tuple
+                Names of the statistics in the snapshots, see YearSnapshot.statistics
+        executor : concurrent.futures.Executor
+                Executor the blocks are simulated in. If None, the default thread pool of the
+                event loop is used. With a ProcessPoolExecutor, the state is sent to the process
+                for each block, recorders are only called for the last year of each block and a
+                cancelled block is finished before the simulation stops.
+        max_ahead : int
+                Number of snapshots that can be simulated before the consumer asks for them
+
+        Yields
+        ------
+        YearSnapshot
+            Read-only snapshot of the last year of each block.
+        """
+        loop = asyncio.get_running_loop()
+        final_year = self._current_year + num_years
+        stop = threading.Event()
+        results = asyncio.Queue()
+        credits = asyncio.Semaphore(max_ahead + 1)
+        running = []
+
+        async def produce():
+            year = self._current_year
+            try:
+                while year < final_year:
+                    await credits.acquire()
+                    years = min(chunk, final_year - year)
+                    if isinstance(executor, ProcessPoolExecutor):
+                        block = self._run_process_block(loop, executor, years, stats)
+                        running[:] = [asyncio.ensure_future(block)]
+                    else:
+                        running[:] = [
+                            loop.run_in_executor(executor, self._run_block, years, stats, stop)
+                        ]
+                    snapshot = await asyncio.shield(running[0])
+                    year += years
+                    await results.put(snapshot)
+                await results.put(None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                await results.put(err)
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                item = await results.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+                credits.release()
+        finally:
+            stop.set()
+            producer.cancel()
+            if running and not running[0].done():
+                await asyncio.wait(running)
+            await asyncio.gather(producer, return_exceptions=True)
+
+    def _advance(self, num_years, stop=None):
+        """Simulates years without graphics, calling the recorders after every year.
+
+        Parameters
+        ----------
+        num_years : int
+                Number of years to simulate
+        stop : threading.Event
+                If given, the simulation stops before the next year when it is set.
+        """
+        with self._random_numbers():
+            for _ in range(num_years):
+                if stop is not None and stop.is_set():
+                    break
+                self.island.cycle_island()
+                self._current_year += 1
+                self._count += 1
+                for recorder in self.recorders:
+                    recorder.record(self)
+
+    @contextlib.contextmanager
+    def _random_numbers(self):
+        """Makes the random number state and the random pool of the simulation active.
+
+        All simulations share the global numpy generator, so the lock makes simulations in other
+        threads wait until the context is done.
+        """
+        with _RANDOM_STATE_LOCK:
+            np.random.set_state(self._random_state)
+            try:
+                with pools.activated(self._pool):
+                    yield
+            finally:
+                self._random_state = np.random.get_state()
+
+    def _run_block(self, num_years, stats, stop):
+        """Simulates a block of years and returns a snapshot with all statistics computed."""
+        self._advance(num_years, stop)
+        with _RANDOM_STATE_LOCK:
+            snapshot = YearSnapshot(self, stats)
+            snapshot.materialize()
+        return snapshot
+
+    async def _run_process_block(self, loop, executor, num_years, stats):
+        """Simulates a block of years in another process, and takes over the resulting state."""
+        state = await loop.run_in_executor(None, self.get_state)
+        state["history"] = None
+        state, snapshot = await loop.run_in_executor(
+            executor, _simulate_block, state, get_parameters(), num_years, stats, self.engine
         )
-        self.vis.update_age(self.island.fitness_age_weight[0], self.island.fitness_age_weight[1])
-        self.vis.update_weight(self.island.fitness_age_weight[0], self.island.fitness_age_weight[1])
-
-        while self._current_year < num_years:
-            self.island.cycle_island()
-            self._current_year += 1
-            if self._count % vis_years == 0:
-                self.vis.update_graphics(
-                    self.animal_distribution,
-                    self.num_animals_per_species,
-                    self.year,
-                    self.island.fitness_age_weight[0],
-                    self.island.fitness_age_weight[1],
-                )
-
-            if self._count % img_years == 0:
-                self._save_file()
-            self._count += 1
+        state["history"] = None
+        await loop.run_in_executor(None, self.set_state, state)
+        for recorder in self.recorders:
+            recorder.record(self)
+        return snapshot
+
+    @property
+    def profiler(self):
+        """The PhaseProfiler measuring the simulation, None if it is not profiled.
+
+        Set it to a PhaseProfiler to start profiling, and to None to stop. Only the reference
+        engine measures the time in each cell, so the array engines do not take a profiler with
+        per_cell=True.
+        """
+        return self._profiler
+
+    @profiler.setter
+    def profiler(self, profiler):
+        if profiler is not None and profiler.per_cell and not isinstance(self.island, Island):
+            raise ValueError(
+                f"The {self.engine} engine does not measure the time in each cell, "
+                "use PhaseProfiler(per_cell=False) or the reference engine."
+            )
+        self._profiler = profiler
+        self.island.profiler = profiler
+
+    def _timer(self, phase):
+        """Returns a context manager timing a phase if the simulation is profiled."""
+        if self._profiler is None:
+            return contextlib.nullcontext()
+        return self._profiler.timer(phase)
+
+    def memory_report(self):
+        """Returns the estimated memory used by the simulation, see biosim.memory.memory_report."""
+        return memory_report(self)
+
+    def add_recorder(self, recorder):
+        """Attaches a recorder that is called after every simulated year.
+
+        Parameters
+        ----------
+        recorder : TimeSeriesRecorder
+                Recorder with a record method taking the simulation as argument, see
+                biosim.recorder.
+        """
+        self.recorders.append(recorder)
+
+    def population_arrays(self):
+        """Returns the cell index, age and weight of all animals as numpy arrays.
+
+        The array engines return read-only views of their own arrays, so nothing is copied. The
+        cell index counts the cells of the map row by row, starting at 0 in the upper left corner.
+
+        Returns
+        -------
+        dict
+            Dictionary with one dictionary of 'cell', 'age' and 'weight' arrays for each species.
+        """
+        return self.island.population_arrays()
+
+    def population_frame(self, species="Herbivore"):
+        """Returns the animals of a species as a DataFrame.
+
+        The 'age' and 'weight' columns share memory with the arrays of the array engines. The
+        'row' and 'col' columns are the location of the animal, counted from 1 like the
+        locations of the initial population, and 'fitness' is computed from the age and weight.
+
+        Parameters
+        ----------
+        species : str
+                Name of the species, 'Herbivore' or 'Carnivore'.
+
+        Returns
+        -------
+        pandas.DataFrame
+            One row for each animal, with the columns row, col, age, weight and fitness.
+        """
+        species_classes = {"Herbivore": Herbivore, "Carnivore": Carnivore}
+        if species not in species_classes:
+            raise ValueError(f"Unknown species {species}, use Herbivore or Carnivore.")
+        animals = self.population_arrays()[species]
+        row, col = np.divmod(animals["cell"], self.island.count_grid().shape[1])
+        columns = {
+            "row": row + 1,
+            "col": col + 1,
+            "age": animals["age"],
+            "weight": animals["weight"],
+            "fitness": species_classes[species].fitness_of(animals["age"], animals["weight"]),
+        }
+        return pd.DataFrame(columns, copy=False)
+
+    def share_state(self, capacity=1024):
+        """Writes the state of the simulation to shared memory now and after every year, for
+        analysis processes, see biosim.shared.
+
+        Parameters
+        ----------
+        capacity : int
+                Number of animals of each species there is room for at first.
+
+        Returns
+        -------
+        SharedState
+            The shared state. Send SharedState.descriptor to the analysis processes, and close
+            the shared state when they are done.
+        """
+        shared = SharedState(self, capacity)
+        self.add_recorder(shared)
+        return shared
 
     def add_population(self, population):
         """Add a population to the island
@@ -294,23 +699,148 @@ class BioSim:
             Dataframe used in heat map visualization
 
         """
-        data = {}
-        rows = []
-        col = []
-        herbs = []
-        carns = []
-        for coord, cell in self.island.island_map.items():
-            herbs.append(len(cell.herbivore_list))
-            carns.append(len(cell.carnivore_list))
-            rows.append(coord[0])
-            col.append(coord[1])
-        data["Row"] = rows
-        data["Col"] = col
-        data["Herbivore"] = herbs
-        data["Carnivore"] = carns
+        grid = self.island.count_grid()
+        rows, cols = np.indices(grid.shape[:2]) + 1
+        data = {
+            "Row": rows.ravel(),
+            "Col": cols.ravel(),
+            "Herbivore": grid[:, :, 0].ravel(),
+            "Carnivore": grid[:, :, 1].ravel(),
+        }
         df = pd.DataFrame(data)
         return df
 
+    def get_state(self):
+        """Returns the state of the simulation. The simulation can be continued from this state
+        later by BioSim.set_state, also in a different BioSim instance.
+
+        Each simulation keeps its own random number state, which is only active while it
+        simulates. Two simulations made from the same state therefore draw the same random numbers.
+
+        Returns
+        -------
+        dict
+            Dictionary with the year, the name of the engine, the random number state, the seed
+            of the random streams, the state of the random pool, the island state made by
+            Island.get_state, the counters for visualization and images, and the plotted animal
+            counts.
+        """
+        return {
+            "year": self._current_year,
+            "engine": self.engine,
+            "random_state": self._random_state,
+            "random_streams": None if self._streams is None else self._streams.seed,
+            "random_pool": None if self._pool is None else self._pool.get_state(),
+            "island": self.island.get_state(),
+            "count": self._count,
+            "image_counter": self._image_counter,
+            "history": self.vis.get_history(),
+        }
+
+    def set_state(self, state):
+        """Sets the simulation to a state made by BioSim.get_state.
+
+        Parameters
+        ----------
+        state : dict
+                Dictionary with the year and island state. The random number state, the random
+                streams and pool, the counters and the plotted animal counts are set if they are in
+                the state. The settings of the engine, like the threads of ThreadedIsland, are
+                kept.
+        """
+        if state.get("random_pool") is not None:
+            if not issubclass(self.engines[self.engine], Island):
+                raise ValueError(f"The {self.engine} engine does not use a random pool.")
+            self._pool = RandomPool.from_state(state["random_pool"])
+        if state.get("random_streams") is not None:
+            if not hasattr(self.engines[self.engine], "streams"):
+                raise ValueError(f"The {self.engine} engine does not support random streams.")
+            self._streams = RandomStreams(state["random_streams"])
+        island = self.engines[self.engine].from_state(state["island"])
+        if type(island) is type(self.island):
+            for name in getattr(island, "settings", ()):
+                if name in vars(self.island):
+                    setattr(island, name, copy.deepcopy(getattr(self.island, name)))
+        self.island = island
+        self.island.profiler = self._profiler
+        if self._streams is not None:
+            self.island.streams = self._streams
+            self.island.year = state["year"]
+        self.island_map = self.island.geography
+        self._current_year = state["year"]
+        self._random_state = state.get("random_state", self._random_state)
+        self._count = state.get("count", self._count)
+        self._image_counter = state.get("image_counter", self._image_counter)
+        if state.get("history") is not None:
+            self.vis.set_history(state["history"])
+
+    def fork(self, seed=None):
+        """Returns an independent copy of the simulation at the current year.
+
+        The copy is made from the array state of the island, which is much faster than a deep copy
+        or a pickle round trip of all the landscape and animal objects. The fork has its own random
+        number state, so simulating one of them does not change the random numbers drawn by the
+        other. The fork does not save figures to file.
+
+        Parameters
+        ----------
+        seed : int
+                Random number seed for the fork, also used for its random streams or pool. If
+                None, the fork continues with a copy of the random number state, and simulates
+                exactly like this simulation would.
+
+        Returns
+        -------
+        BioSim
+            The new simulation.
+        """
+        sim = self._spawn(self.get_state())
+        if seed is not None:
+            sim._reseed(seed)
+        return sim
+
+    def _reseed(self, seed):
+        """Sets the random number state, and the random streams or pool, from a new seed."""
+        self._random_state = np.random.RandomState(seed).get_state()
+        if self._streams is not None:
+            self._streams = self.island.streams = RandomStreams(seed)
+        if self._pool is not None:
+            self._pool = RandomPool(seed)
+
+    def fork_process(self, target, seed=None):
+        """Runs a function on a copy-on-write copy of the simulation in a forked process.
+
+        The copy is made by os.fork, so it is made without copying any of the state. Several
+        forked simulations can run in parallel. Use vis_years=None when simulating in the forked
+        process. Only available on platforms with os.fork, like Linux.
+
+        Parameters
+        ----------
+        target : callable
+                Function called with the forked simulation as argument. The return value must
+                be picklable.
+        seed : int
+                Random number seed for the forked simulation. If None, it continues with the random
+                number state of this simulation.
+
+        Returns
+        -------
+        ForkedSimulation
+            Handle for the forked process, use ForkedSimulation.join to get the return value.
+        """
+        return ForkedSimulation(self, target, seed)
+
+    def _spawn(self, state):
+        """Makes a new simulation with the settings of this simulation and the given state."""
+        sim = copy.copy(self)
+        sim.vis = Visualization(self.cmax_animals, self.hist_specs)
+        sim._image_base = None
+        sim.recorders = []
+        sim._profiler = None
+        sim.set_state(state)
+        sim._image_counter = 0
+        return sim
+
     def _save_file(self):
         """Saves graphics to file if file name given."""
 
@@ -355,41 +885,94 @@ class BioSim:
         except subprocess.CalledProcessError as err:
             raise RuntimeError("ERROR: ffmpeg failed with: {}".format(err))
 
-    def save_simulation(self, name):
-        """ Saves the state of the island at the time it is called.
+    def save_simulation(self, name, compress=False):
+        """ Saves the state of the simulation at the time it is called.
 
             * Set the 'name' for the file.
-            * The file gets saved.
-            * Use BioSim.load_simulation to load the saved data.
+            * The file gets saved as a checkpoint, see biosim.checkpoint.
+            * Use BioSim.resume_simulation to continue the simulation, or BioSim.load_simulation
+              to load the saved island.
 
         Parameters
         ----------
         name : str
-                The name the file shall have.
-        Returns
-        -------
-            Dumps/saves a pickled file
+                The name the file shall have. The '.npz' extension is added if it is missing.
+        compress : bool
+                If True, the checkpoint is compressed.
         """
-        with open(name + ".pickle", "wb") as save_file:      # IMPLEMENT STORAGE OF RANDOM SEED
-            pickle.dump(self.island, save_file, pickle.HIGHEST_PROTOCOL)
+        with open(checkpoint_file(name), "wb") as save_file:
+            save_checkpoint(save_file, self.get_state(), compress)
 
     @staticmethod
-    def load_simulation(name):
-        """ Loads a already pickled file and returns the content.
+    def load_simulation(name, mmap=False):
+        """ Loads a saved checkpoint, sets the saved parameters and returns the island.
 
             * Input the 'name' of the file that was saved.
             * Set the data equal to some name.
             * Use this name further to replace existing island or place a new.
 
-        For an example check: BioSim_G13_Johan_Sabina\examples\check_sim_pickled.py
+        For an example check: BioSim_G13_Johan_Sabina/examples/check_sim_pickled.py
+
+        Parameters
+        ----------
+        name : str
+                The name of the file you want to load, with or without the '.npz' extension.
+        mmap : bool
+                If True, the arrays of an uncompressed checkpoint are memory-mapped when loaded.
+        Returns
+        -------
+        Island
+            The island in the state it was saved.
+        """
+        state = load_checkpoint(checkpoint_file(name), mmap)
+        set_parameters(state["params"])
+        return Island.from_state(state["island"])
+
+    @classmethod
+    def resume_simulation(cls, name, mmap=False, **kwargs):
+        """ Continues a simulation saved by BioSim.save_simulation.
+
+        The year, the random number state, the plotted animal counts, the image numbering and the
+        parameters are restored, and the simulation is resumed with the engine it was saved with,
+        so it continues exactly like the simulation that was saved would have done.
 
         Parameters
         ----------
         name : str
-                The name of the file you want to load.
+                The name of the file you want to load, with or without the '.npz' extension.
+        mmap : bool
+                If True, the arrays of an uncompressed checkpoint are memory-mapped when loaded.
+        kwargs :
+                Other arguments for the BioSim constructor, like img_base and hist_specs. An
+                engine given here is used instead of the engine of the checkpoint.
+
         Returns
         -------
-            The state of the pickled object.
+        BioSim
+            The resumed simulation.
         """
-        with open(name + ".pickle", "rb") as load_file:
-            return pickle.load(load_file)
+        state = load_checkpoint(checkpoint_file(name), mmap)
+        set_parameters(state["params"])
+        kwargs.setdefault("engine", state.get("engine", "reference"))
+        sim = cls(island_map=state["island"]["geography"], ini_pop=[], **kwargs)
+        sim.set_state(state)
+        return sim
+
+
+def _simulate_block(state, params, num_years, stats, engine="reference"):
+    """Simulates a block of years of a state, for simulations run in other processes.
+
+    Returns
+    -------
+    state : dict
+            The state after the block.
+    snapshot : YearSnapshot
+            Snapshot of the last year with all statistics computed.
+    """
+    set_parameters(params)
+    sim = BioSim(island_map=state["island"]["geography"], ini_pop=[], engine=engine)
+    sim.set_state(state)
+    sim._advance(num_years)
+    snapshot = YearSnapshot(sim, stats)
+    snapshot.materialize()
+    return sim.get_state(), snapshot
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'biosim.snapshot' gives read-only views of the statistics of a simulated year.
+
+BioSim.iter_years yields one YearSnapshot for every simulated year. A snapshot only gives access to
+the statistics that were asked for, and computes each of them the first time it is used. Statistics
+that are never used cost nothing.
+
+The statistics are computed from the simulation itself, so they must be used before the
+simulation continues with the next year. Statistics that were used are kept by the snapshot, and
+can be used later.
+
+This file can be imported as a module and contains the following class:
+
+    *   YearSnapshot - Class with the lazily computed statistics of one year.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+
+
+def _read_only(value):
+    """Makes the numpy arrays in a value read-only."""
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _read_only(item)
+    elif isinstance(value, tuple):
+        for item in value:
+            _read_only(item)
+    return value
+
+
+class YearSnapshot:
+    """Class for the statistics of one simulated year."""
+
+    statistics = {
+        "num_animals": lambda sim: sim.num_animals,
+        "num_animals_per_species": lambda sim: sim.num_animals_per_species,
+        "count_grid": lambda sim: sim.island.count_grid(),
+        "fitness_age_weight": lambda sim: sim.island.fitness_age_weight,
+        "animal_distribution": lambda sim: sim.animal_distribution,
+    }
+
+    def __init__(self, sim, stats):
+        """Constructor that initiates YearSnapshot class instances.
+
+        Parameters
+        ----------
+        sim : BioSim
+                The simulation, at the year of the snapshot.
+        stats : tuple
+                Names of the statistics that can be used, keys of YearSnapshot.statistics.
+        """
+        for name in stats:
+            if name not in self.statistics:
+                raise ValueError(f"Unknown statistic {name}.")
+
+        self._sim = sim
+        self._stats = tuple(stats)
+        self._values = {}
+        self.year = sim.year
+
+    def __repr__(self):
+        return f"YearSnapshot(year={self.year}, stats={self._stats})"
+
+    def __getitem__(self, name):
+        """Returns a statistic, computing it if it is used for the first time.
+
+        Parameters
+        ----------
+        name : str
+                Name of the statistic.
+        """
+        if name not in self._stats:
+            raise KeyError(f"Statistic {name} was not asked for.")
+
+        if name not in self._values:
+            if self._sim is None:
+                raise RuntimeError(
+                    f"Statistic {name} of year {self.year} was not used before the simulation "
+                    f"continued."
+                )
+            self._values[name] = _read_only(self.statistics[name](self._sim))
+        return self._values[name]
+
+    def __getattr__(self, name):
+        """Gives the statistics as attributes."""
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError as err:
+            raise AttributeError(str(err)) from None
+
+    def keys(self):
+        """Names of the statistics that can be used."""
+        return self._stats
+
+    def materialize(self):
+        """Computes all the statistics, and detaches the snapshot from the simulation."""
+        for name in self._stats:
+            self[name]
+        self.expire()
+
+    def expire(self):
+        """Detaches the snapshot from the simulation. Called before the simulation continues."""
+        self._sim = None
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'biosim.streams' gives each cell its own random number stream for every year and phase.
+
+With the global numpy generator, the random numbers an animal gets depend on all the numbers drawn
+before it, so the result of a simulation depends on the order the cells are done in. The array
+engines can instead draw from RandomStreams, where the numbers of a cell in a phase of a year only
+depend on the seed, the year, the cell and the phase. The cells can then be done in any order, or
+in parallel, and still give the same result for the same seed.
+
+The streams are counter-based. Each stream is a Philox generator with a key made from the seed by
+numpy.random.SeedSequence, and a counter that starts at (0, phase, cell, year). Nothing has to be
+stored or spawned for each stream, and starting a stream only sets the state of the generator.
+
+This file can be imported as a module and contains the following class:
+
+    *   RandomStreams - Class with the random number streams of a simulation.
+
+Notes
+-----
+    A stream must only be used once, so a phase draws the numbers of each cell from its stream in
+    a fixed order. Draws of different kinds in a phase, like the births and the weights of the
+    babies of each species, use different substreams of the phase.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+
+
+class RandomStreams:
+    """Class for the independent random number streams of the cells of a simulation."""
+
+    phases = (
+        "herbivore_eats",
+        "carnivore_eats",
+        "reproduce",
+        "migrate_animals",
+        "age_weight_die",
+        "cycle_cells",
+    )
+
+    def __init__(self, seed):
+        """Constructor that initiates RandomStreams class instances.
+
+        Parameters
+        ----------
+        seed : int
+                Seed all the streams are made from. If None, a seed is drawn from the operating
+                system, and kept in the seed attribute so the streams can be made again.
+        """
+        seed_sequence = np.random.SeedSequence(seed)
+        self.seed = seed_sequence.entropy
+        self.key = seed_sequence.generate_state(2, dtype=np.uint64)
+
+    def __eq__(self, other):
+        return isinstance(other, RandomStreams) and self.seed == other.seed
+
+    def __hash__(self):
+        return hash(self.seed)
+
+    def _state(self, year, cell, phase, substream):
+        """Returns the state of the Philox generator at the start of a stream."""
+        if phase not in self.phases:
+            raise ValueError(f"Unknown phase {phase}, use one of {', '.join(self.phases)}.")
+        counter = [0, (self.phases.index(phase) << 32) | substream, cell, year]
+        return {
+            "bit_generator": "Philox",
+            "state": {"counter": np.array(counter, dtype=np.uint64), "key": self.key},
+            "buffer": np.zeros(4, dtype=np.uint64),
+            "buffer_pos": 4,
+            "has_uint32": 0,
+            "uinteger": 0,
+        }
+
+    def generator(self, year, cell, phase, substream=0):
+        """Returns the generator of the stream of a cell in a phase of a year.
+
+        Parameters
+        ----------
+        year : int
+                The year that is simulated.
+        cell : int
+                Index of the cell, counting the cells of the map row by row from 0.
+        phase : str
+                Name of the phase, one of RandomStreams.phases.
+        substream : int
+                Number of the substream of the phase.
+
+        Returns
+        -------
+        numpy.random.Generator
+            New generator at the start of the stream.
+        """
+        bit_generator = np.random.Philox(key=self.key)
+        bit_generator.state = self._state(year, cell, phase, substream)
+        return np.random.Generator(bit_generator)
+
+    def _draw(self, year, phase, cells, substream, method, *args):
+        """Draws one number for each entry of cells from the stream of its cell."""
+        cells = np.asarray(cells, dtype=np.int64)
+        values = np.empty(len(cells))
+        if len(cells) == 0:
+            return values
+
+        order = np.argsort(cells, kind="stable")
+        unique, starts, counts = np.unique(cells[order], return_index=True, return_counts=True)
+        bit_generator = np.random.Philox(key=self.key)
+        generator = np.random.Generator(bit_generator)
+        draw = getattr(generator, method)
+        for cell, start, count in zip(unique.tolist(), starts.tolist(), counts.tolist()):
+            bit_generator.state = self._state(year, cell, phase, substream)
+            values[order[start : start + count]] = draw(*args, size=count)
+        return values
+
+    def random(self, year, phase, cells, substream=0):
+        """Draws uniform numbers in [0, 1).
+
+        Entries of cells with the same cell get the next numbers of the stream of that cell, in
+        the order they come in cells.
+
+        Parameters
+        ----------
+        year : int
+                The year that is simulated.
+        phase : str
+                Name of the phase, one of RandomStreams.phases.
+        cells : ndarray
+                Cell index of each number that is drawn.
+        substream : int
+                Number of the substream of the phase.
+
+        Returns
+        -------
+        ndarray
+            One number for each entry of cells.
+        """
+        return self._draw(year, phase, cells, substream, "random")
+
+    def normal(self, year, phase, cells, loc, scale, substream=0):
+        """Draws normal numbers with mean loc and standard deviation scale, like
+        RandomStreams.random."""
+        return self._draw(year, phase, cells, substream, "normal", loc, scale)
+
+    def integers(self, year, phase, cells, high, substream=0):
+        """Draws integers from 0 to high, not including high, like RandomStreams.random."""
+        return self._draw(year, phase, cells, substream, "integers", high).astype(int)
@@ -0,0 +1,452 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'biosim.threaded' runs the annual cycle of the cells of Rossumøya on several threads.
+
+The cells on an anti-diagonal of the map are done at the same time by the array engines, see
+VectorizedIsland.cycle_island, since they do not share any animals. ThreadedIsland does all the
+phases of a cell after the food grows, the feeding, the hunting, the births, the migration and the
+aging and deaths, in one kernel compiled with numba. The kernel does not hold the global
+interpreter lock, so the cells of an anti-diagonal are split between the threads of a pool, which
+run the kernel at the same time on all the cores of the machine.
+
+The cells are split into work units with about the same cost, estimated from the animals in the
+cells and the measured time of earlier work units, and the threads steal work units from each
+other when they run out, see biosim.balance. Each thread writes the animals of its cells, the
+animals that migrate out of them included, to its own output arrays. The output arrays of all the
+work units are put together in the order of the cells when the anti-diagonal is done, before the
+next anti-diagonal, which gets the animals that migrated to it.
+
+The random number generator of numba is separate for each thread. It is seeded before each cell
+with a seed drawn for the cell, from the global numpy generator or from the random streams of the
+island, so the simulation gives the same result for the same seed with any number of threads.
+
+This file can be imported as a module and contains the following class and functions:
+
+    *   cells_kernel - Kernel doing the annual cycle of some cells.
+
+    *   ThreadedIsland - Class with the annual cycle of Rossumøya on several threads.
+
+Notes
+-----
+    To run this script, its required to have 'numpy' and 'numba' installed in the Python
+    environment that your going to run this script in.
+
+    The kernel draws its random numbers in another order than the other engines, so it gives
+    populations with the same statistics as them, not the same populations.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+import os
+
+from biosim.balance import CostModel, steal_work
+from biosim.compiled import CompiledIsland, hunt_cell
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from numba import njit
+
+PARAMETERS = (
+    "F",
+    "beta",
+    "phi_age",
+    "a_half",
+    "phi_weight",
+    "w_half",
+    "gamma",
+    "zeta",
+    "w_birth",
+    "sigma_birth",
+    "xi",
+    "mu",
+    "eta",
+    "omega",
+    "DeltaPhiMax",
+)
+(
+    _F,
+    _BETA,
+    _PHI_AGE,
+    _A_HALF,
+    _PHI_WEIGHT,
+    _W_HALF,
+    _GAMMA,
+    _ZETA,
+    _W_BIRTH,
+    _SIGMA_BIRTH,
+    _XI,
+    _MU,
+    _ETA,
+    _OMEGA,
+    _DELTA_PHI_MAX,
+) = range(len(PARAMETERS))
+
+_executors = {}
+
+
+@njit(cache=True, nogil=True)
+def _age_fitness(age, params):
+    """The age factor of the fitness."""
+    return 1.0 / (1.0 + np.exp(params[_PHI_AGE] * (age - params[_A_HALF])))
+
+
+@njit(cache=True, nogil=True)
+def _fitness(age, weight, params):
+    """The fitness of an animal, like Animals.fitness."""
+    if weight <= 0:
+        return 0.0
+    q_weight = 1.0 / (1.0 + np.exp(-params[_PHI_WEIGHT] * (weight - params[_W_HALF])))
+    return _age_fitness(age, params) * q_weight
+
+
+@njit(cache=True, nogil=True)
+def _herbivores_eat(weight, number, food, params):
+    """The herbivores of a cell eat in a random order until the food is gone, and the food that
+    is left is returned."""
+    for herbivore in np.random.permutation(number):
+        if food <= 0:
+            break
+        eaten = params[_F] if food >= 2 * params[_F] else food
+        weight[herbivore] += params[_BETA] * eaten
+        food -= eaten
+    return food
+
+
+@njit(cache=True, nogil=True)
+def _keep(keep, animal_cell, age, weight, moved, number):
+    """Moves the animals that are kept to the front of the arrays, and returns how many they
+    are."""
+    kept = 0
+    for animal in range(number):
+        if keep[animal]:
+            animal_cell[kept] = animal_cell[animal]
+            age[kept] = age[animal]
+            weight[kept] = weight[animal]
+            moved[kept] = moved[animal]
+            kept += 1
+    return kept
+
+
+@njit(cache=True, nogil=True)
+def _after_hunt(cell, animal_cell, age, weight, moved, number, passable, neighbours, params):
+    """The births, the migration and the aging and deaths of the animals of a species in a cell.
+
+    The arrays have room for a baby of every animal. Returns the number of animals left in the
+    arrays, the animals that migrated out of the cell included.
+    """
+    if number >= 2:
+        min_weight = params[_ZETA] * (params[_W_BIRTH] + params[_SIGMA_BIRTH])
+        parents = number
+        for animal in range(parents):
+            if weight[animal] < min_weight:
+                continue
+            fitness = _fitness(age[animal], weight[animal], params)
+            probability = min(1.0, params[_GAMMA] * fitness * (parents - 1))
+            if np.random.random() >= probability:
+                continue
+            baby_weight = np.random.normal(params[_W_BIRTH], params[_SIGMA_BIRTH])
+            if baby_weight * params[_XI] < weight[animal]:
+                weight[animal] -= params[_XI] * baby_weight
+                animal_cell[number] = cell
+                age[number] = 0
+                weight[number] = baby_weight
+                moved[number] = False
+                number += 1
+
+    for animal in range(number):
+        if moved[animal]:
+            continue
+        if np.random.random() < params[_MU] * _fitness(age[animal], weight[animal], params):
+            target = cell + neighbours[np.random.randint(0, len(neighbours))]
+            if passable[target]:
+                animal_cell[animal] = target
+                moved[animal] = True
+
+    keep = np.ones(number, dtype=np.bool_)
+    for animal in range(number):
+        if animal_cell[animal] != cell:
+            continue
+        age[animal] += 1
+        weight[animal] -= params[_ETA] * weight[animal]
+        fitness = _fitness(age[animal], weight[animal], params)
+        dies = np.random.random() < params[_OMEGA] * (1 - fitness)
+        keep[animal] = not (dies or weight[animal] == 0)
+    return _keep(keep, animal_cell, age, weight, moved, number)
+
+
+@njit(cache=True, nogil=True)
+def _copy(out_cell, out_age, out_weight, out_moved, end, animal_cell, age, weight, moved, number):
+    """Copies the animals of a cell to the output arrays after end, and returns the new end."""
+    out_cell[end : end + number] = animal_cell[:number]
+    out_age[end : end + number] = age[:number]
+    out_weight[end : end + number] = weight[:number]
+    out_moved[end : end + number] = moved[:number]
+    return end + number
+
+
+@njit(cache=True, nogil=True)
+def cells_kernel(
+    seeds,
+    cells,
+    herb_starts,
+    herb_stops,
+    carn_starts,
+    carn_stops,
+    food,
+    passable,
+    neighbours,
+    herb_age,
+    herb_weight,
+    herb_moved,
+    carn_age,
+    carn_weight,
+    carn_moved,
+    herb_params,
+    carn_params,
+):
+    """Does the annual cycle after the food grows, for some cells of an anti-diagonal.
+
+    The food is updated in place, and the animals of the cells are returned in new arrays, so
+    several threads can run the kernel for different cells at the same time.
+
+    Parameters
+    ----------
+    seeds : ndarray
+            Seed of the random number generator of numba for each cell.
+    cells : ndarray
+            The cells that are done.
+    herb_starts, herb_stops, carn_starts, carn_stops : ndarray
+            The range of the herbivores and carnivores of each cell in their arrays.
+    food : ndarray
+            Food of every cell of the island.
+    passable : ndarray
+            True for the cells animals can move to.
+    neighbours : ndarray
+            Differences between the index of a cell and the index of its neighbours.
+    herb_age, herb_weight, herb_moved, carn_age, carn_weight, carn_moved : ndarray
+            Age, weight and whether the animal has migrated this year, of all the herbivores and
+            carnivores of the anti-diagonal, sorted by cell.
+    herb_params, carn_params : ndarray
+            Parameters of the herbivores and carnivores, in the order of PARAMETERS.
+
+    Returns
+    -------
+    tuple
+        Cell, age, weight and moved arrays of the herbivores, followed by those of the
+        carnivores, after the annual cycle of the cells.
+    """
+    herb_total = 2 * (herb_stops - herb_starts).sum()
+    carn_total = 2 * (carn_stops - carn_starts).sum()
+    herb_out_cell = np.empty(herb_total, dtype=np.int64)
+    herb_out_age = np.empty(herb_total, dtype=np.int64)
+    herb_out_weight = np.empty(herb_total)
+    herb_out_moved = np.empty(herb_total, dtype=np.bool_)
+    carn_out_cell = np.empty(carn_total, dtype=np.int64)
+    carn_out_age = np.empty(carn_total, dtype=np.int64)
+    carn_out_weight = np.empty(carn_total)
+    carn_out_moved = np.empty(carn_total, dtype=np.bool_)
+    herb_end = 0
+    carn_end = 0
+
+    for index in range(len(cells)):
+        np.random.seed(seeds[index])
+        cell = cells[index]
+        herb_start, herb_stop = herb_starts[index], herb_stops[index]
+        carn_start, carn_stop = carn_starts[index], carn_stops[index]
+        herbivores = herb_stop - herb_start
+        carnivores = carn_stop - carn_start
+
+        h_cell = np.full(2 * herbivores, cell, dtype=np.int64)
+        h_age = np.empty(2 * herbivores, dtype=np.int64)
+        h_weight = np.empty(2 * herbivores)
+        h_moved = np.empty(2 * herbivores, dtype=np.bool_)
+        h_age[:herbivores] = herb_age[herb_start:herb_stop]
+        h_weight[:herbivores] = herb_weight[herb_start:herb_stop]
+        h_moved[:herbivores] = herb_moved[herb_start:herb_stop]
+        c_cell = np.full(2 * carnivores, cell, dtype=np.int64)
+        c_age = np.empty(2 * carnivores, dtype=np.int64)
+        c_weight = np.empty(2 * carnivores)
+        c_moved = np.empty(2 * carnivores, dtype=np.bool_)
+        c_age[:carnivores] = carn_age[carn_start:carn_stop]
+        c_weight[:carnivores] = carn_weight[carn_start:carn_stop]
+        c_moved[:carnivores] = carn_moved[carn_start:carn_stop]
+
+        food[cell] = _herbivores_eat(h_weight, herbivores, food[cell], herb_params)
+
+        if herbivores > 0 and carnivores > 0:
+            h_fitness = np.empty(herbivores)
+            for herb in range(herbivores):
+                h_fitness[herb] = _fitness(h_age[herb], h_weight[herb], herb_params)
+            c_age_fitness = np.empty(carnivores)
+            for carn in range(carnivores):
+                c_age_fitness[carn] = _age_fitness(c_age[carn], carn_params)
+            alive = np.ones(herbivores, dtype=np.bool_)
+            hunt_cell(
+                alive,
+                0,
+                herbivores,
+                h_fitness,
+                h_weight,
+                0,
+                carnivores,
+                c_age_fitness,
+                c_weight,
+                carn_params[_F],
+                carn_params[_BETA],
+                carn_params[_DELTA_PHI_MAX],
+                carn_params[_W_HALF],
+                carn_params[_PHI_WEIGHT],
+            )
+            herbivores = _keep(alive, h_cell, h_age, h_weight, h_moved, herbivores)
+
+        herbivores = _after_hunt(
+            cell, h_cell, h_age, h_weight, h_moved, herbivores, passable, neighbours, herb_params
+        )
+        carnivores = _after_hunt(
+            cell, c_cell, c_age, c_weight, c_moved, carnivores, passable, neighbours, carn_params
+        )
+
+        herb_end = _copy(
+            herb_out_cell,
+            herb_out_age,
+            herb_out_weight,
+            herb_out_moved,
+            herb_end,
+            h_cell,
+            h_age,
+            h_weight,
+            h_moved,
+            herbivores,
+        )
+        carn_end = _copy(
+            carn_out_cell,
+            carn_out_age,
+            carn_out_weight,
+            carn_out_moved,
+            carn_end,
+            c_cell,
+            c_age,
+            c_weight,
+            c_moved,
+            carnivores,
+        )
+
+    return (
+        herb_out_cell[:herb_end],
+        herb_out_age[:herb_end],
+        herb_out_weight[:herb_end],
+        herb_out_moved[:herb_end],
+        carn_out_cell[:carn_end],
+        carn_out_age[:carn_end],
+        carn_out_weight[:carn_end],
+        carn_out_moved[:carn_end],
+    )
+
+
+def _executor(threads):
+    """Returns a pool with the given number of threads, shared by all islands."""
+    if threads not in _executors:
+        _executors[threads] = ThreadPoolExecutor(threads, thread_name_prefix="biosim")
+    return _executors[threads]
+
+
+class ThreadedIsland(CompiledIsland):
+    """Class for the island of Rossumøya with the cells done by compiled kernels on several
+    threads."""
+
+    threads = None
+    min_animals = 2000
+    units_per_thread = 4
+    costs = None
+    stolen = 0
+    # Attributes set by the user, which BioSim.set_state keeps when it replaces the island.
+    settings = ("threads", "min_animals", "units_per_thread", "costs")
+
+    @property
+    def num_threads(self):
+        """The number of threads used, the number of cores if the attribute 'threads' is None."""
+        if self.threads is None:
+            return os.cpu_count() or 1
+        return self.threads
+
+    def _cycle_diagonal(self, cells, diagonal):
+        """Runs the annual cycle after the food grows for the cells of one anti-diagonal, split
+        between the threads of a pool.
+
+        Anti-diagonals with fewer than min_animals animals are done in the calling thread, since
+        they take less time than handing them to the pool. Otherwise the cells are split into
+        units_per_thread work units for each thread with about the same estimated cost, and the
+        threads steal work units from each other when they run out, see biosim.balance. The
+        estimates are updated from the measured time of the work units.
+
+        Parameters
+        ----------
+        cells: dict
+                Arrays of the animals of each species in the cells of the anti-diagonal, sorted
+                by cell, with the column 'moved' for animals that have migrated this year.
+        diagonal: int
+                The anti-diagonal of the cells.
+        """
+        herbivores, carnivores = cells["Herbivore"], cells["Carnivore"]
+        total = len(herbivores["cell"]) + len(carnivores["cell"])
+        self._run_phase("cycle_cells", self._cycle_cells, total, herbivores, carnivores)
+
+    def _cycle_cells(self, herbivores, carnivores):
+        """Runs the kernel for the cells of an anti-diagonal, and puts the outputs of the
+        threads together."""
+        active = np.union1d(herbivores["cell"], carnivores["cell"])
+        if self.streams is None:
+            seeds = np.random.randint(2 ** 31, size=len(active))
+        else:
+            seeds = self.streams.integers(self.year, "cycle_cells", active, 2 ** 31)
+        herb_starts = np.searchsorted(herbivores["cell"], active)
+        herb_stops = np.searchsorted(herbivores["cell"], active, side="right")
+        carn_starts = np.searchsorted(carnivores["cell"], active)
+        carn_stops = np.searchsorted(carnivores["cell"], active, side="right")
+        params = [
+            np.array(
+                [float(species.params.get(name) or 0.0) for name in PARAMETERS], dtype=float
+            )
+            for species in self.species.values()
+        ]
+
+        def run(chunk):
+            return cells_kernel(
+                seeds[chunk],
+                active[chunk],
+                herb_starts[chunk],
+                herb_stops[chunk],
+                carn_starts[chunk],
+                carn_stops[chunk],
+                self.food,
+                self.passable,
+                self._neighbours,
+                herbivores["age"],
+                herbivores["weight"],
+                herbivores["moved"],
+                carnivores["age"],
+                carnivores["weight"],
+                carnivores["moved"],
+                *params,
+            )
+
+        animals = herb_stops - herb_starts + carn_stops - carn_starts
+        threads = min(self.num_threads, len(active))
+        if threads < 2 or animals.sum() < self.min_animals:
+            outputs = [run(slice(None))]
+        else:
+            if self.costs is None:
+                self.costs = CostModel(len(self.food))
+            units = self.costs.partition(active, animals, threads * self.units_per_thread)
+            threads = min(threads, len(units))
+            outputs, seconds, stolen = steal_work(
+                _executor(threads), threads, [partial(run, unit) for unit in units]
+            )
+            self.costs.update(active, animals, units, seconds)
+            self.stolen += stolen
+
+        for offset, animals in ((0, herbivores), (4, carnivores)):
+            for position, key in enumerate(("cell", "age", "weight", "moved")):
+                animals[key] = np.concatenate([output[offset + position] for output in outputs])
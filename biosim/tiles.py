@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'biosim.tiles' simulates an island split into rectangular tiles, each owned by a process.
+
+The rows and columns of the map, the locations (row, col) of Island.create_island_map, are split
+into bands, and each tile, a band of rows times a band of columns, is simulated by its own worker
+process. A worker only holds the animals of its own tile, so no process holds the whole
+population.
+
+The workers do the anti-diagonals of the map in order, like VectorizedIsland.cycle_island. After
+each anti-diagonal, the animals that migrated out of a tile are sent to the tile they moved to, and
+the animals that migrated into the tile are received, see Halo. Animals only move to a
+neighbouring cell, so each tile only exchanges animals with the tiles next to it, and only for
+the anti-diagonals where one of them has cells. The animals that moved into a later cell are
+received before their cell is done, so the tiles together do the same annual cycle as one island.
+
+At the end of each year, every worker sends the number of animals of each species in each of its
+cells, which TiledSimulation puts together into the counts of the whole island.
+
+The cells draw their random numbers from their own random streams, see biosim.streams, so a tiled
+simulation gives exactly the same result as one process with random_streams=True and the same
+seed and engine, for any number of tiles.
+
+Usage::
+
+    with TiledSimulation(island_map, ini_pop, seed=1, tiles=(2, 3)) as sim:
+        sim.simulate(100)
+        print(sim.num_animals_per_species)
+
+This file can be imported as a module and contains the following classes and function:
+
+    *   tile_bounds - Splits the rows and columns of a map into tiles.
+
+    *   Halo - Class that exchanges the animals crossing the borders of a tile.
+
+    *   TiledSimulation - Class that simulates an island split into tiles.
+
+Notes
+-----
+    The parameters of the animals and landscapes are copied to the workers when they start, so
+    they must be set before the TiledSimulation is made.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import multiprocessing
+import numpy as np
+import textwrap
+import traceback
+
+from biosim.checkpoint import get_parameters, set_parameters
+from biosim.island import Island
+from biosim.simulation import BioSim
+from biosim.streams import RandomStreams
+
+
+def tile_bounds(shape, tiles):
+    """Splits the rows and columns of a map into tiles of about the same size.
+
+    Parameters
+    ----------
+    shape : tuple
+            Number of rows and columns of the map.
+    tiles : tuple
+            Number of bands of rows and of columns.
+
+    Returns
+    -------
+    list
+        (row_start, row_stop, col_start, col_stop) of each tile, counted from 0 with the stops
+        not included, the tiles of the first band of rows first. The cell at row and column 0 has
+        the location (1, 1).
+    """
+    edges = []
+    for size, bands in zip(shape, tiles):
+        if not 1 <= bands <= size:
+            raise ValueError(f"Can not split {size} rows or columns into {bands} tiles.")
+        edges.append(np.linspace(0, size, bands + 1).round().astype(int).tolist())
+    row_edges, col_edges = edges
+    return [
+        (row_start, row_stop, col_start, col_stop)
+        for row_start, row_stop in zip(row_edges[:-1], row_edges[1:])
+        for col_start, col_stop in zip(col_edges[:-1], col_edges[1:])
+    ]
+
+
+class Halo:
+    """Class for the exchange of the animals crossing the borders of a tile."""
+
+    def __init__(self, index, owner, diagonals, outboxes, inboxes):
+        """Constructor that initiates Halo class instances.
+
+        Parameters
+        ----------
+        index : int
+                Number of the tile.
+        owner : ndarray
+                Number of the tile of each cell of the map, counting the cells row by row.
+        diagonals : dict
+                The first and last anti-diagonal where the tile exchanges animals with each
+                neighbouring tile.
+        outboxes, inboxes : dict
+                Queues to and from each neighbouring tile.
+        """
+        self.index = index
+        self.owner = owner
+        self.diagonals = diagonals
+        self.outboxes = outboxes
+        self.inboxes = inboxes
+        self.emigrants = 0
+
+    def exchange(self, island, diagonal):
+        """Sends the animals that left the tile to their new tiles, and adds the animals that
+        moved into the tile, after an anti-diagonal.
+
+        Parameters
+        ----------
+        island : VectorizedIsland
+                The island holding the animals of the tile.
+        diagonal : int
+                The anti-diagonal that was done.
+        """
+        neighbours = [
+            neighbour
+            for neighbour, (first, last) in self.diagonals.items()
+            if first <= diagonal <= last
+        ]
+        if not neighbours:
+            return
+
+        outgoing = {neighbour: {} for neighbour in neighbours}
+        for name, animals in island._animals.items():
+            owners = self.owner[animals["cell"]]
+            leaving = owners != self.index
+            if not leaving.any():
+                continue
+            self.emigrants += int(leaving.sum())
+            for neighbour in neighbours:
+                moving = owners == neighbour
+                outgoing[neighbour][name] = {key: values[moving] for key, values in animals.items()}
+            for key, values in animals.items():
+                animals[key] = values[~leaving]
+
+        for neighbour in neighbours:
+            self.outboxes[neighbour].put(outgoing[neighbour])
+        for neighbour in neighbours:
+            for name, arriving in self.inboxes[neighbour].get().items():
+                animals = island._animals[name]
+                for key, values in animals.items():
+                    animals[key] = np.concatenate([values, arriving[key]])
+
+
+def _tile_worker(
+    index, geography, population, engine, seed, params, bounds, halo, commands, results
+):
+    """Simulates one tile in a worker process, following the commands of TiledSimulation."""
+    try:
+        set_parameters(params)
+        island = BioSim.engines[engine](geography, population)
+        island.streams = RandomStreams(seed)
+        island.halo = halo
+        row_start, row_stop, col_start, col_stop = bounds
+
+        while True:
+            command, argument = commands.get()
+            if command == "simulate":
+                for _ in range(argument):
+                    island.cycle_island()
+                    counts = island.count_grid()[row_start:row_stop, col_start:col_stop]
+                    results.put(("year", index, island.year, counts))
+            elif command == "counts":
+                counts = island.count_grid()[row_start:row_stop, col_start:col_stop]
+                results.put(("counts", index, island.year, counts))
+            elif command == "state":
+                results.put(("state", index, island.year, island.get_state()))
+            else:
+                break
+    except BaseException:
+        results.put(("error", index, None, traceback.format_exc()))
+
+
+class TiledSimulation:
+    """Class for a simulation of an island split into tiles simulated by worker processes."""
+
+    species = ("Herbivore", "Carnivore")
+
+    def __init__(self, island_map, ini_pop, seed, tiles=(2, 2), engine="vectorized"):
+        """Constructor that splits the island and starts the worker processes.
+
+        Parameters
+        ----------
+        island_map : str
+                Multi-line string specifying island geography.
+        ini_pop : list
+                List of dictionaries specifying initial population.
+        seed : int
+                Seed of the random streams of the cells.
+        tiles : tuple
+                Number of bands of rows and of columns the map is split into.
+        engine : str
+                Name of the engine simulating each tile, an array engine of BioSim.engines.
+        """
+        if engine not in BioSim.engines or not hasattr(BioSim.engines[engine], "halo"):
+            raise ValueError(f"The {engine} engine can not simulate tiles.")
+        self.geography = textwrap.dedent(island_map)
+        lines = self.geography.splitlines()
+        Island.check_geography(lines)
+        self.shape = (len(lines), len(lines[0]))
+        self.bounds = tile_bounds(self.shape, tiles)
+        self.seed = RandomStreams(seed).seed
+        self.engine = engine
+        self.year = 0
+        self.history = []
+
+        self.owner = np.empty(self.shape, dtype=int)
+        for index, (row_start, row_stop, col_start, col_stop) in enumerate(self.bounds):
+            self.owner[row_start:row_stop, col_start:col_stop] = index
+        populations = [[] for _ in self.bounds]
+        for animal in ini_pop:
+            row, col = animal["loc"]
+            if not 1 <= row <= self.shape[0] or not 1 <= col <= self.shape[1]:
+                raise ValueError(f"Location {animal['loc']} is not a valid location.")
+            populations[self.owner[row - 1, col - 1]].append(animal)
+
+        context = multiprocessing.get_context()
+        diagonals = [
+            (row_start + col_start, row_stop + col_stop - 2)
+            for row_start, row_stop, col_start, col_stop in self.bounds
+        ]
+        neighbours = {index: {} for index in range(len(self.bounds))}
+        for first, (row_start, row_stop, col_start, col_stop) in enumerate(self.bounds):
+            for second, (other_start, other_stop, other_col_start, other_col_stop) in enumerate(
+                self.bounds
+            ):
+                rows_touch = row_stop == other_start and col_start == other_col_start
+                cols_touch = col_stop == other_col_start and row_start == other_start
+                if rows_touch or cols_touch:
+                    span = (
+                        min(diagonals[first][0], diagonals[second][0]),
+                        max(diagonals[first][1], diagonals[second][1]),
+                    )
+                    neighbours[first][second] = neighbours[second][first] = span
+        queues = {
+            (first, second): context.Queue()
+            for first in neighbours
+            for second in neighbours[first]
+        }
+
+        self._results = context.Queue()
+        self._commands = [context.Queue() for _ in self.bounds]
+        self._workers = []
+        params = get_parameters()
+        for index, bounds in enumerate(self.bounds):
+            halo = Halo(
+                index,
+                self.owner.ravel(),
+                neighbours[index],
+                {other: queues[index, other] for other in neighbours[index]},
+                {other: queues[other, index] for other in neighbours[index]},
+            )
+            worker = context.Process(
+                target=_tile_worker,
+                args=(
+                    index,
+                    self.geography,
+                    populations[index],
+                    engine,
+                    seed,
+                    params,
+                    bounds,
+                    halo,
+                    self._commands[index],
+                    self._results,
+                ),
+                daemon=True,
+            )
+            worker.start()
+            self._workers.append(worker)
+        self._counts = self._count_grid(self._gather("counts"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _receive(self):
+        """Returns the next message from the workers, and stops them if one of them failed."""
+        kind, index, year, value = self._results.get()
+        if kind == "error":
+            for worker in self._workers:
+                worker.terminate()
+            self._workers = []
+            raise RuntimeError(f"The worker of tile {index} failed:\n{value}")
+        return kind, index, year, value
+
+    def _gather(self, command):
+        """Sends a command to all workers, and returns their answers in the order of the tiles."""
+        for commands in self._commands:
+            commands.put((command, None))
+        answers = [None] * len(self._workers)
+        for _ in self._workers:
+            _, index, _, value = self._receive()
+            answers[index] = value
+        return answers
+
+    def _count_grid(self, tile_counts):
+        """Puts the counts of the tiles together into the counts of the island."""
+        counts = np.zeros(self.shape + (len(self.species),), dtype=int)
+        for (row_start, row_stop, col_start, col_stop), tile in zip(self.bounds, tile_counts):
+            counts[row_start:row_stop, col_start:col_stop] = tile
+        return counts
+
+    def simulate(self, num_years):
+        """Simulates the island for a number of years.
+
+        The counts of the tiles are put together at the end of each year, and the number of
+        animals of each species is added to the history.
+
+        Parameters
+        ----------
+        num_years : int
+                Number of years to simulate.
+        """
+        if not self._workers:
+            raise RuntimeError("The workers of the simulation are stopped.")
+        for commands in self._commands:
+            commands.put(("simulate", num_years))
+
+        pending = {}
+        for _ in range(num_years * len(self._workers)):
+            _, index, year, counts = self._receive()
+            tiles = pending.setdefault(year, [None] * len(self._workers))
+            tiles[index] = counts
+            if all(tile is not None for tile in tiles):
+                self._counts = self._count_grid(pending.pop(year))
+                self.year = year
+                self.history.append({"year": year, **self.num_animals_per_species})
+
+    def count_grid(self):
+        """Returns the number of animals of each species in each cell, like
+        VectorizedIsland.count_grid."""
+        return self._counts.copy()
+
+    @property
+    def num_animals(self):
+        """Total number of animals on island."""
+        return int(self._counts.sum())
+
+    @property
+    def num_animals_per_species(self):
+        """Number of animals per species in island, as dictionary."""
+        return {
+            name: int(self._counts[..., index].sum()) for index, name in enumerate(self.species)
+        }
+
+    def get_state(self):
+        """Returns the state of the whole island, which a BioSim with the same engine and
+        random_streams=True continues exactly like the tiled simulation.
+
+        Returns
+        -------
+        dict
+            Dictionary with the year, the name of the engine, the seed of the random streams and
+            the island state.
+        """
+        states = self._gather("state")
+        owner = self.owner.ravel()
+        food = np.zeros(owner.size)
+        island = {"geography": self.geography, "food": food}
+        for index, state in enumerate(states):
+            food[owner == index] = state["food"][owner == index]
+        for name in self.species:
+            cells = np.concatenate([state[name]["cell"] for state in states])
+            order = np.argsort(cells, kind="stable")
+            island[name] = {
+                key: np.concatenate([state[name][key] for state in states])[order]
+                for key in ("cell", "age", "weight")
+            }
+        return {
+            "year": self.year,
+            "engine": self.engine,
+            "random_streams": self.seed,
+            "island": island,
+        }
+
+    def close(self):
+        """Stops the worker processes."""
+        for commands in self._commands[: len(self._workers)]:
+            commands.put(("stop", None))
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
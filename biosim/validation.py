@@ -0,0 +1,456 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'biosim.validation' checks that an engine simulates the same ecology as the reference engine.
+
+The engines of BioSim draw their random numbers in different orders, so they can not give the same
+populations for the same seed. Instead, a scenario is simulated with many seeds by each engine, and
+the two samples are compared with two-sample tests:
+
+    *   The number of animals of each species at the checked years, with the Mann-Whitney U test.
+    *   The year each species goes extinct, with the Mann-Whitney U test. Simulations where the
+        species survives count as going extinct after the last year.
+    *   The age, weight and fitness of the animals alive in the last year, pooled over the seeds,
+        with the two-sample Kolmogorov-Smirnov test.
+
+Each check has an effect size, Cliff's delta for the Mann-Whitney tests and the Kolmogorov-Smirnov
+statistic for the distributions. A check fails when the difference is significant, with the
+significance level divided by the number of checks, and the effect size is larger than the
+tolerance. With many seeds, tiny differences are significant, and with few seeds, large ones are
+not, so both are needed.
+
+The scenarios 'default_geography' and 'check_sim' are the default island of BioSim and the
+simulation of 'examples/check_sim.py'. Any other scenario is a dictionary with the same keys.
+
+Usage from the top directory of the repository::
+
+    python -m biosim.validation vectorized --scenario check_sim --seeds 20
+
+This file can be imported as a module and contains the following class and functions:
+
+    *   ValidationReport - Class with the checks of a validation and whether they passed.
+
+    *   default_geography_scenario - Returns the scenario of the default island of BioSim.
+
+    *   check_sim_scenario - Returns the scenario of 'examples/check_sim.py'.
+
+    *   simulate_scenario - Simulates a scenario with one engine and one seed.
+
+    *   run_scenario - Simulates a scenario with one engine for many seeds.
+
+    *   validate_engine - Compares an engine with the reference engine.
+
+    *   main - Command line interface.
+
+Notes
+-----
+    To run this script, its required to have 'numpy', 'pandas' and 'scipy' installed in the Python
+    environment that your going to run this script in.
+
+    The animals of one simulation are not independent of each other, so the p-values of the
+    distributions are too small. The tolerance of the Kolmogorov-Smirnov statistic decides these
+    checks in practice.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import argparse
+import numpy as np
+import pandas as pd
+import sys
+import textwrap
+
+from biosim.checkpoint import get_parameters, set_parameters
+from biosim.recorder import TimeSeriesRecorder
+from biosim.simulation import BioSim
+from scipy import stats
+
+CHECK_SIM_GEOGRAPHY = textwrap.dedent(
+    """\
+    WWWWWWWWWWWWWWWWWWWWW
+    WWWWWWWWHWWWWLLLLLLLW
+    WHHHHHLLLLWWLLLLLLLWW
+    WHHHHHHHHHWWLLLLLLWWW
+    WHHHHHLLLLLLLLLLLLWWW
+    WHHHHHLLLDDLLLHLLLWWW
+    WHHLLLLLDDDLLLHHHHWWW
+    WWHHHHLLLDDLLLHWWWWWW
+    WHHHLLLLLDDLLLLLLLWWW
+    WHHHHLLLLDDLLLLWWWWWW
+    WWHHHHLLLLLLLLWWWWWWW
+    WWWHHHHLLLLLLLWWWWWWW
+    WWWWWWWWWWWWWWWWWWWWW"""
+)
+
+SPECIES = ("Herbivore", "Carnivore")
+TRAITS = ("age", "weight", "fitness")
+
+
+def default_geography_scenario(years=50):
+    """Returns the scenario of the default island and population of BioSim.
+
+    Parameters
+    ----------
+    years : int
+            Number of years simulated.
+
+    Returns
+    -------
+    dict
+        Scenario with the 'island_map', the initial population 'ini_pop', the number of 'years',
+        the populations added at the start of a year in 'additions', and the 'parameters' of the
+        animals and landscapes, as given to BioSim.set_animal_parameters and
+        BioSim.set_landscape_parameters.
+    """
+    return {
+        "island_map": BioSim.default_geography,
+        "ini_pop": BioSim.default_pop,
+        "years": years,
+        "additions": {},
+        "parameters": {},
+    }
+
+
+def check_sim_scenario(herbivore_years=100, carnivore_years=400):
+    """Returns the scenario of 'examples/check_sim.py'.
+
+    Herbivores are placed on the island, carnivores are added after herbivore_years, and the
+    simulation goes on for carnivore_years more.
+
+    Parameters
+    ----------
+    herbivore_years : int
+            Number of years before the carnivores are added.
+    carnivore_years : int
+            Number of years simulated after the carnivores are added.
+
+    Returns
+    -------
+    dict
+        Scenario like default_geography_scenario.
+    """
+
+    def population(species, number):
+        return [
+            {
+                "loc": (10, 10),
+                "pop": [{"species": species, "age": 5, "weight": 20} for _ in range(number)],
+            }
+        ]
+
+    return {
+        "island_map": CHECK_SIM_GEOGRAPHY,
+        "ini_pop": population("Herbivore", 150),
+        "years": herbivore_years + carnivore_years,
+        "additions": {herbivore_years: population("Carnivore", 40)},
+        "parameters": {
+            "Herbivore": {"zeta": 3.2, "xi": 1.8},
+            "Carnivore": {"a_half": 70, "phi_age": 0.5, "omega": 0.3, "F": 65, "DeltaPhiMax": 9.0},
+            "L": {"f_max": 700},
+        },
+    }
+
+
+SCENARIOS = {"default_geography": default_geography_scenario, "check_sim": check_sim_scenario}
+
+
+def simulate_scenario(scenario, engine, seed, recorders=()):
+    """Simulates a scenario with one engine and one seed.
+
+    The parameters of the animals and landscapes are set to those of the scenario while it is
+    simulated, and set back afterwards. The recorders are called for the start of the simulation
+    and after every year.
+
+    Parameters
+    ----------
+    scenario : dict
+            Scenario like the one returned by default_geography_scenario.
+    engine : str
+            Name of the engine, a key of BioSim.engines.
+    seed : int
+            Seed of the simulation.
+    recorders : list
+            Recorders with a record method taking the simulation as argument.
+
+    Returns
+    -------
+    BioSim
+        The simulation after the last year.
+    """
+    saved_parameters = get_parameters()
+    try:
+        for name, params in scenario["parameters"].items():
+            if name in SPECIES:
+                BioSim.set_animal_parameters(name, params)
+            else:
+                BioSim.set_landscape_parameters(name, params)
+
+        sim = BioSim(
+            island_map=scenario["island_map"],
+            ini_pop=scenario["ini_pop"],
+            seed=seed,
+            engine=engine,
+        )
+        for recorder in recorders:
+            recorder.record(sim)
+            sim.add_recorder(recorder)
+        for year in range(scenario["years"]):
+            if year in scenario["additions"]:
+                sim.add_population(scenario["additions"][year])
+            next(sim.iter_years(1))
+    finally:
+        set_parameters(saved_parameters)
+    return sim
+
+
+def run_scenario(scenario, engine, seeds):
+    """Simulates a scenario with one engine for each seed.
+
+    Parameters
+    ----------
+    scenario : dict
+            Scenario like the one returned by default_geography_scenario.
+    engine : str
+            Name of the engine, a key of BioSim.engines.
+    seeds : list
+            Seeds of the simulations.
+
+    Returns
+    -------
+    dict
+        Dictionary with 'counts', an array with shape (seeds, years + 1, 2) with the number of
+        herbivores and carnivores at the start and after each year, and for each species the
+        'age', 'weight' and 'fitness' of the animals alive after the last year of all seeds.
+    """
+    counts = []
+    traits = {name: {trait: [] for trait in TRAITS} for name in SPECIES}
+    for seed in seeds:
+        recorder = TimeSeriesRecorder()
+        sim = simulate_scenario(scenario, engine, seed, [recorder])
+        counts.append(np.column_stack([recorder.columns[name] for name in SPECIES]))
+
+        for name, animals in zip(SPECIES, sim.island.fitness_age_weight):
+            for trait in TRAITS:
+                traits[name][trait].append(np.asarray(animals[trait], dtype=float))
+
+    result = {"counts": np.array(counts, dtype=int)}
+    for name in SPECIES:
+        result[name] = {trait: np.concatenate(values) for trait, values in traits[name].items()}
+    return result
+
+
+def extinction_years(counts):
+    """Returns the first year each species is extinct in each simulation.
+
+    A species is extinct in the first year it has no animals after it has had animals. If it is
+    never extinct, the year after the last year is used.
+
+    Parameters
+    ----------
+    counts : ndarray
+            Array with shape (seeds, years + 1, species), like the 'counts' of run_scenario.
+
+    Returns
+    -------
+    ndarray
+        Array with shape (seeds, species).
+    """
+    alive = counts > 0
+    has_lived = np.maximum.accumulate(alive, axis=1)
+    extinct = has_lived & ~alive
+    return np.where(extinct.any(axis=1), extinct.argmax(axis=1), counts.shape[1])
+
+
+def cliffs_delta(first, second):
+    """Returns Cliff's delta, the probability that a value of first is larger than a value of
+    second minus the probability that it is smaller."""
+    first = np.asarray(first, dtype=float)[:, np.newaxis]
+    second = np.asarray(second, dtype=float)[np.newaxis, :]
+    return float(np.mean(np.sign(first - second)))
+
+
+def _mannwhitney(reference, engine):
+    """Returns the p-value of the Mann-Whitney U test, 1 if all values are equal."""
+    if np.all(reference == reference[0]) and np.all(engine == reference[0]):
+        return 1.0
+    return float(stats.mannwhitneyu(reference, engine, alternative="two-sided").pvalue)
+
+
+def validate_engine(
+    engine,
+    scenario="default_geography",
+    seeds=range(20),
+    reference="reference",
+    alpha=0.05,
+    tolerance=0.474,
+    ks_tolerance=0.1,
+    every=10,
+):
+    """Compares an engine with the reference engine on a scenario.
+
+    Parameters
+    ----------
+    engine : str
+            Name of the engine that is checked, a key of BioSim.engines.
+    scenario : str or dict
+            Name of a scenario in SCENARIOS, or a scenario like default_geography_scenario.
+    seeds : list
+            Seeds simulated by each engine.
+    reference : str
+            Name of the engine it is compared with.
+    alpha : float
+            Significance level of all checks together.
+    tolerance : float
+            Largest absolute Cliff's delta of the counts and extinction years that is accepted.
+            0.474 is the usual limit of a large effect.
+    ks_tolerance : float
+            Largest Kolmogorov-Smirnov statistic of the distributions that is accepted.
+    every : int
+            The counts are checked every this number of years, and after the last year.
+
+    Returns
+    -------
+    ValidationReport
+        The checks and whether they passed.
+    """
+    if isinstance(scenario, str):
+        if scenario not in SCENARIOS:
+            raise KeyError(f"Unknown scenario {scenario}, use one of {', '.join(SCENARIOS)}.")
+        scenario = SCENARIOS[scenario]()
+    seeds = list(seeds)
+
+    results = {name: run_scenario(scenario, name, seeds) for name in (reference, engine)}
+    first, second = results[reference], results[engine]
+    years = scenario["years"]
+    checks = []
+
+    for index, name in enumerate(SPECIES):
+        for year in sorted(set(range(every, years, every)) | {years}):
+            sample, other = first["counts"][:, year, index], second["counts"][:, year, index]
+            checks.append(
+                {
+                    "check": f"{name} count, year {year}",
+                    "test": "mann-whitney",
+                    "p_value": _mannwhitney(sample, other),
+                    "effect_size": cliffs_delta(other, sample),
+                    "tolerance": tolerance,
+                    "reference": float(np.mean(sample)),
+                    "engine": float(np.mean(other)),
+                }
+            )
+
+        sample = extinction_years(first["counts"])[:, index]
+        other = extinction_years(second["counts"])[:, index]
+        checks.append(
+            {
+                "check": f"{name} extinction year",
+                "test": "mann-whitney",
+                "p_value": _mannwhitney(sample, other),
+                "effect_size": cliffs_delta(other, sample),
+                "tolerance": tolerance,
+                "reference": float(np.mean(sample)),
+                "engine": float(np.mean(other)),
+            }
+        )
+
+        for trait in TRAITS:
+            sample, other = first[name][trait], second[name][trait]
+            if len(sample) == 0 or len(other) == 0:
+                continue
+            result = stats.ks_2samp(sample, other)
+            checks.append(
+                {
+                    "check": f"{name} {trait}, last year",
+                    "test": "kolmogorov-smirnov",
+                    "p_value": float(result.pvalue),
+                    "effect_size": float(result.statistic),
+                    "tolerance": ks_tolerance,
+                    "reference": float(np.mean(sample)),
+                    "engine": float(np.mean(other)),
+                }
+            )
+
+    significance = alpha / len(checks)
+    for check in checks:
+        check["passed"] = bool(
+            check["p_value"] >= significance or abs(check["effect_size"]) <= check["tolerance"]
+        )
+    return ValidationReport(engine, reference, seeds, checks)
+
+
+class ValidationReport:
+    """Class with the checks of a comparison between two engines."""
+
+    def __init__(self, engine, reference, seeds, checks):
+        """Constructor that initiates ValidationReport class instances.
+
+        Parameters
+        ----------
+        engine : str
+                Name of the engine that is checked.
+        reference : str
+                Name of the engine it is compared with.
+        seeds : list
+                Seeds simulated by each engine.
+        checks : list
+                One dictionary for each check, with the name of the 'check', the 'test', the
+                'p_value', the 'effect_size' and its 'tolerance', the mean of the 'reference' and
+                the 'engine' samples, and whether it 'passed'.
+        """
+        self.engine = engine
+        self.reference = reference
+        self.seeds = seeds
+        self.checks = checks
+
+    @property
+    def passed(self):
+        """True if all checks passed."""
+        return all(check["passed"] for check in self.checks)
+
+    @property
+    def failures(self):
+        """The checks that failed."""
+        return [check for check in self.checks if not check["passed"]]
+
+    def to_frame(self):
+        """Returns the checks as a DataFrame with one row for each check."""
+        return pd.DataFrame(self.checks).set_index("check")
+
+    def __bool__(self):
+        return self.passed
+
+    def __str__(self):
+        verdict = "PASSED" if self.passed else f"FAILED {len(self.failures)} of {len(self.checks)}"
+        header = f"{self.engine} against {self.reference}, {len(self.seeds)} seeds: {verdict}"
+        return header + "\n" + self.to_frame().to_string()
+
+
+def main(argv=None):
+    """Runs the command line interface, and returns the exit status.
+
+    Parameters
+    ----------
+    argv : list
+            Command line arguments, sys.argv[1:] if None.
+    """
+    parser = argparse.ArgumentParser(prog="python -m biosim.validation", description=__doc__)
+    parser.add_argument("engine", choices=list(BioSim.engines))
+    parser.add_argument("--scenario", choices=list(SCENARIOS), default="default_geography")
+    parser.add_argument("--seeds", type=int, default=20, help="number of seeds")
+    parser.add_argument("--reference", choices=list(BioSim.engines), default="reference")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--output", help="CSV file for the checks")
+
+    args = parser.parse_args(argv)
+    report = validate_engine(
+        args.engine, args.scenario, range(args.seeds), args.reference, args.alpha
+    )
+    print(report)
+    if args.output is not None:
+        report.to_frame().to_csv(args.output)
+    return 0 if report.passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
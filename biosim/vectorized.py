@@ -0,0 +1,586 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod: 'biosim.vectorized' provides an annual cycle of Rossumøya that works on numpy arrays.
+
+The reference engine in 'biosim.island' keeps every animal as a Python object in a list in its
+cell. This engine keeps the animals of each species as three arrays instead: the cell index, the
+age and the weight of every animal, sorted by cell. Each phase of the annual cycle is done for
+many cells at once with numpy operations.
+
+VectorizedIsland has the same interface as Island, so BioSim can use either of them, see the
+engine argument of BioSim. It also uses the same parameters, the class attributes 'params' of
+the animal and landscape classes, and the same random number generator, the global one of numpy,
+so simulations are seeded, forked and checkpointed like with the reference engine.
+
+This file can be imported as a module and contains the following class:
+
+    *   VectorizedIsland - Class with the annual cycle of Rossumøya on arrays of animals.
+
+Notes
+-----
+    The engines draw their random numbers in different orders, so they do not give the same
+    populations for the same seed, only populations with the same statistics.
+
+    The cells are done in the same order as in the reference engine, see
+    VectorizedIsland.cycle_island, so the engines simulate the same model.
+
+    If the attribute 'streams' of the island is set to a RandomStreams, see biosim.streams, the
+    random numbers of each cell are drawn from its own stream instead of the global generator,
+    and the animals of a cell are sorted by age and weight before each anti-diagonal. The result
+    then only depends on the seed of the streams and the animals in each cell, not on the order
+    the animals are stored or the cells are done in.
+"""
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+import textwrap
+
+from biosim.animals import Herbivore, Carnivore
+from biosim.island import Island
+
+
+class VectorizedIsland:
+    """Class for the island of Rossumøya with the animals stored as arrays."""
+
+    valid_landscapes = Island.valid_landscapes
+    species = {"Herbivore": Herbivore, "Carnivore": Carnivore}
+    profiler = None
+    streams = None
+    halo = None
+
+    def __init__(self, island_map, ini_pop=None):
+        """Constructor that initiates VectorizedIsland class instances.
+
+        Parameters
+        ----------
+        island_map: str
+                Multiline string indicating geography of the island
+
+        ini_pop: list
+                List of dictionaries indicating initial population and location
+        """
+        self.geography = textwrap.dedent(island_map)
+        self.island_lines = self.geography.splitlines()
+        Island.check_geography(self.island_lines)
+
+        self.shape = (len(self.island_lines), len(self.island_lines[0]))
+        self.cell_types = np.array([cell_type for line in self.island_lines for cell_type in line])
+        self.passable = np.array(
+            [self.valid_landscapes[cell_type].passable for cell_type in self.cell_types]
+        )
+        self.food = np.zeros(len(self.cell_types))
+        rows, cols = self.shape
+        self._neighbours = np.array([-cols, cols, -1, 1])
+        self._diagonal = np.add.outer(np.arange(rows), np.arange(cols)).ravel()
+        self._diagonals = rows + cols - 1
+        self._animals = {name: self._no_animals() for name in self.species}
+        self.year = 0
+
+        if ini_pop is not None:
+            self.set_population_in_cell(ini_pop)
+
+    @staticmethod
+    def _no_animals():
+        """Returns the arrays of a species without animals."""
+        return {
+            "cell": np.zeros(0, dtype=int),
+            "age": np.zeros(0, dtype=int),
+            "weight": np.zeros(0, dtype=float),
+        }
+
+    def set_population_in_cell(self, new_pop):
+        """Places animals in cells of the island.
+
+        Parameters
+        ----------
+        new_pop: list
+                List of dicts with the location 'loc' and the animals 'pop' of each cell, like
+                the initial population of BioSim.
+        """
+        rows, cols = self.shape
+        added = {name: ([], [], []) for name in self.species}
+        for animal in new_pop:
+            location = animal["loc"]
+            if (
+                not isinstance(location, tuple)
+                or not 1 <= location[0] <= rows
+                or not 1 <= location[1] <= cols
+            ):
+                raise ValueError(f"Location {location} is not a valid location.")
+            index = (location[0] - 1) * cols + location[1] - 1
+            if not self.passable[index]:
+                raise ValueError(f"Location {location} is not habitable landscape.")
+
+            for individual in animal["pop"]:
+                if individual["species"] not in self.species:
+                    continue
+                if individual["weight"] < 0:
+                    raise ValueError("Weight must be a positive float!")
+                if individual["age"] < 0:
+                    raise ValueError("Age must be a positive integer!")
+                cells, ages, weights = added[individual["species"]]
+                cells.append(index)
+                ages.append(individual["age"])
+                weights.append(individual["weight"])
+
+        for name, (cells, ages, weights) in added.items():
+            animals = self._animals[name]
+            animals["cell"] = np.concatenate([animals["cell"], np.array(cells, dtype=int)])
+            animals["age"] = np.concatenate([animals["age"], np.array(ages, dtype=int)])
+            animals["weight"] = np.concatenate([animals["weight"], np.array(weights, dtype=float)])
+            self._sort(name)
+
+    def _sort(self, name):
+        """Sorts the animals of a species by cell, keeping their order within each cell."""
+        animals = self._animals[name]
+        order = np.argsort(animals["cell"], kind="stable")
+        for key in animals:
+            animals[key] = animals[key][order]
+
+    def fitness(self, name):
+        """Returns the fitness of all the animals of a species.
+
+        Parameters
+        ----------
+        name: str
+                Name of the species.
+        """
+        animals = self._animals[name]
+        return self._fitness(self.species[name].params, animals["age"], animals["weight"])
+
+    @staticmethod
+    def _fitness(params, age, weight):
+        """Computes the fitness from arrays of ages and weights, like Animals.fitness."""
+        q_age = 1.0 / (1.0 + np.exp(params["phi_age"] * (age - params["a_half"])))
+        q_weight = 1.0 / (1.0 + np.exp(-params["phi_weight"] * (weight - params["w_half"])))
+        return np.where(weight <= 0, 0.0, q_age * q_weight)
+
+    def cycle_island(self):
+        """Simulates the annual cycle of Rossumøya.
+
+        The reference engine goes through the cells row by row, and does all the phases of a cell
+        before the next one. Animals that migrate to a later cell take part in the phases of that
+        cell as well, and animals that migrate to an earlier cell do not age, lose weight or die
+        that year. The cells on an anti-diagonal of the map, where row plus column is the same,
+        are not neighbours of each other, and only get animals from the anti-diagonal before. So
+        the anti-diagonals are done one at a time, with all the cells of an anti-diagonal done at
+        once, which gives the same annual cycle as the reference engine.
+
+        If the attribute 'halo' is set, its method exchange is called with the island and the
+        anti-diagonal after each anti-diagonal, see biosim.tiles.
+        """
+        self._run_phase("food_grows", self._food_grows, 0)
+        for animals in self._animals.values():
+            animals["moved"] = np.zeros(len(animals["cell"]), dtype=bool)
+
+        for diagonal in range(self._diagonals):
+            active = {
+                name: self._diagonal[animals["cell"]] == diagonal
+                for name, animals in self._animals.items()
+            }
+            if any(mask.any() for mask in active.values()):
+                cells = {}
+                for name, animals in self._animals.items():
+                    index = np.flatnonzero(active[name])
+                    if self.streams is None:
+                        index = index[np.argsort(animals["cell"][index], kind="stable")]
+                    else:
+                        index = index[
+                            np.lexsort(
+                                [animals[key][index] for key in ("weight", "age", "moved", "cell")]
+                            )
+                        ]
+                    cells[name] = {key: values[index] for key, values in animals.items()}
+                self._cycle_diagonal(cells, diagonal)
+
+                for name, animals in self._animals.items():
+                    for key, values in animals.items():
+                        animals[key] = np.concatenate([values[~active[name]], cells[name][key]])
+
+            if self.halo is not None:
+                self.halo.exchange(self, diagonal)
+
+        for name, animals in self._animals.items():
+            del animals["moved"]
+            self._sort(name)
+        self.year += 1
+
+    def _cycle_diagonal(self, cells, diagonal):
+        """Runs the phases of the annual cycle after the food grows, for the cells of one
+        anti-diagonal.
+
+        Parameters
+        ----------
+        cells: dict
+                Arrays of the animals of each species in the cells of the anti-diagonal, sorted
+                by cell, with the column 'moved' for animals that have migrated this year.
+        diagonal: int
+                The anti-diagonal of the cells.
+        """
+        herbivores = len(cells["Herbivore"]["cell"])
+        total = herbivores + len(cells["Carnivore"]["cell"])
+        self._run_phase("herbivore_eats", self._herbivores_eat, herbivores, cells)
+        self._run_phase("carnivore_eats", self._carnivores_eat, total, cells)
+        self._run_phase("reproduce", self._reproduce, total, cells)
+        self._run_phase("migrate_animals", self._migrate, total, cells)
+        self._run_phase("age_weight_die", self._age_weight_die, total, cells, diagonal)
+
+    def _run_phase(self, phase, step, animals, *args):
+        """Runs a phase, timing it if the island is profiled."""
+        if self.profiler is None:
+            step(*args)
+            return
+        start = self.profiler.begin()
+        step(*args)
+        self.profiler.end(phase, start, animals)
+
+    def _random(self, phase, cell, substream=0):
+        """Draws a uniform number for each animal, from the global generator, or from the stream
+        of the cell of the animal if the island has random streams, see biosim.streams.
+
+        Parameters
+        ----------
+        phase: str
+                Name of the phase.
+        cell: ndarray
+                Cell index of each animal.
+        substream: int
+                Number of the substream of the phase.
+        """
+        if self.streams is None:
+            return np.random.random(len(cell))
+        return self.streams.random(self.year, phase, cell, substream)
+
+    def _food_grows(self):
+        """Sets the food of the landscape types with f_max to f_max."""
+        for cell_type, landscape in self.valid_landscapes.items():
+            if "f_max" in landscape.params:
+                self.food[self.cell_types == cell_type] = landscape.params["f_max"]
+
+    def _herbivores_eat(self, cells):
+        """The herbivores of each cell eat in a random order until the food is gone.
+
+        Like Landscape.herbivore_eats, a herbivore that leaves less than F of the food eats the
+        rest of it as well.
+
+        Parameters
+        ----------
+        cells: dict
+                Arrays of the animals of each species in the cells that are done.
+        """
+        animals = cells["Herbivore"]
+        if len(animals["cell"]) == 0:
+            return
+        params = Herbivore.params
+        appetite = params["F"]
+
+        order = np.lexsort((self._random("herbivore_eats", animals["cell"]), animals["cell"]))
+        cell = animals["cell"][order]
+        position = np.arange(len(cell)) - np.searchsorted(cell, cell)
+        food_before = self.food[cell] - position * appetite
+        takes_rest = (food_before > 0) & (food_before < 2 * appetite)
+        takes_rest &= (position == 0) | (food_before >= appetite)
+        eaten = np.where(food_before >= 2 * appetite, appetite, 0.0)
+        eaten[takes_rest] = food_before[takes_rest]
+
+        animals["weight"][order] += params["beta"] * eaten
+        self.food -= np.bincount(cell, weights=eaten, minlength=len(self.food))
+        self.food[cell[takes_rest]] = 0.0
+
+    def _carnivores_eat(self, cells):
+        """The carnivores of each cell hunt, fittest first, for the least fit herbivores.
+
+        Parameters
+        ----------
+        cells: dict
+                Arrays of the animals of each species in the cells that are done.
+        """
+        herbivores, carnivores = cells["Herbivore"], cells["Carnivore"]
+        if len(herbivores["cell"]) == 0 or len(carnivores["cell"]) == 0:
+            return
+        params = Carnivore.params
+        herb_order = np.argsort(herbivores["cell"], kind="stable")
+        carn_order = np.argsort(carnivores["cell"], kind="stable")
+        herb_cell = herbivores["cell"][herb_order]
+        carn_cell = carnivores["cell"][carn_order]
+        herb_fitness = self._fitness(Herbivore.params, herbivores["age"], herbivores["weight"])
+        carn_fitness = self._fitness(params, carnivores["age"], carnivores["weight"])
+        alive = np.ones(len(herb_cell), dtype=bool)
+
+        hunted = np.intersect1d(herb_cell, carn_cell)
+        for cell, herb_start, herb_stop, carn_start, carn_stop in zip(
+            hunted,
+            np.searchsorted(herb_cell, hunted),
+            np.searchsorted(herb_cell, hunted, side="right"),
+            np.searchsorted(carn_cell, hunted),
+            np.searchsorted(carn_cell, hunted, side="right"),
+        ):
+            prey = herb_order[herb_start:herb_stop]
+            prey = prey[np.argsort(herb_fitness[prey], kind="stable")]
+            hunters = carn_order[carn_start:carn_stop]
+            hunters = hunters[np.argsort(-carn_fitness[hunters], kind="stable")]
+            if self.streams is None:
+                random = np.random.random
+            else:
+                random = self.streams.generator(self.year, cell, "carnivore_eats").random
+            for hunter in hunters:
+                prey, killed = self._hunt(cells, hunter, prey, herb_fitness, params, random)
+                alive[killed] = False
+                if len(prey) == 0:
+                    break
+
+        for key in herbivores:
+            herbivores[key] = herbivores[key][alive]
+
+    def _hunt(self, cells, hunter, prey, herb_fitness, params, random):
+        """One carnivore hunts the prey, sorted by increasing fitness, like Carnivore.eat.
+
+        The kill probabilities for all the remaining prey are drawn at once with random, a
+        function giving an array of uniform numbers. The carnivore only changes when it kills, so
+        the draws up to the first kill are the same as drawing for one herbivore at a time.
+
+        Returns
+        -------
+        prey: ndarray
+                The prey that is still alive.
+        killed: list
+                The prey that was killed.
+        """
+        carnivores, herbivores = cells["Carnivore"], cells["Herbivore"]
+        age = carnivores["age"][hunter]
+        weight = carnivores["weight"][hunter]
+        fitness = self._fitness(params, age, weight)
+        appetite = params["F"]
+
+        eaten = 0.0
+        position = 0
+        killed = []
+        while position < len(prey) and eaten < appetite:
+            difference = fitness - herb_fitness[prey[position:]]
+            weaker = np.flatnonzero(difference <= 0)
+            if len(weaker) > 0:
+                difference = difference[: weaker[0]]
+            if len(difference) == 0:
+                break
+
+            kills = np.flatnonzero(
+                random(len(difference)) < difference / params["DeltaPhiMax"]
+            )
+            if len(kills) == 0:
+                break
+
+            position += kills[0]
+            killed.append(position)
+            herb_weight = herbivores["weight"][prey[position]]
+            if herb_weight + eaten < appetite:
+                eaten += herb_weight
+                weight += herb_weight * params["beta"]
+            else:
+                weight += (appetite - eaten) * params["beta"]
+                eaten = appetite
+            fitness = self._fitness(params, age, weight)
+            position += 1
+
+        carnivores["weight"][hunter] = weight
+        return np.delete(prey, killed), prey[killed]
+
+    def _reproduce(self, cells):
+        """Animals with at least one other animal of their species in the cell give birth, like
+        Animals.birth.
+
+        Parameters
+        ----------
+        cells: dict
+                Arrays of the animals of each species in the cells that are done.
+        """
+        for index, (name, species) in enumerate(self.species.items()):
+            animals = cells[name]
+            params = species.params
+            if len(animals["cell"]) < 2:
+                continue
+
+            same_species = np.bincount(animals["cell"], minlength=len(self.food))[animals["cell"]]
+            min_weight = params["zeta"] * (params["w_birth"] + params["sigma_birth"])
+            heavy = animals["weight"] >= min_weight
+            fitness = self._fitness(params, animals["age"], animals["weight"])
+            probability = np.minimum(1, params["gamma"] * fitness * (same_species - 1))
+            births = np.flatnonzero(
+                (same_species >= 2)
+                & heavy
+                & (self._random("reproduce", animals["cell"], 2 * index) < probability)
+            )
+
+            if self.streams is None:
+                baby_weight = np.random.normal(
+                    params["w_birth"], params["sigma_birth"], len(births)
+                )
+            else:
+                baby_weight = self.streams.normal(
+                    self.year,
+                    "reproduce",
+                    animals["cell"][births],
+                    params["w_birth"],
+                    params["sigma_birth"],
+                    2 * index + 1,
+                )
+            possible = baby_weight * params["xi"] < animals["weight"][births]
+            parents = births[possible]
+            baby_weight = baby_weight[possible]
+            animals["weight"][parents] -= params["xi"] * baby_weight
+
+            babies = {
+                "cell": animals["cell"][parents],
+                "age": np.zeros(len(parents), dtype=int),
+                "weight": baby_weight,
+                "moved": np.zeros(len(parents), dtype=bool),
+            }
+            for key in animals:
+                animals[key] = np.concatenate([animals[key], babies[key]])
+
+    def _migrate(self, cells):
+        """Animals that have not moved this year move to a random neighbouring cell with
+        probability mu times their fitness, unless the neighbouring cell is water.
+
+        Parameters
+        ----------
+        cells: dict
+                Arrays of the animals of each species in the cells that are done.
+        """
+        for index, (name, species) in enumerate(self.species.items()):
+            animals = cells[name]
+            fitness = self._fitness(species.params, animals["age"], animals["weight"])
+            moving = np.flatnonzero(
+                ~animals["moved"]
+                & (
+                    self._random("migrate_animals", animals["cell"], 2 * index)
+                    < species.params["mu"] * fitness
+                )
+            )
+            if self.streams is None:
+                direction = np.random.randint(len(self._neighbours), size=len(moving))
+            else:
+                direction = self.streams.integers(
+                    self.year,
+                    "migrate_animals",
+                    animals["cell"][moving],
+                    len(self._neighbours),
+                    2 * index + 1,
+                )
+            target = animals["cell"][moving] + self._neighbours[direction]
+            moved = moving[self.passable[target]]
+            animals["cell"][moved] = target[self.passable[target]]
+            animals["moved"][moved] = True
+
+    def _age_weight_die(self, cells, diagonal):
+        """Animals that are still in the cells get one year older, lose weight, and die with a
+        probability that is larger for animals with low fitness.
+
+        Parameters
+        ----------
+        cells: dict
+                Arrays of the animals of each species in the cells that are done.
+        diagonal: int
+                The anti-diagonal of the cells.
+        """
+        for index, (name, species) in enumerate(self.species.items()):
+            animals = cells[name]
+            params = species.params
+            staying = np.flatnonzero(self._diagonal[animals["cell"]] == diagonal)
+            animals["age"][staying] += 1
+            animals["weight"][staying] -= params["eta"] * animals["weight"][staying]
+            fitness = self._fitness(params, animals["age"][staying], animals["weight"][staying])
+            dies = np.zeros(len(animals["cell"]), dtype=bool)
+            dies[staying] = (
+                self._random("age_weight_die", animals["cell"][staying], index)
+                < params["omega"] * (1 - fitness)
+            )
+            dies[staying] |= animals["weight"][staying] == 0
+            for key in animals:
+                animals[key] = animals[key][~dies]
+
+    def nr_animals_pr_species(self):
+        """Returns the total number of herbivores and carnivores in a dict."""
+        return {name: len(animals["cell"]) for name, animals in self._animals.items()}
+
+    def nr_animals(self):
+        """Returns the total number of animals on the island."""
+        return sum(len(animals["cell"]) for animals in self._animals.values())
+
+    def count_grid(self):
+        """Returns the number of animals of each species in each cell.
+
+        Returns
+        -------
+        grid: ndarray
+                Array with shape (rows, columns, 2), where the last axis holds the number of
+                herbivores and carnivores. Row and column 0 is the cell at location (1, 1).
+        """
+        counts = [
+            np.bincount(self._animals[name]["cell"], minlength=len(self.food))
+            for name in self.species
+        ]
+        return np.stack(counts, axis=-1).astype(int).reshape(self.shape + (2,))
+
+    def population_arrays(self):
+        """Returns read-only views of the cell index, age and weight arrays of all animals,
+        without copying them.
+
+        The engine makes new arrays every year instead of changing them, so the views keep
+        showing the animals of the year they were taken.
+
+        Returns
+        -------
+        dict
+            Dictionary with one dictionary of 'cell', 'age' and 'weight' arrays for each species.
+        """
+        population = {}
+        for name, animals in self._animals.items():
+            population[name] = {}
+            for key in ("cell", "age", "weight"):
+                view = animals[key].view()
+                view.flags.writeable = False
+                population[name][key] = view
+        return population
+
+    @property
+    def fitness_age_weight(self):
+        """The fitness, age and weight of all animals, as a dictionary of arrays for each of
+        herbivores and carnivores, like Island.fitness_age_weight."""
+        return tuple(
+            {
+                "fitness": self.fitness(name),
+                "age": self._animals[name]["age"].copy(),
+                "weight": self._animals[name]["weight"].copy(),
+            }
+            for name in self.species
+        )
+
+    def get_state(self):
+        """Returns the state of the island, with the same layout as Island.get_state."""
+        state = {"geography": self.geography, "food": self.food.copy()}
+        for name, animals in self._animals.items():
+            state[name] = {key: values.copy() for key, values in animals.items()}
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        """Creates an island from a state made by get_state of any engine.
+
+        Parameters
+        ----------
+        state: dict
+                Dictionary with the geography, food and animal arrays of an island.
+        """
+        island = cls(state["geography"])
+        island.food = np.array(state["food"], dtype=float)
+        for name in cls.species:
+            island._animals[name] = {
+                "cell": np.array(state[name]["cell"], dtype=int),
+                "age": np.array(state[name]["age"], dtype=int),
+                "weight": np.array(state[name]["weight"], dtype=float),
+            }
+            island._sort(name)
+        return island
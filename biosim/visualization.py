@@ -65,6 +65,7 @@ class Visualization:
         self._fitness_hist = None
         self._age_hist = None
         self._weight_hist = None
+        self._history = None
 
     def set_graphics(self, y_lim, x_lim, year):
         """Sets up the graphics for visualization of the different plots.
@@ -181,6 +182,59 @@ class Visualization:
                 y_new = np.full(x_new.shape, np.nan)
                 self._carn_line.set_data(np.hstack((xdata, x_new)), np.hstack((ydata, y_new)))
 
+        if self._history is not None:
+            self._apply_history()
+
+    def get_history(self):
+        """Returns the animal counts plotted in the animal count graph.
+
+        Returns
+        -------
+        dict
+            Dictionary with one array of counts per species, indexed by year. Years that are not
+            plotted are NaN. None if the graph has not been made.
+        """
+        if self._herb_line is None:
+            return None
+        return {
+            "Herbivore": np.array(self._herb_line.get_ydata(), dtype=float),
+            "Carnivore": np.array(self._carn_line.get_ydata(), dtype=float),
+        }
+
+    def set_history(self, history):
+        """Sets the animal counts of earlier years in the animal count graph. If the graph is not
+        made yet, the counts are plotted when it is made by set_graphics.
+
+        Parameters
+        ----------
+        history : dict
+                Dictionary with one array of counts per species, as returned by get_history.
+        """
+        self._history = history
+        if self._herb_line is not None:
+            self._apply_history()
+
+    def _apply_history(self):
+        """Copies the stored history into the animal count graph."""
+        for line, species in ((self._herb_line, "Herbivore"), (self._carn_line, "Carnivore")):
+            ydata = np.array(line.get_ydata(), dtype=float)
+            counts = np.asarray(self._history[species], dtype=float)[: len(ydata)]
+            ydata[: len(counts)] = counts
+            line.set_ydata(ydata)
+        self._history = None
+
+    @property
+    def nbytes(self):
+        """Bytes held by the data of the animal count graph and the heat maps."""
+        nbytes = 0
+        for line in (self._herb_line, self._carn_line):
+            if line is not None:
+                nbytes += np.asarray(line.get_xdata()).nbytes + np.asarray(line.get_ydata()).nbytes
+        for image in (self._herb_axis, self._carn_axis):
+            if image is not None:
+                nbytes += np.asarray(image.get_array()).nbytes
+        return nbytes
+
     def standard_map(self, default_geography):
         """This function is based and heavily inspired by Plesser H.E [1]_
 
@@ -263,6 +317,34 @@ class Visualization:
                 self._carn_axis, ax=self._carn_ax, orientation="vertical", fraction=0.07, pad=0.04
             )
 
+    @staticmethod
+    def plot_heatmap(grid, title, ax=None, vmax=None):
+        """Plots a grid of values for the cells of the island as a heat map with a color bar, like
+        the animal distributions.
+
+        Parameters
+        ----------
+        grid : ndarray
+            Array with shape (rows, columns) with one value for each cell of the island.
+        title : str
+            Title of the heat map.
+        ax : matplotlib.axes.Axes
+            Axes the heat map is drawn in. If None, a new figure is made.
+        vmax : float
+            Value at the top of the color scale. If None, the largest value of the grid is used.
+
+        Returns
+        -------
+        matplotlib.axes.Axes
+            The axes with the heat map.
+        """
+        if ax is None:
+            ax = plt.figure().add_subplot(1, 1, 1)
+        image = ax.imshow(grid, interpolation="nearest", vmin=0, vmax=vmax)
+        ax.figure.colorbar(image, ax=ax, orientation="vertical", fraction=0.07, pad=0.04)
+        ax.set_title(title)
+        return ax
+
     def update_animal_count(self, num_herbs, num_carns, year):
         """Updates the total animal count graph on the island. The species are sorted in total
         herbivores and total carnivores.
@@ -49,16 +49,13 @@ if __name__ == "__main__":
         }
     ]
 
-    sim = BioSim(
-        island_map=geogr,
-        ini_pop=ini_herbs,
-        seed=123456,
-        hist_specs={
-            "fitness": {"max": 1.0, "delta": 0.05},
-            "age": {"max": 60.0, "delta": 2},
-            "weight": {"max": 60, "delta": 2},
-        },
-    )
+    hist_specs = {
+        "fitness": {"max": 1.0, "delta": 0.05},
+        "age": {"max": 60.0, "delta": 2},
+        "weight": {"max": 60, "delta": 2},
+    }
+
+    sim = BioSim(island_map=geogr, ini_pop=ini_herbs, seed=123456, hist_specs=hist_specs)
 
     sim.set_animal_parameters("Herbivore", {"zeta": 3.2, "xi": 1.8})
     sim.set_animal_parameters(
@@ -76,6 +73,5 @@ if __name__ == "__main__":
 
     input("Press ENTER")
 
-    island = sim.load_simulation('sim')
-    sim.island = island
+    sim = BioSim.resume_simulation('sim', hist_specs=hist_specs)
     sim.simulate(num_years=10, vis_years=1, img_years=2000)
\ No newline at end of file
@@ -303,6 +303,15 @@ def test_fitness_function():
     assert carn.fitness == 0.998313708904945
 
 
+def test_fitness_of_arrays():
+    """Test that the fitness of arrays of ages and weights is the fitness of each animal."""
+    ages = np.array([0, 5, 5, 40])
+    weights = np.array([8.0, 10.0, 0.0, 35.0])
+    for species in (Herbivore, Carnivore):
+        expected = [species(age, weight).fitness for age, weight in zip(ages, weights)]
+        assert species.fitness_of(ages, weights) == pytest.approx(expected)
+
+
 def test_q_function():
     """Testing that the q function(sigmoid function) returns the right value."""
     herb_q = Herbivore.q(1, 1, 0.5, 0.5)
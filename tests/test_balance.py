@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+import pytest
+import threading
+from biosim.balance import CostModel, balanced_slices, steal_work
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_balanced_slices():
+    """Test that the parts are contiguous, cover all items and have about the same cost."""
+    costs = np.array([1, 1, 1, 1, 8, 1, 1, 1, 1, 1, 1, 1, 1])
+    slices = balanced_slices(costs, 3)
+    assert slices[0].start == 0 and slices[-1].stop == len(costs)
+    assert all(first.stop == second.start for first, second in zip(slices, slices[1:]))
+    sums = [costs[part].sum() for part in slices]
+    assert max(sums) - min(sums) <= 8
+    assert balanced_slices(np.array([100, 1]), 4) == [slice(0, 1), slice(1, 2)]
+    assert balanced_slices(np.array([]), 4) == []
+
+
+def test_cost_model_learns_slow_cells():
+    """Test that cells of work units that take longer than estimated get larger estimates."""
+    model = CostModel(6)
+    cells = np.array([1, 2, 3, 4])
+    animals = np.array([10, 10, 10, 10])
+    units = model.partition(cells, animals, 2)
+    assert units == [slice(0, 2), slice(2, 4)]
+    model.update(cells, animals, units, [3.0, 1.0])
+    assert np.all(model.factor[[1, 2]] > 1) and np.all(model.factor[[3, 4]] < 1)
+    assert model.factor[0] == model.factor[5] == 1
+    assert model.partition(cells, animals, 2) == [slice(0, 1), slice(1, 4)]
+    with pytest.raises(ValueError):
+        CostModel(6, smoothing=2)
+
+
+def test_idle_threads_steal_work():
+    """Test that a thread that is done takes the tasks of a busy thread, and that the results
+    come in the order of the tasks. The first task waits until the second has been stolen."""
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return "slow"
+
+    def fast(number):
+        return number
+
+    def last():
+        release.set()
+        return "last"
+
+    tasks = [slow, last, lambda: fast(2), lambda: fast(3), lambda: fast(4), lambda: fast(5)]
+    with ThreadPoolExecutor(2) as executor:
+        results, seconds, stolen = steal_work(executor, 2, tasks)
+    assert results == ["slow", "last", 2, 3, 4, 5]
+    assert stolen >= 2
+    assert len(seconds) == len(tasks)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import json
+import numpy as np
+import pytest
+from benchmarks.geography import land_cells, synthetic_geography
+from benchmarks.macro import compare, main, run_matrix
+from benchmarks.micro import landscape_herbivore_reproduce, run_all, run_benchmark
+from benchmarks.population import synthetic_population
+from biosim.island import Island
+
+
+def test_synthetic_geography_is_valid_island():
+    """Test that the geography has the given size, a water border and is accepted by Island."""
+    geography = synthetic_geography(8, 12, land_fraction=0.5, seed=2)
+    lines = geography.splitlines()
+    assert len(lines) == 8 and all(len(line) == 12 for line in lines)
+    Island(geography, [])
+    assert synthetic_geography(8, 12, land_fraction=0.5, seed=2) == geography
+    assert len(land_cells(synthetic_geography(8, 12, land_fraction=1))) == 6 * 10
+
+
+def test_synthetic_geography_rejects_small_islands():
+    """Test that islands without room for land inside the border are rejected."""
+    with pytest.raises(ValueError):
+        synthetic_geography(2, 5)
+
+
+def test_synthetic_population_density():
+    """Test that every land cell gets the given number of animals of each species."""
+    geography = synthetic_geography(6, 6, seed=1)
+    population = synthetic_population(geography, herbivores=3, carnivores=2)
+    island = Island(geography, population)
+    cells = len(land_cells(geography))
+    assert island.nr_animals_pr_species() == {"Herbivore": 3 * cells, "Carnivore": 2 * cells}
+
+
+def test_run_matrix_and_compare(tmpdir):
+    """Test that the matrix has one result per case, and that slower cases are regressions."""
+    results = run_matrix([(5, 5), (7, 7)], [(2, 1)], [2], repeat=1, warmup=0)
+    assert [result["name"] for result in results["results"]] == ["5x5-h2-c1-y2", "7x7-h2-c1-y2"]
+    assert len(results["scaling"]) == 1
+
+    slower = json.loads(json.dumps(results))
+    slower["results"][0]["median"] *= 2
+    comparison = compare(results, slower, threshold=0.1)
+    assert [case["regression"] for case in comparison] == [True, False]
+
+    baseline_file, current_file = str(tmpdir.join("base.json")), str(tmpdir.join("new.json"))
+    for file, data in ((baseline_file, results), (current_file, slower)):
+        with open(file, "w") as json_file:
+            json.dump(data, json_file)
+    assert main(["compare", baseline_file, current_file]) == 1
+    assert main(["compare", baseline_file, baseline_file]) == 0
+
+
+def test_micro_benchmark_summary():
+    """Test that a kernel is timed the given number of times, with the statistics."""
+    params = {"herbivores": 20, "carnivores": 2}
+    result = run_benchmark("carnivore_eat", params, repeat=4, warmup=1)
+    assert result["name"] == "carnivore_eat[herbivores=20,carnivores=2]"
+    assert len(result["seconds"]) == 4
+    assert result["min"] <= result["median"] <= max(result["seconds"])
+
+
+def test_micro_benchmarks_are_repeatable():
+    """Test that the seeded setup and run give the same result every time."""
+    sizes = []
+    for _ in range(2):
+        np.random.seed(0)
+        cell = landscape_herbivore_reproduce(50).__self__
+        np.random.seed(1)
+        cell.herbivore_reproduce()
+        sizes.append(len(cell.herbivore_list))
+    assert sizes[0] == sizes[1]
+    assert run_all(["animals_q"], repeat=2, warmup=0)["results"][0]["benchmark"] == "animals_q"
+    with pytest.raises(KeyError):
+        run_all(["unknown"])
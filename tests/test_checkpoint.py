@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+import pytest
+import threading
+from biosim.animals import Herbivore
+from biosim.checkpoint import (
+    save_checkpoint,
+    load_checkpoint,
+    get_parameters,
+    latest_checkpoint,
+)
+from biosim.simulation import BioSim
+
+
+@pytest.fixture
+def sim():
+    """Small simulation that has been simulated for a few years."""
+    ini_pop = [
+        {
+            "loc": (2, 2),
+            "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0} for _ in range(20)]
+            + [{"species": "Carnivore", "age": 5, "weight": 20.0} for _ in range(5)],
+        }
+    ]
+    sim = BioSim(island_map="WWWW\nWLHW\nWWWW", ini_pop=ini_pop, seed=4)
+    sim.simulate(3, vis_years=None)
+    return sim
+
+
+@pytest.mark.parametrize("compress, mmap", [(False, False), (True, False), (False, True)])
+def test_checkpoint_round_trip(sim, tmp_path, compress, mmap):
+    """Test that the state read from a checkpoint equals the state that was written."""
+    file = str(tmp_path / "state.npz")
+    state = sim.get_state()
+    save_checkpoint(file, state, compress)
+    loaded = load_checkpoint(file, mmap)
+
+    assert loaded["year"] == 3
+    assert loaded["island"]["geography"] == state["island"]["geography"]
+    assert loaded["params"] == get_parameters()
+    np.testing.assert_array_equal(loaded["island"]["food"], state["island"]["food"])
+    for species in ("Herbivore", "Carnivore"):
+        for name in ("cell", "age", "weight"):
+            np.testing.assert_array_equal(
+                loaded["island"][species][name], state["island"][species][name]
+            )
+
+
+def test_checkpoint_memory_mapped(sim, tmp_path):
+    """Test that the animal arrays of an uncompressed checkpoint are memory-mapped."""
+    file = str(tmp_path / "state.npz")
+    save_checkpoint(file, sim.get_state())
+    loaded = load_checkpoint(file, mmap=True)
+    assert isinstance(loaded["island"]["Herbivore"]["weight"], np.memmap)
+
+
+def test_load_simulation_sets_parameters(sim, tmp_path):
+    """Test that loading a simulation returns the saved island and restores the parameters."""
+    name = str(tmp_path / "sim")
+    old_omega = Herbivore.params["omega"]
+    sim.save_simulation(name)
+    Herbivore.set_params({"omega": 0.9})
+    island = BioSim.load_simulation(name)
+    assert Herbivore.params["omega"] == old_omega
+    assert island.nr_animals_pr_species() == sim.num_animals_per_species
+
+
+def test_newer_version_raises_value_error(sim, tmp_path):
+    """Test that a checkpoint with a newer version than supported raises ValueError."""
+    file = str(tmp_path / "state.npz")
+    save_checkpoint(file, sim.get_state())
+    with np.load(file) as npz:
+        arrays = {key: npz[key] for key in npz.files}
+    arrays["version"] = np.array(1000)
+    np.savez(file, **arrays)
+    with pytest.raises(ValueError):
+        load_checkpoint(file)
+
+
+def test_resume_is_bit_exact(sim, tmp_path):
+    """Test that a resumed simulation continues exactly like the uninterrupted simulation."""
+    name = str(tmp_path / "sim")
+    sim.save_simulation(name)
+    resumed = BioSim.resume_simulation(name)
+    assert resumed.year == sim.year
+
+    sim.simulate(5, vis_years=None)
+    resumed.simulate(5, vis_years=None)
+    state, resumed_state = sim.get_state(), resumed.get_state()
+    for species in ("Herbivore", "Carnivore"):
+        for name in ("cell", "age", "weight"):
+            np.testing.assert_array_equal(
+                state["island"][species][name], resumed_state["island"][species][name]
+            )
+
+
+def test_resume_restores_history_and_image_counter(tmp_path):
+    """Test that the plotted animal counts and the image numbering are restored."""
+    ini_pop = [
+        {
+            "loc": (2, 2),
+            "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0} for _ in range(10)],
+        }
+    ]
+    img_base = str(tmp_path / "img")
+    sim = BioSim(island_map="WWWW\nWLHW\nWWWW", ini_pop=ini_pop, seed=1, img_base=img_base)
+    sim.simulate(3, vis_years=1, img_years=1)
+    name = str(tmp_path / "sim")
+    sim.save_simulation(name)
+
+    resumed = BioSim.resume_simulation(name, img_base=img_base)
+    assert resumed._image_counter == 3
+    resumed.simulate(1, vis_years=1, img_years=1)
+    history = resumed.vis.get_history()
+    np.testing.assert_array_equal(
+        history["Herbivore"][1:4], sim.vis.get_history()["Herbivore"][1:4]
+    )
+    assert (tmp_path / "img_00003.png").exists()
+
+
+def test_simulate_writes_checkpoints_in_background(sim, tmp_path):
+    """Test that simulate writes checkpoints, keeps the newest ones and leaves no temporary
+    files."""
+    directory = str(tmp_path / "checkpoints")
+    fork = sim.fork()
+    sim.simulate(6, vis_years=None, checkpoint_every=2, checkpoint_dir=directory, checkpoint_keep=2)
+    assert sorted(path.name for path in (tmp_path / "checkpoints").iterdir()) == [
+        "checkpoint_00000006.npz",
+        "checkpoint_00000008.npz",
+    ]
+
+    resumed = BioSim.resume_simulation(latest_checkpoint(directory))
+    assert resumed.year == 8
+    fork.simulate(5, vis_years=None)
+    np.testing.assert_array_equal(
+        resumed.get_state()["island"]["Herbivore"]["weight"],
+        fork.get_state()["island"]["Herbivore"]["weight"],
+    )
+
+
+def test_checkpoints_are_written_when_simulate_fails(sim, tmp_path):
+    """Test that the checkpoints submitted before a recorder fails are written, and the writer
+    thread is stopped."""
+
+    class Failing:
+        def record(self, sim):
+            if sim.year == 7:
+                raise RuntimeError("Recorder failed.")
+
+    sim.add_recorder(Failing())
+    directory = tmp_path / "checkpoints"
+    threads = threading.active_count()
+    with pytest.raises(RuntimeError):
+        sim.simulate(6, vis_years=None, checkpoint_every=1, checkpoint_dir=str(directory))
+    assert sorted(path.name for path in directory.iterdir()) == [
+        "checkpoint_00000004.npz",
+        "checkpoint_00000005.npz",
+        "checkpoint_00000006.npz",
+    ]
+    assert threading.active_count() == threads
+
+
+def test_only_own_checkpoints_are_removed(sim, tmp_path):
+    """Test that keeping the newest checkpoints does not remove checkpoints of other runs."""
+    directory = tmp_path / "checkpoints"
+    directory.mkdir()
+    other = directory / "checkpoint_00000001.npz"
+    save_checkpoint(str(other), sim.get_state())
+    sim.simulate(
+        4, vis_years=None, checkpoint_every=1, checkpoint_dir=str(directory), checkpoint_keep=2
+    )
+    assert sorted(path.name for path in directory.iterdir()) == [
+        "checkpoint_00000001.npz",
+        "checkpoint_00000006.npz",
+        "checkpoint_00000007.npz",
+    ]
+
+
+def test_corrupt_checkpoint_raises_value_error(sim, tmp_path):
+    """Test that a checkpoint with changed data fails the checksum verification."""
+    file = str(tmp_path / "state.npz")
+    save_checkpoint(file, sim.get_state())
+    loaded = load_checkpoint(file, mmap=True)
+    weights = loaded["island"]["Herbivore"]["weight"]
+    with open(file, "r+b") as raw:
+        raw.seek(weights.offset)
+        raw.write(b"\xff" * 8)
+
+    with pytest.raises(ValueError):
+        load_checkpoint(file, mmap=True)
+    load_checkpoint(file, mmap=True, verify=False)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import pytest
+from biosim.golden import GoldenRecorder, check_golden, main, record_golden
+from biosim.simulation import BioSim
+from biosim.validation import SCENARIOS
+
+
+def _herbivores(loc, number):
+    """Population of herbivores in one cell."""
+    return [
+        {"loc": loc, "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0}] * number}
+    ]
+
+
+@pytest.fixture
+def scenario(monkeypatch):
+    """Small scenario registered as 'tiny'."""
+    population = _herbivores((2, 2), 20)
+    population[0]["pop"] = population[0]["pop"] + [
+        {"species": "Carnivore", "age": 5, "weight": 20.0}
+    ] * 4
+    scenario = {
+        "island_map": "WWWWW\nWLLHW\nWWWWW",
+        "ini_pop": population,
+        "years": 6,
+        "additions": {},
+        "parameters": {},
+    }
+    monkeypatch.setitem(SCENARIOS, "tiny", lambda: dict(scenario))
+    return scenario
+
+
+def _run(seed, change_year=None, years=6):
+    """Simulates with a recorder, adding herbivores to cell (2, 4) before change_year."""
+    sim = BioSim(island_map="WWWWW\nWLLHW\nWWWWW", ini_pop=_herbivores((2, 2), 20), seed=seed)
+    recorder = GoldenRecorder()
+    sim.add_recorder(recorder)
+    for year in range(years):
+        if year == change_year:
+            sim.add_population(_herbivores((2, 4), 1))
+        sim.simulate(1, vis_years=None)
+    return recorder
+
+
+def test_same_seed_gives_same_trajectory():
+    """Test that two runs with the same seed have no difference."""
+    golden = _run(4)
+    assert len(golden) == 6
+    assert golden.diff(_run(4)) is None
+
+
+def test_first_diverging_year_and_cell():
+    """Test that the diff gives the first year and the cell where the runs differ."""
+    difference = _run(4).diff(_run(4, change_year=3))
+    assert difference["year"] == 4
+    assert (2, 4) in difference["cells"]
+    golden, new = difference["counts"]
+    assert set(golden) == set(new) == {"Herbivore", "Carnivore"}
+
+
+def test_shorter_run_differs():
+    """Test that a run with fewer years differs in the first missing year."""
+    difference = _run(4).diff(_run(4, years=4))
+    assert difference == {"year": 5, "counts": None, "cells": []}
+
+
+def test_hash_does_not_depend_on_order():
+    """Test that the hash of a cell only depends on its animals, not their order."""
+    recorder = GoldenRecorder()
+    state = {
+        "geography": "WWW\nWLW\nWWW",
+        "Herbivore": {"cell": [4, 4], "age": [1, 2], "weight": [3.0, 4.0]},
+        "Carnivore": {"cell": [], "age": [], "weight": []},
+    }
+    swapped = dict(state, Herbivore={"cell": [4, 4], "age": [2, 1], "weight": [4.0, 3.0]})
+    changed = dict(state, Herbivore={"cell": [4, 4], "age": [2, 1], "weight": [4.0, 3.5]})
+    assert list(recorder.cell_hashes(state)) == ["2,2"]
+    assert recorder.cell_hashes(state) == recorder.cell_hashes(swapped)
+    assert recorder.cell_hashes(state) != recorder.cell_hashes(changed)
+    rounded = GoldenRecorder(decimals=0)
+    assert rounded.cell_hashes(changed) == rounded.cell_hashes(
+        dict(state, Herbivore={"cell": [4, 4], "age": [2, 1], "weight": [4.0, 3.6]})
+    )
+
+
+def test_record_and_check_golden_file(scenario, tmp_path):
+    """Test that a golden file is the same when the scenario is simulated again."""
+    file = str(tmp_path / "golden.json")
+    recorder = record_golden(file, "tiny", seed=3)
+    assert len(recorder) == 7
+    assert GoldenRecorder.load(file).years == recorder.years
+    assert check_golden(file) is None
+    assert check_golden(file, engine="vectorized") is not None
+
+
+def test_command_line(scenario, tmp_path, capsys):
+    """Test that the command line interface records and checks golden files."""
+    file = str(tmp_path / "golden.json")
+    assert main(["record", file, "--scenario", "tiny", "--seed", "2", "--years", "3"]) == 0
+    assert main(["check", file]) == 0
+    assert "Same as the golden file" in capsys.readouterr().out
+    assert main(["check", file, "--engine", "vectorized"]) == 1
+    assert "First difference in year" in capsys.readouterr().out
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+import pytest
+from biosim.history import CellHistory
+from biosim.simulation import BioSim
+
+
+@pytest.fixture
+def grids():
+    """Random counts for 10 years on a 5 x 7 island."""
+    return np.random.RandomState(5).randint(0, 20, size=(10, 5, 7, 2))
+
+
+@pytest.fixture
+def history(tmp_path, grids):
+    """History with the counts recorded every second year from year 2, in tiles of 2 x 2 cells."""
+    history = CellHistory(str(tmp_path / "cells"), stride=2, capacity=3, tile=2)
+    for position, grid in enumerate(grids):
+        history.append(2 + 2 * position, grid)
+    history.flush()
+    return history
+
+
+def test_history_grows_and_reopens(history, grids):
+    """Test that the history grows past its capacity, and can be opened read-only."""
+    assert len(history) == 10
+    reopened = CellHistory.open(history.base)
+    np.testing.assert_array_equal(reopened.grid(6), grids[2])
+    assert list(reopened.years) == list(range(2, 21, 2))
+    with pytest.raises(ValueError):
+        reopened.append(22, grids[0])
+
+
+def test_cell_series(history, grids):
+    """Test that the counts of one cell are returned for a range of years."""
+    years, counts = history.cell_series((2, 3), "Carnivore", start=5, stop=12)
+    assert list(years) == [6, 8, 10, 12]
+    np.testing.assert_array_equal(counts, grids[2:6, 1, 2, 1])
+
+
+@pytest.mark.parametrize("region", [((1, 4), (1, 2)), ((2, 4), (3, 7)), ((5, 5), (7, 7))])
+def test_years_exceeding(history, grids, region):
+    """Test that the years where a region exceeds a threshold are found, for regions made of
+    whole tiles and regions that are not."""
+    (row_min, row_max), (col_min, col_max) = region
+    sums = grids[:, row_min - 1 : row_max, col_min - 1 : col_max, 0].sum(axis=(1, 2))
+    threshold = np.median(sums)
+    expected = history.years[sums > threshold]
+    np.testing.assert_array_equal(history.years_exceeding(region, threshold), expected)
+
+
+def test_append_must_follow_last_year(history, grids):
+    """Test that years can not be skipped."""
+    with pytest.raises(ValueError):
+        history.append(30, grids[0])
+
+
+def test_record_simulation(tmp_path):
+    """Test that a history attached to a simulation records the counts of every cell."""
+    ini_pop = [
+        {
+            "loc": (2, 2),
+            "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0} for _ in range(10)],
+        }
+    ]
+    sim = BioSim(island_map="WWWW\nWLHW\nWWWW", ini_pop=ini_pop, seed=1)
+    with CellHistory(str(tmp_path / "sim")) as history:
+        sim.add_recorder(history)
+        sim.simulate(4, vis_years=None)
+        np.testing.assert_array_equal(history.grid(4), sim.island.count_grid())
@@ -250,3 +250,26 @@ def test_island_cycle(plain_landscape):
     ]
     plain_landscape.set_population_in_cell(default_pop)
     plain_landscape.cycle_island()
+
+
+def test_get_state_and_from_state(plain_landscape):
+    """Test that an island made from a state has the same animals in the same cells and order."""
+    default_pop = [
+        {
+            "loc": (2, 2),
+            "pop": [{"species": "Herbivore", "age": age, "weight": 20.0} for age in range(5)],
+        },
+        {
+            "loc": (2, 3),
+            "pop": [{"species": "Carnivore", "age": 3, "weight": 15.0 + w} for w in range(3)],
+        },
+    ]
+    plain_landscape.set_population_in_cell(default_pop)
+    state = plain_landscape.get_state()
+    assert list(state["Herbivore"]["cell"]) == [5] * 5
+    assert list(state["Carnivore"]["cell"]) == [6] * 3
+
+    island = Island.from_state(state)
+    assert island.nr_animals_pr_species() == {"Herbivore": 5, "Carnivore": 3}
+    assert [herb.age for herb in island.island_map[(2, 2)].herbivore_list] == list(range(5))
+    assert [carn.weight for carn in island.island_map[(2, 3)].carnivore_list] == [15, 16, 17]
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import pytest
+import tracemalloc
+from biosim.memory import MemoryBudget, bytes_per_animal
+from biosim.profiler import PhaseProfiler
+from biosim.recorder import TimeSeriesRecorder
+from biosim.simulation import BioSim
+
+
+@pytest.fixture
+def sim():
+    """Small simulation with herbivores."""
+    ini_pop = [
+        {
+            "loc": (2, 2),
+            "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0} for _ in range(50)],
+        }
+    ]
+    return BioSim(island_map="WWWW\nWLLW\nWWWW", ini_pop=ini_pop, seed=8)
+
+
+def test_bytes_per_animal():
+    """Test that the arrays are smaller than the objects."""
+    per_animal = bytes_per_animal()
+    assert per_animal["arrays"] == 24
+    assert per_animal["object"] > per_animal["arrays"]
+
+
+def test_memory_report(sim):
+    """Test that the report counts the animals and the recorder columns."""
+    recorder = TimeSeriesRecorder(chunk_size=100)
+    sim.add_recorder(recorder)
+    sim.simulate(2, vis_years=None)
+    report = sim.memory_report()
+    animals = sim.num_animals
+    assert report["animal_bytes"]["object"] == animals * report["bytes_per_animal"]["object"]
+    assert report["recorder_bytes"] == [3 * 100 * 8]
+    assert report["visualization_bytes"] == 0
+    assert report["total_bytes"] == report["animal_bytes"]["object"] + 2400
+    assert report["representation"] == "object"
+    assert "phases" not in report
+
+
+def test_memory_report_of_array_engine():
+    """Test that the animals of an array engine are counted as arrays, so a budget that the
+    arrays fit in does not stop the simulation."""
+    ini_pop = [
+        {
+            "loc": (2, 2),
+            "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0} for _ in range(50)],
+        }
+    ]
+    sim = BioSim(island_map="WWWW\nWLLW\nWWWW", ini_pop=ini_pop, seed=8, engine="vectorized")
+    report = sim.memory_report()
+    assert report["representation"] == "arrays"
+    assert report["total_bytes"] == 50 * 24
+    sim.add_recorder(MemoryBudget(max_bytes=4 * report["total_bytes"], action="abort"))
+    sim.simulate(1, vis_years=None)
+
+
+def test_memory_report_with_traced_phases(sim):
+    """Test that traced memory of each phase is included in the report."""
+    sim.profiler = PhaseProfiler(trace_memory=True)
+    try:
+        sim.simulate(1, vis_years=None)
+    finally:
+        tracemalloc.stop()
+    phases = sim.memory_report()["phases"]
+    assert phases["reproduce"]["peak_bytes"] > 0
+    assert "allocated_bytes" in sim.profiler.to_frame().columns
+
+
+def test_budget_warns(sim):
+    """Test that exceeding the population budget gives a warning."""
+    sim.add_recorder(MemoryBudget(max_animals=10))
+    with pytest.warns(RuntimeWarning):
+        sim.simulate(1, vis_years=None)
+
+
+def test_budget_aborts(sim):
+    """Test that exceeding the memory budget stops the simulation after the year."""
+    budget = MemoryBudget(max_bytes=1, action="abort")
+    sim.add_recorder(budget)
+    with pytest.raises(RuntimeError):
+        sim.simulate(5, vis_years=None)
+    assert sim.year == 1
+    assert budget.exceeded == [1]
+
+
+def test_budget_rejects_unknown_action():
+    """Test that only warn and abort are accepted."""
+    with pytest.raises(ValueError):
+        MemoryBudget(action="ignore")
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+import pytest
+from biosim import pools
+from biosim.pools import RandomPool
+from biosim.simulation import BioSim
+
+
+def _sim(**kwargs):
+    """Small simulation with herbivores and carnivores."""
+    ini_pop = [
+        {
+            "loc": (2, 2),
+            "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0}] * 30
+            + [{"species": "Carnivore", "age": 5, "weight": 20.0}] * 5,
+        }
+    ]
+    return BioSim(island_map="WWWWW\nWLLHW\nWWWWW", ini_pop=ini_pop, seed=3, **kwargs)
+
+
+def test_pool_refills_in_blocks():
+    """Test that the pool hands out the blocks of its generator in order."""
+    pool = RandomPool(seed=4, block=3)
+    generator = np.random.default_rng(4)
+    expected = np.concatenate([generator.random(3) for _ in range(4)])
+    assert [pool.uniform() for _ in range(12)] == expected.tolist()
+
+
+def test_pool_values():
+    """Test the ranges of the values of a pool."""
+    pool = RandomPool(seed=1, block=100)
+    assert all(0 <= pool.uniform() < 1 for _ in range(250))
+    assert {pool.direction() for _ in range(250)} == {0, 1, 2, 3}
+    normals = np.array([pool.normal(8.0, 0.5) for _ in range(2000)])
+    assert abs(normals.mean() - 8.0) < 0.05
+    assert abs(normals.std() - 0.5) < 0.05
+    with pytest.raises(ValueError):
+        RandomPool(block=0)
+
+
+def test_pool_state_round_trip():
+    """Test that a pool made from a state continues exactly like the pool."""
+    pool = RandomPool(seed=2, block=5)
+    for _ in range(3):
+        pool.uniform(), pool.direction(), pool.normal(0, 1)
+    copy = RandomPool.from_state(pool.get_state())
+    for _ in range(12):
+        assert copy.uniform() == pool.uniform()
+        assert copy.direction() == pool.direction()
+        assert copy.normal(0, 1) == pool.normal(0, 1)
+
+
+def test_global_generator_without_pool(mocker):
+    """Test that the global generator is used when no pool is active, and the pool otherwise."""
+    mocker.patch("numpy.random.random", return_value=0.25)
+    assert pools.uniform() == 0.25
+    pool = RandomPool(seed=1)
+    with pools.activated(pool):
+        assert pools.uniform() != 0.25
+    assert pools.uniform() == 0.25
+
+
+def test_simulation_with_pool_is_reproducible():
+    """Test that a pool gives the same simulation for the same seed, and follows forks."""
+    sims = [_sim(random_pool=True) for _ in range(2)]
+    sims[0].simulate(3, vis_years=None)
+    fork = sims[0].fork()
+    sims[0].simulate(3, vis_years=None)
+    sims[1].simulate(6, vis_years=None)
+    fork.simulate(3, vis_years=None)
+    grids = [sim.island.count_grid() for sim in sims + [fork]]
+    assert np.array_equal(grids[0], grids[1])
+    assert np.array_equal(grids[0], grids[2])
+
+    other = _sim()
+    other.simulate(6, vis_years=None)
+    assert other.get_state()["random_pool"] is None
+    assert not np.array_equal(
+        sorted(other.island.get_state()["Herbivore"]["weight"]),
+        sorted(sims[0].island.get_state()["Herbivore"]["weight"]),
+    )
+
+
+def test_pool_is_saved_in_checkpoints(tmp_path):
+    """Test that a resumed simulation continues with the pool of the saved simulation."""
+    sim = _sim(random_pool=True)
+    sim.simulate(2, vis_years=None)
+    name = str(tmp_path / "pool")
+    sim.save_simulation(name)
+    resumed = BioSim.resume_simulation(name)
+    sim.simulate(3, vis_years=None)
+    resumed.simulate(3, vis_years=None)
+    assert np.array_equal(
+        sim.island.get_state()["Herbivore"]["weight"],
+        resumed.island.get_state()["Herbivore"]["weight"],
+    )
+
+
+def test_pool_only_for_reference_engine():
+    """Test that the array engines do not take a random pool."""
+    with pytest.raises(ValueError):
+        _sim(engine="vectorized", random_pool=True)
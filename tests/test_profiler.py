@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+import pytest
+from biosim.profiler import PhaseProfiler
+from biosim.simulation import BioSim
+
+
+@pytest.fixture
+def sim():
+    """Small simulation with herbivores and carnivores."""
+    ini_pop = [
+        {
+            "loc": (2, 2),
+            "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0} for _ in range(30)]
+            + [{"species": "Carnivore", "age": 5, "weight": 20.0} for _ in range(5)],
+        }
+    ]
+    return BioSim(island_map="WWWWW\nWLHLW\nWWWWW", ini_pop=ini_pop, seed=3)
+
+
+def test_profiled_simulation_is_unchanged(sim):
+    """Test that profiling does not change the simulated population."""
+    fork = sim.fork()
+    sim.profiler = PhaseProfiler()
+    sim.simulate(5, vis_years=None)
+    fork.simulate(5, vis_years=None)
+    assert sim.num_animals_per_species == fork.num_animals_per_species
+    assert sim.island.get_state()["Herbivore"]["weight"] == pytest.approx(
+        fork.island.get_state()["Herbivore"]["weight"]
+    )
+
+
+def test_profiler_counts_calls_and_animals(sim):
+    """Test that every phase is called once per cell and year, and counts the animals."""
+    sim.profiler = PhaseProfiler()
+    sim.simulate(2, vis_years=None)
+    summary = sim.profiler.summary()
+    cells = len(sim.island.island_map)
+    assert summary["food_grows"]["calls"] == 2 * cells
+    assert summary["reset_migration"]["calls"] == 2
+    assert summary["herbivore_eats"]["animals"] >= 30
+    assert sum(phase["share"] for phase in summary.values()) == pytest.approx(1)
+    assert "visualization" not in sim.profiler
+
+
+def test_profiler_times_visualization(sim):
+    """Test that visualization, statistics and image saving are timed."""
+    sim.profiler = PhaseProfiler()
+    sim.simulate(2, vis_years=1)
+    for phase in ("fitness_age_weight", "visualization", "_save_file"):
+        assert sim.profiler.summary()[phase]["calls"] == 2
+    frame = sim.profiler.to_frame()
+    assert frame["seconds"].is_monotonic_decreasing
+
+
+def test_profiler_can_be_removed(sim):
+    """Test that no measurements are added after the profiler is removed."""
+    profiler = PhaseProfiler()
+    sim.profiler = profiler
+    sim.simulate(1, vis_years=None)
+    sim.profiler = None
+    calls = profiler.summary()["food_grows"]["calls"]
+    sim.simulate(1, vis_years=None)
+    assert profiler.summary()["food_grows"]["calls"] == calls
+
+
+def test_cost_grid_matches_geography(sim, tmpdir):
+    """Test that the time per cell is a grid with the shape of the map, summing to the phases."""
+    sim.profiler = PhaseProfiler(per_cell=True)
+    sim.simulate(3, vis_years=None)
+    grid = sim.profiler.cost_grid()
+    assert grid.shape == (3, 5)
+    assert grid[1, 1] > 0
+    assert grid.sum() == pytest.approx(
+        sim.profiler.total_seconds - sim.profiler.summary()["reset_migration"]["seconds"]
+    )
+    assert sim.profiler.cost_grid("herbivore_eats").sum() == pytest.approx(
+        sim.profiler.summary()["herbivore_eats"]["seconds"]
+    )
+
+    file = str(tmpdir.join("cost.npz"))
+    sim.profiler.save_cost_grids(file)
+    with np.load(file) as grids:
+        assert np.allclose(grids["total"], grid)
+        assert "migrate_animals" in grids.files
+    assert sim.profiler.plot_cost_grid("carnivore_eats").get_title().endswith("carnivore_eats")
+
+
+def test_cost_grid_requires_per_cell(sim):
+    """Test that the time per cell is only kept when asked for."""
+    sim.profiler = PhaseProfiler()
+    sim.simulate(1, vis_years=None)
+    with pytest.raises(ValueError):
+        sim.profiler.cost_grid()
+
+
+@pytest.mark.parametrize("engine", ["vectorized", "compiled", "threaded"])
+def test_array_engines_reject_per_cell(engine):
+    """Test that the array engines, which do not time each cell, reject per_cell=True."""
+    sim = BioSim(island_map="WWWWW\nWLHLW\nWWWWW", ini_pop=[], seed=3, engine=engine)
+    with pytest.raises(ValueError, match="per_cell=False"):
+        sim.profiler = PhaseProfiler(per_cell=True)
+    assert sim.profiler is None
+    sim.profiler = PhaseProfiler()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import pytest
+from biosim.progress import ProgressMonitor, PrometheusSink
+from biosim.simulation import BioSim
+
+
+@pytest.fixture
+def sim():
+    """Small simulation with herbivores."""
+    ini_pop = [
+        {
+            "loc": (2, 2),
+            "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0} for _ in range(20)],
+        }
+    ]
+    return BioSim(island_map="WWWW\nWLHW\nWWWW", ini_pop=ini_pop, seed=4)
+
+
+def test_reports_every_year_with_zero_interval(sim):
+    """Test that a monitor without interval reports every year, with the expected fields."""
+    reports = []
+    monitor = ProgressMonitor(interval=0, callbacks=[reports.append], log=None)
+    sim.simulate(3, vis_years=None, progress=monitor)
+    assert [report["year"] for report in reports] == [1, 2, 3]
+    last = reports[-1]
+    assert last["final_year"] == 3
+    assert last["eta_seconds"] == 0
+    assert last["population"] == sim.num_animals_per_species
+    assert last["years_per_second"] > 0
+    assert last["animal_years_per_second"] > 0
+
+
+def test_reports_at_interval_and_when_finished(sim):
+    """Test that a long interval only gives the final report."""
+    reports = []
+    monitor = ProgressMonitor(interval=3600, callbacks=[reports.append], log=None)
+    sim.simulate(4, vis_years=None, progress=monitor)
+    assert len(reports) == 1
+    assert reports[0]["year"] == 4
+
+
+def test_reports_are_logged(sim, caplog):
+    """Test that reports are written to the logger."""
+    with caplog.at_level("INFO", logger="biosim.progress"):
+        sim.simulate(2, vis_years=None, progress=ProgressMonitor(interval=0))
+    assert "year 2/2" in caplog.text
+
+
+def test_prometheus_sink(sim, tmpdir):
+    """Test that the sink writes the metrics in the Prometheus text format."""
+    file = str(tmpdir.join("biosim.prom"))
+    sink = PrometheusSink(file, labels={"run": "test"})
+    sim.simulate(2, vis_years=None, progress=ProgressMonitor(0, callbacks=[sink], log=None))
+    with open(file) as metrics_file:
+        text = metrics_file.read()
+    assert "# TYPE biosim_year gauge" in text
+    assert 'biosim_year{run="test"} 2.0' in text
+    assert 'biosim_population{run="test",species="Herbivore"}' in text
+    assert text.count("# TYPE biosim_population") == 1
+
+
+def test_invalid_settings():
+    """Test that negative intervals and smoothing outside (0, 1] are rejected."""
+    with pytest.raises(ValueError):
+        ProgressMonitor(interval=-1)
+    with pytest.raises(ValueError):
+        ProgressMonitor(smoothing=0)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+import pytest
+from biosim.recorder import TimeSeriesRecorder
+from biosim.simulation import BioSim
+
+
+@pytest.fixture
+def sim():
+    """Small simulation with herbivores and carnivores."""
+    ini_pop = [
+        {
+            "loc": (2, 2),
+            "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0} for _ in range(20)]
+            + [{"species": "Carnivore", "age": 5, "weight": 20.0} for _ in range(5)],
+        }
+    ]
+    return BioSim(island_map="WWWW\nWLHW\nWWWW", ini_pop=ini_pop, seed=2)
+
+
+def test_record_in_memory_with_stride(sim):
+    """Test that the recorder keeps every stride year and grows past its first capacity."""
+    recorder = TimeSeriesRecorder(stride=2, chunk_size=2)
+    sim.add_recorder(recorder)
+    sim.simulate(10, vis_years=None)
+    columns = recorder.columns
+    assert list(columns["year"]) == [2, 4, 6, 8, 10]
+    assert columns["Herbivore"][-1] == sim.num_animals_per_species["Herbivore"]
+    assert list(recorder.to_frame().columns) == ["year", "Herbivore", "Carnivore"]
+
+
+def test_record_per_cell(sim):
+    """Test that the counts per cell sum to the totals."""
+    recorder = TimeSeriesRecorder(per_cell=True)
+    sim.add_recorder(recorder)
+    sim.simulate(3, vis_years=None)
+    cells = recorder.columns["cells"]
+    assert cells.shape == (3, 3, 4, 2)
+    np.testing.assert_array_equal(cells[:, :, :, 0].sum(axis=(1, 2)), recorder.columns["Herbivore"])
+
+
+@pytest.mark.parametrize("file_name", ["history.csv", "history"])
+def test_record_to_file_in_chunks(sim, tmp_path, file_name):
+    """Test that rows are written in chunks, and that load reads all of them back."""
+    file = str(tmp_path / file_name)
+    with TimeSeriesRecorder(per_cell=True, file=file, chunk_size=3) as recorder:
+        sim.add_recorder(recorder)
+        sim.simulate(7, vis_years=None)
+        assert len(recorder) == 1
+
+    loaded = TimeSeriesRecorder.load(file)
+    assert list(loaded["year"]) == list(range(1, 8))
+    assert loaded["Herbivore"][-1] == sim.num_animals_per_species["Herbivore"]
+
+
+@pytest.mark.parametrize("file_name", ["history.csv", "history"])
+def test_shorter_run_replaces_earlier_files(sim, tmp_path, file_name):
+    """Test that a recorder reusing the file of a longer run does not load the rows of it."""
+    file = str(tmp_path / file_name)
+    for years in (7, 2):
+        with TimeSeriesRecorder(file=file, chunk_size=2) as recorder:
+            sim.recorders = [recorder]
+            sim.simulate(years, vis_years=None)
+    loaded = TimeSeriesRecorder.load(file)
+    assert list(loaded["year"]) == [8, 9]
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import os
+import pytest
+from biosim.simulation import BioSim
+from biosim.scenario import ScenarioTree
+
+
+@pytest.fixture
+def tree():
+    """Scenario tree with a small simulation as trunk."""
+    ini_pop = [
+        {
+            "loc": (2, 2),
+            "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0} for _ in range(30)],
+        }
+    ]
+    sim = BioSim(island_map="WWWW\nWLHW\nWWWW", ini_pop=ini_pop, seed=3)
+    return ScenarioTree(sim, keep_every=2)
+
+
+def test_checkpoints_follow_keep_every(tree):
+    """Test that checkpoints are retained for every keep_every years."""
+    tree.simulate(5)
+    assert tree["trunk"].year == 5
+    assert tree.checkpoints == [("trunk", 0), ("trunk", 2), ("trunk", 4)]
+
+
+def test_branch_continues_like_trunk(tree):
+    """Test that a branch without interventions continues exactly like the trunk."""
+    tree.simulate(4)
+    branch = tree.branch("copy", 2)
+    assert branch.year == 2
+    branch.simulate(2, vis_years=None)
+    assert branch.num_animals_per_species == tree["trunk"].num_animals_per_species
+    assert branch.island.get_state()["Herbivore"]["weight"].tolist() == (
+        tree["trunk"].island.get_state()["Herbivore"]["weight"].tolist()
+    )
+
+
+def test_branch_shares_prefix_checkpoints(tree):
+    """Test that a branch can be started from a checkpoint retained before its parent started."""
+    tree.simulate(4)
+    tree.branch("first", 4)
+    tree.simulate(2, branch="first")
+    second = tree.branch("second", 2, parent="first")
+    assert second.year == 2
+    assert ("first", 6) in tree.checkpoints
+    with pytest.raises(KeyError):
+        tree.branch("third", 3)
+
+
+def test_lru_eviction_by_bytes(tree):
+    """Test that the least recently used checkpoints are removed when the memory limit is met."""
+    tree.max_bytes = 3 * tree.nbytes
+    tree.simulate(10)
+    assert len(tree.checkpoints) <= 3
+    assert tree.nbytes <= tree.max_bytes
+    assert ("trunk", 10) in tree.checkpoints
+
+
+def test_fork_is_independent(tree):
+    """Test that a fork simulates like the original without changing it."""
+    sim = tree["trunk"]
+    sim.simulate(2, vis_years=None)
+    fork = sim.fork()
+    fork.simulate(3, vis_years=None)
+    assert sim.year == 2
+    sim.simulate(3, vis_years=None)
+    assert fork.island.get_state()["Herbivore"]["weight"].tolist() == (
+        sim.island.get_state()["Herbivore"]["weight"].tolist()
+    )
+
+
+def test_fork_with_seed_draws_new_random_numbers(tree):
+    """Test that a fork with a new seed gets a different random number stream."""
+    sim = tree["trunk"]
+    fork = sim.fork(seed=12345)
+    fork.simulate(3, vis_years=None)
+    sim.simulate(3, vis_years=None)
+    assert fork.island.get_state()["Herbivore"]["weight"].tolist() != (
+        sim.island.get_state()["Herbivore"]["weight"].tolist()
+    )
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires os.fork")
+def test_fork_process(tree):
+    """Test that a simulation can be run in a forked process, and returns the result."""
+    sim = tree["trunk"]
+
+    def run(forked_sim):
+        forked_sim.simulate(3, vis_years=None)
+        return forked_sim.num_animals_per_species
+
+    handle = sim.fork_process(run)
+    result = handle.join()
+    sim.simulate(3, vis_years=None)
+    assert result == sim.num_animals_per_species
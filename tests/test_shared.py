@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import multiprocessing
+import numpy as np
+import pytest
+from biosim import shared as shared_module
+from biosim.shared import SharedState, SharedStateReader
+from biosim.simulation import BioSim
+
+
+def _sim(engine="vectorized"):
+    """Small simulation with herbivores and carnivores."""
+    ini_pop = [
+        {
+            "loc": (2, 2),
+            "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0}] * 40
+            + [{"species": "Carnivore", "age": 5, "weight": 20.0}] * 5,
+        }
+    ]
+    return BioSim(
+        island_map="WWWWW\nWLLHW\nWLDLW\nWWWWW", ini_pop=ini_pop, seed=4, engine=engine
+    )
+
+
+def _summary(state):
+    """Year, counts and total weight of the herbivores of a shared state."""
+    return (
+        state["year"],
+        state["counts"].sum(axis=(0, 1)).tolist(),
+        float(state["Herbivore"]["weight"].sum()),
+    )
+
+
+def _read_in_process(descriptor, pipe):
+    """Reads a shared state in another process, and sends its summary back."""
+    with SharedStateReader(descriptor) as reader:
+        pipe.send(reader.read(_summary))
+
+
+@pytest.mark.parametrize("engine", ["reference", "vectorized"])
+def test_reader_sees_every_year(engine):
+    """Test that the reader sees the state of the simulation after every year, read-only."""
+    sim = _sim(engine)
+    with sim.share_state(capacity=4) as shared:
+        reader = SharedStateReader(shared.descriptor)
+        for _ in range(3):
+            sim.simulate(1, vis_years=None)
+            year, counts, weight = reader.read(_summary)
+            island = sim.island.get_state()
+            assert year == sim.year
+            assert counts == list(sim.num_animals_per_species.values())
+            assert weight == pytest.approx(island["Herbivore"]["weight"].sum())
+        state = reader.arrays()
+        ages = np.sort(state["Carnivore"]["age"])
+        assert np.array_equal(ages, np.sort(island["Carnivore"]["age"]))
+        assert np.array_equal(state["counts"], sim.island.count_grid())
+        with pytest.raises(ValueError):
+            state["Herbivore"]["weight"][0] = 1.0
+        del state
+        reader.close()
+
+
+def test_blocks_grow_with_population():
+    """Test that a new block is made when the population outgrows the first one."""
+    sim = _sim()
+    shared = SharedState(sim, capacity=1)
+    reader = SharedStateReader(shared.descriptor)
+    assert reader.read(lambda state: len(state["Herbivore"]["cell"])) == 40
+    assert shared.header[3] >= 40
+    reader.close()
+    shared.close()
+
+
+def test_reader_in_other_process():
+    """Test that another process reads the shared state without getting it from this one."""
+    sim = _sim()
+    sim.simulate(2, vis_years=None)
+    with sim.share_state() as shared:
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=_read_in_process, args=(shared.descriptor, sender))
+        process.start()
+        summary = receiver.recv()
+        process.join()
+        assert process.exitcode == 0
+        assert summary[0] == 2
+        assert summary[1] == list(sim.num_animals_per_species.values())
+
+
+def test_read_waits_for_writing():
+    """Test that read does not return a result computed while a year was written."""
+    sim = _sim()
+    with SharedState(sim) as shared:
+        reader = SharedStateReader(shared.descriptor)
+        shared.header[0] += 1
+        with pytest.raises(TimeoutError):
+            reader.read(_summary, timeout=0.01)
+        shared.header[0] += 1
+        assert reader.read(_summary)[0] == 0
+        reader.close()
+
+
+def test_reader_does_not_trust_a_torn_header(monkeypatch):
+    """Test that the reader takes the capacity from the data block, and attaches again when the
+    simulation makes a new block while the reader attaches to the old one."""
+    sim = _sim()
+    with SharedState(sim, capacity=64) as shared:
+        reader = SharedStateReader(shared.descriptor)
+        shared.header[3] = 1
+        assert reader.read(lambda state: len(state["Herbivore"]["cell"])) == 40
+        assert reader.read(_summary)[2] == pytest.approx(
+            sim.island.get_state()["Herbivore"]["weight"].sum()
+        )
+
+        attach = shared_module._attach
+
+        def attach_while_growing(name):
+            block = attach(name)
+            if name == f"{shared.name}_2":
+                shared._allocate(256)
+                shared.record(sim)
+            return block
+
+        monkeypatch.setattr(shared_module, "_attach", attach_while_growing)
+        shared._allocate(128)
+        shared.record(sim)
+        assert reader.read(lambda state: len(state["Carnivore"]["cell"])) == 5
+        assert reader._generation == 3
+        reader.close()
+
+
+def test_reader_stops_when_state_is_closed():
+    """Test that reading after the simulation closed the shared state raises RuntimeError instead
+    of waiting for a new data block."""
+    sim = _sim()
+    shared = SharedState(sim)
+    reader = SharedStateReader(shared.descriptor)
+    reader.read(_summary)
+    shared.close()
+    with pytest.raises(RuntimeError):
+        reader.read(_summary, timeout=0.1)
+    reader.close()
+
+
+def test_reader_gives_up_on_a_missing_block():
+    """Test that a reader waiting for a data block that does not exist stops at the timeout."""
+    sim = _sim()
+    with SharedState(sim) as shared:
+        reader = SharedStateReader(shared.descriptor)
+        shared.header[2] = 7
+        with pytest.raises(RuntimeError):
+            reader.arrays(timeout=0.05)
+        shared.header[2] = 1
+        reader.close()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import asyncio
+import pytest
+from biosim.simulation import BioSim
+from concurrent.futures import ProcessPoolExecutor
+
+
+@pytest.fixture
+def sim():
+    """Small simulation with herbivores."""
+    ini_pop = [
+        {
+            "loc": (2, 2),
+            "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0} for _ in range(20)],
+        }
+    ]
+    return BioSim(island_map="WWWW\nWLHW\nWWWW", ini_pop=ini_pop, seed=6)
+
+
+def test_iter_years_yields_one_snapshot_per_year(sim):
+    """Test that iter_years simulates one year per step, like simulate."""
+    fork = sim.fork()
+    years = [snapshot.year for snapshot in sim.iter_years(4)]
+    assert years == [1, 2, 3, 4]
+    fork.simulate(4, vis_years=None)
+    assert sim.num_animals_per_species == fork.num_animals_per_species
+
+
+def test_snapshot_statistics_are_lazy_and_read_only(sim, mocker):
+    """Test that statistics are only computed when used, and that arrays can not be changed."""
+    spy = mocker.spy(sim.island, "count_grid")
+    for snapshot in sim.iter_years(3, stats=("count_grid", "num_animals")):
+        pass
+    assert spy.call_count == 0
+
+    snapshot = next(sim.iter_years(1, stats=("count_grid",)))
+    grid = snapshot.count_grid
+    assert snapshot["count_grid"] is grid
+    assert spy.call_count == 1
+    with pytest.raises(ValueError):
+        grid[0, 0, 0] = 1
+    with pytest.raises(KeyError):
+        snapshot["num_animals"]
+
+
+def test_snapshot_expires_when_simulation_continues(sim):
+    """Test that statistics that were not used can not be computed after the next step."""
+    years = sim.iter_years(2, stats=("num_animals", "num_animals_per_species"))
+    first = next(years)
+    num_animals = first.num_animals
+    next(years)
+    assert first.num_animals == num_animals
+    with pytest.raises(RuntimeError):
+        first.num_animals_per_species
+
+
+def test_early_stopping(sim):
+    """Test that the simulation can be stopped early and continued."""
+    for snapshot in sim.iter_years(10):
+        if snapshot.year == 3:
+            break
+    assert sim.year == 3
+    sim.simulate(2, vis_years=None)
+    assert sim.year == 5
+
+
+def test_run_async_matches_simulate(sim):
+    """Test that run_async yields the last year of each block, and simulates like simulate."""
+    fork = sim.fork()
+
+    async def collect():
+        return [snapshot async for snapshot in sim.run_async(7, chunk=3)]
+
+    snapshots = asyncio.run(collect())
+    assert [snapshot.year for snapshot in snapshots] == [3, 6, 7]
+    fork.simulate(7, vis_years=None)
+    assert snapshots[-1].num_animals_per_species == fork.num_animals_per_species
+    assert sim.num_animals_per_species == fork.num_animals_per_species
+
+
+def test_run_async_waits_for_consumer(sim):
+    """Test that no blocks are simulated ahead of the consumer when max_ahead is 0."""
+
+    async def consume():
+        years = []
+        async for snapshot in sim.run_async(5, chunk=1):
+            await asyncio.sleep(0.05)
+            years.append(sim.year)
+        return years
+
+    assert asyncio.run(consume()) == [1, 2, 3, 4, 5]
+
+
+def test_run_async_stops_when_cancelled(sim):
+    """Test that a cancelled run leaves a consistent simulation that can be continued."""
+
+    async def consume():
+        async for snapshot in sim.run_async(100, chunk=2):
+            if snapshot.year == 4:
+                break
+
+    asyncio.run(consume())
+    assert sim.year == 4
+    sim.simulate(1, vis_years=None)
+    assert sim.year == 5
+
+
+def test_run_async_in_process_pool(sim):
+    """Test that blocks simulated in other processes give the same result."""
+    fork = sim.fork()
+
+    async def collect():
+        with ProcessPoolExecutor(1) as executor:
+            return [snap.year async for snap in sim.run_async(4, chunk=2, executor=executor)]
+
+    assert asyncio.run(collect()) == [2, 4]
+    fork.simulate(4, vis_years=None)
+    assert sim.num_animals_per_species == fork.num_animals_per_species
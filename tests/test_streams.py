@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+import pytest
+from biosim.simulation import BioSim
+from biosim.streams import RandomStreams
+
+GEOGRAPHY = "WWWWWW\nWLLHLW\nWLDLLW\nWWWWWW"
+
+
+def _population():
+    """Herbivores and carnivores in two cells."""
+    return [
+        {
+            "loc": loc,
+            "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0}] * 30
+            + [{"species": "Carnivore", "age": 5, "weight": 20.0}] * 6,
+        }
+        for loc in [(2, 2), (3, 4)]
+    ]
+
+
+def _shuffle(island, seed):
+    """Changes the order the animals of the island are stored in."""
+    generator = np.random.default_rng(seed)
+    for animals in island._animals.values():
+        order = generator.permutation(len(animals["cell"]))
+        for key in animals:
+            animals[key] = animals[key][order]
+
+
+def test_streams_depend_only_on_year_cell_and_phase():
+    """Test that a stream gives the same numbers every time, and other streams other numbers."""
+    streams = RandomStreams(7)
+    first = streams.generator(3, 10, "reproduce").random(5)
+    assert np.array_equal(first, RandomStreams(7).generator(3, 10, "reproduce").random(5))
+    for other in [
+        RandomStreams(8).generator(3, 10, "reproduce"),
+        streams.generator(4, 10, "reproduce"),
+        streams.generator(3, 11, "reproduce"),
+        streams.generator(3, 10, "migrate_animals"),
+        streams.generator(3, 10, "reproduce", substream=1),
+    ]:
+        assert not np.array_equal(first, other.random(5))
+
+
+def test_bulk_draws_follow_the_stream_of_each_cell():
+    """Test that bulk draws give each cell the next numbers of its own stream, in any order."""
+    streams = RandomStreams(1)
+    cells = np.array([5, 2, 5, 2, 2])
+    values = streams.random(0, "age_weight_die", cells)
+    assert np.array_equal(values[[1, 3, 4]], streams.generator(0, 2, "age_weight_die").random(3))
+    assert np.array_equal(values[[0, 2]], streams.generator(0, 5, "age_weight_die").random(2))
+
+    directions = streams.integers(0, "migrate_animals", cells, 4)
+    assert directions.dtype == int
+    assert set(directions.tolist()) <= {0, 1, 2, 3}
+    assert len(streams.normal(0, "reproduce", cells, 8.0, 1.5)) == len(cells)
+    assert len(streams.random(0, "reproduce", [])) == 0
+
+
+def test_unknown_phase():
+    """Test that a phase without streams gives a ValueError."""
+    with pytest.raises(ValueError):
+        RandomStreams(1).generator(0, 0, "food_grows")
+
+
+@pytest.mark.parametrize("engine", ["vectorized", "compiled"])
+def test_result_does_not_depend_on_order_of_animals(engine):
+    """Test that with random streams, the order the animals are stored in does not matter."""
+    sims = [
+        BioSim(
+            island_map=GEOGRAPHY,
+            ini_pop=_population(),
+            seed=5,
+            engine=engine,
+            random_streams=True,
+        )
+        for _ in range(2)
+    ]
+    for year in range(8):
+        _shuffle(sims[1].island, year)
+        for sim in sims:
+            sim.simulate(1, vis_years=None)
+    assert np.array_equal(sims[0].island.count_grid(), sims[1].island.count_grid())
+    assert sims[0].num_animals_per_species == sims[1].num_animals_per_species
+
+
+def test_order_matters_without_streams():
+    """Test that the global generator gives results that depend on the order of the animals."""
+    sims = [
+        BioSim(island_map=GEOGRAPHY, ini_pop=_population(), seed=5, engine="vectorized")
+        for _ in range(2)
+    ]
+    for year in range(8):
+        _shuffle(sims[1].island, year)
+        for sim in sims:
+            sim.simulate(1, vis_years=None)
+    weights = [sorted(sim.island.get_state()["Herbivore"]["weight"]) for sim in sims]
+    assert weights[0] != weights[1]
+
+
+def test_reference_engine_has_no_streams():
+    """Test that random streams can not be used with the reference engine."""
+    with pytest.raises(ValueError):
+        BioSim(island_map=GEOGRAPHY, ini_pop=_population(), seed=5, random_streams=True)
+
+
+def test_streams_follow_forks_and_checkpoints(tmp_path):
+    """Test that forks and resumed checkpoints continue with the same streams."""
+    sim = BioSim(
+        island_map=GEOGRAPHY,
+        ini_pop=_population(),
+        seed=5,
+        engine="vectorized",
+        random_streams=True,
+    )
+    sim.simulate(3, vis_years=None)
+    fork = sim.fork()
+    other = sim.fork(seed=9)
+    name = str(tmp_path / "streams")
+    sim.save_simulation(name)
+    resumed = BioSim.resume_simulation(name, engine="vectorized")
+    assert resumed.get_state()["random_streams"] == 5
+
+    for copy in (sim, fork, other, resumed):
+        copy.simulate(4, vis_years=None)
+    assert np.array_equal(fork.island.count_grid(), sim.island.count_grid())
+    assert np.array_equal(resumed.island.count_grid(), sim.island.count_grid())
+    assert other.get_state()["random_streams"] == 9
+
+
+def test_streams_without_seed_can_be_made_again():
+    """Test that streams made without a seed keep the seed drawn for them."""
+    streams = RandomStreams(None)
+    again = RandomStreams(streams.seed)
+    assert again == streams
+    assert np.array_equal(again.key, streams.key)
+    assert np.array_equal(
+        again.generator(2, 3, "reproduce").random(4), streams.generator(2, 3, "reproduce").random(4)
+    )
+
+
+def test_checkpoint_without_seed_resumes_the_same_streams(tmp_path):
+    """Test that a simulation with streams from an unseeded RandomStreams resumes exactly."""
+    sim = BioSim(island_map=GEOGRAPHY, ini_pop=_population(), engine="vectorized")
+    sim._streams = sim.island.streams = RandomStreams(None)
+    sim.simulate(2, vis_years=None)
+    name = str(tmp_path / "unseeded")
+    sim.save_simulation(name)
+    resumed = BioSim.resume_simulation(name, engine="vectorized")
+    assert resumed.get_state()["random_streams"] == sim.get_state()["random_streams"]
+    for copy in (sim, resumed):
+        copy.simulate(3, vis_years=None)
+    assert np.array_equal(resumed.island.count_grid(), sim.island.count_grid())
+
+
+def test_streams_are_hashable():
+    """Test that equal streams have the same hash."""
+    assert hash(RandomStreams(3)) == hash(RandomStreams(3))
+    assert len({RandomStreams(3), RandomStreams(3), RandomStreams(4)}) == 2
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+import pytest
+from biosim.animals import Herbivore, Carnivore
+from biosim.profiler import PhaseProfiler
+from biosim.simulation import BioSim
+from biosim.threaded import PARAMETERS, ThreadedIsland, cells_kernel
+
+ISLAND_MAP = "WWWWWW\nWLLHLW\nWLDLHW\nWHLLLW\nWWWWWW"
+
+
+def _sim(threads, random_streams=False, seed=6, units_per_thread=4):
+    """Simulation with the threaded engine on all cells, using the given number of threads."""
+    ini_pop = [
+        {
+            "loc": (row, col),
+            "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0}] * 30
+            + [{"species": "Carnivore", "age": 5, "weight": 20.0}] * 5,
+        }
+        for row in (2, 3, 4)
+        for col in (2, 3, 4, 5)
+    ]
+    sim = BioSim(
+        island_map=ISLAND_MAP,
+        ini_pop=ini_pop,
+        seed=seed,
+        engine="threaded",
+        random_streams=random_streams,
+    )
+    sim.island.threads = threads
+    sim.island.min_animals = 0
+    sim.island.units_per_thread = units_per_thread
+    return sim
+
+
+def _params(species):
+    """Parameters of a species in the order of the kernel."""
+    return np.array([float(species.params.get(name) or 0.0) for name in PARAMETERS])
+
+
+@pytest.mark.parametrize("random_streams", [False, True])
+def test_same_result_for_any_number_of_threads(random_streams):
+    """Test that the simulation does not depend on the number of threads and work units."""
+    states = []
+    for threads, units_per_thread in ((1, 1), (2, 1), (2, 4), (5, 3)):
+        sim = _sim(threads, random_streams, units_per_thread=units_per_thread)
+        sim.simulate(4, vis_years=None)
+        states.append(sim.island.get_state())
+    for state in states[1:]:
+        for name in ("Herbivore", "Carnivore"):
+            for key in ("cell", "age", "weight"):
+                assert np.array_equal(state[name][key], states[0][name][key])
+        assert np.array_equal(state["food"], states[0]["food"])
+
+
+def test_threads_default_to_cores(mocker):
+    """Test that the number of threads is the number of cores unless it is set."""
+    mocker.patch("os.cpu_count", return_value=6)
+    island = ThreadedIsland("WWW\nWLW\nWWW")
+    assert island.num_threads == 6
+    island.threads = 2
+    assert island.num_threads == 2
+
+
+def test_kernel_does_one_cell():
+    """Test the kernel on one cell without carnivores, where no animal migrates or dies."""
+    herb_params = _params(Herbivore)
+    herb_params[PARAMETERS.index("mu")] = 0.0
+    herb_params[PARAMETERS.index("omega")] = 0.0
+    herb_params[PARAMETERS.index("gamma")] = 0.0
+    food = np.array([0.0, 25.0, 0.0])
+    result = cells_kernel(
+        np.array([1]),
+        np.array([1]),
+        np.array([0]),
+        np.array([3]),
+        np.array([0]),
+        np.array([0]),
+        food,
+        np.array([False, True, False]),
+        np.array([-1, 1]),
+        np.array([1, 2, 3]),
+        np.array([10.0, 10.0, 10.0]),
+        np.zeros(3, dtype=bool),
+        np.zeros(0, dtype=np.int64),
+        np.zeros(0),
+        np.zeros(0, dtype=bool),
+        herb_params,
+        _params(Carnivore),
+    )
+    cell, age, weight, moved = result[:4]
+    assert food[1] == 0.0
+    assert list(cell) == [1, 1, 1]
+    assert sorted(age) == [2, 3, 4]
+    eta, beta = Herbivore.params["eta"], Herbivore.params["beta"]
+    expected = sorted((10.0 + beta * eaten) * (1 - eta) for eaten in (10.0, 15.0, 0.0))
+    assert np.allclose(sorted(weight), expected)
+    assert not moved.any()
+    assert len(result[4]) == 0
+
+
+def test_cells_are_profiled():
+    """Test that the kernels of the threaded engine are profiled as one phase."""
+    sim = _sim(2)
+    sim.profiler = PhaseProfiler()
+    sim.simulate(2, vis_years=None)
+    assert "cycle_cells" in sim.profiler
+    assert "herbivore_eats" not in sim.profiler
+
+
+def test_work_is_balanced():
+    """Test that the cost of the cells is learned while the threads simulate."""
+    sim = _sim(3)
+    sim.simulate(3, vis_years=None)
+    factor = sim.island.costs.factor
+    assert factor.shape == (30,)
+    assert np.all(factor > 0)
+    assert not np.all(factor == 1)
+
+
+def test_settings_are_kept_by_forks_and_states():
+    """Test that the threads, min_animals, work units and learned costs are kept when the
+    island is replaced by set_state or fork."""
+    sim = _sim(3, units_per_thread=2)
+    sim.simulate(2, vis_years=None)
+    fork = sim.fork()
+    sim.set_state(sim.get_state())
+    for copy in (sim, fork):
+        assert copy.island.threads == 3
+        assert copy.island.min_animals == 0
+        assert copy.island.units_per_thread == 2
+        assert np.array_equal(copy.island.costs.factor, fork.island.costs.factor)
+    assert fork.island.costs is not sim.island.costs
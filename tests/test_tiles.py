@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+import pytest
+from biosim.simulation import BioSim
+from biosim.tiles import TiledSimulation, tile_bounds
+
+ISLAND_MAP = "WWWWWWW\nWLLHLLW\nWLDLHLW\nWHLLLDW\nWLLHLLW\nWWWWWWW"
+INI_POP = [
+    {
+        "loc": (row, col),
+        "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0}] * 20
+        + [{"species": "Carnivore", "age": 5, "weight": 20.0}] * 4,
+    }
+    for row, col in ((2, 2), (3, 4), (4, 5), (5, 3))
+]
+
+
+def test_tile_bounds():
+    """Test that the tiles cover the map without overlapping."""
+    bounds = tile_bounds((6, 7), (2, 3))
+    assert len(bounds) == 6
+    covered = np.zeros((6, 7), dtype=int)
+    for row_start, row_stop, col_start, col_stop in bounds:
+        covered[row_start:row_stop, col_start:col_stop] += 1
+    assert np.all(covered == 1)
+    assert bounds[0] == (0, 3, 0, 2)
+    with pytest.raises(ValueError):
+        tile_bounds((6, 7), (7, 1))
+
+
+@pytest.mark.parametrize("tiles", [(1, 1), (2, 2), (3, 2)])
+def test_tiles_give_same_result_as_one_island(tiles):
+    """Test that a tiled simulation is exactly the same as one process with random streams."""
+    sim = BioSim(
+        island_map=ISLAND_MAP, ini_pop=INI_POP, seed=8, engine="vectorized", random_streams=True
+    )
+    counts = []
+    for _ in range(6):
+        sim.simulate(1, vis_years=None)
+        counts.append(sim.num_animals_per_species)
+
+    with TiledSimulation(ISLAND_MAP, INI_POP, seed=8, tiles=tiles) as tiled:
+        tiled.simulate(6)
+        state = tiled.get_state()
+    assert [{"year": year, **count} for year, count in enumerate(counts, 1)] == tiled.history
+    assert tiled.year == 6
+    assert np.array_equal(tiled.count_grid(), sim.island.count_grid())
+
+    single = sim.island.get_state()
+    for name in ("Herbivore", "Carnivore"):
+        order = np.lexsort([single[name][key] for key in ("weight", "age", "cell")])
+        tiled_order = np.lexsort([state["island"][name][key] for key in ("weight", "age", "cell")])
+        for key in ("cell", "age", "weight"):
+            assert np.array_equal(state["island"][name][key][tiled_order], single[name][key][order])
+
+
+def test_state_continues_in_one_process():
+    """Test that the state of a tiled simulation is continued by BioSim like by the tiles."""
+    with TiledSimulation(ISLAND_MAP, INI_POP, seed=2, tiles=(2, 2), engine="threaded") as tiled:
+        tiled.simulate(2)
+        sim = BioSim(island_map=ISLAND_MAP, ini_pop=[], seed=1, engine="threaded")
+        sim.set_state(tiled.get_state())
+        tiled.simulate(3)
+    sim.simulate(3, vis_years=None)
+    assert sim.year == tiled.year == 5
+    assert np.array_equal(sim.island.count_grid(), tiled.count_grid())
+
+
+def test_invalid_tiled_simulations():
+    """Test that wrong engines, locations and populations give errors."""
+    with pytest.raises(ValueError):
+        TiledSimulation(ISLAND_MAP, INI_POP, seed=1, engine="reference")
+    with pytest.raises(ValueError):
+        TiledSimulation(ISLAND_MAP, [{"loc": (9, 1), "pop": []}], seed=1)
+    bad_pop = [{"loc": (2, 2), "pop": [{"species": "Herbivore", "age": -1, "weight": 5.0}]}]
+    with pytest.raises(RuntimeError):
+        TiledSimulation(ISLAND_MAP, bad_pop, seed=1)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+import pytest
+from biosim.animals import Carnivore
+from biosim.simulation import BioSim
+from biosim.validation import (
+    SCENARIOS,
+    cliffs_delta,
+    extinction_years,
+    main,
+    run_scenario,
+    validate_engine,
+)
+from biosim.vectorized import VectorizedIsland
+
+
+class StarvingIsland(VectorizedIsland):
+    """Engine where the food never grows."""
+
+    def _food_grows(self):
+        pass
+
+
+@pytest.fixture
+def scenario():
+    """Small scenario where carnivores are added after a few years."""
+    return {
+        "island_map": "WWWW\nWLLW\nWWWW",
+        "ini_pop": [
+            {
+                "loc": (2, 2),
+                "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0} for _ in range(20)],
+            }
+        ],
+        "years": 8,
+        "additions": {
+            3: [
+                {
+                    "loc": (2, 3),
+                    "pop": [{"species": "Carnivore", "age": 5, "weight": 20.0} for _ in range(5)],
+                }
+            ]
+        },
+        "parameters": {"Carnivore": {"F": 40.0}},
+    }
+
+
+def test_run_scenario(scenario):
+    """Test that a scenario is simulated for each seed, and that the parameters are set back."""
+    appetite = Carnivore.params["F"]
+    result = run_scenario(scenario, "vectorized", range(3))
+    assert Carnivore.params["F"] == appetite
+    assert result["counts"].shape == (3, 9, 2)
+    assert np.all(result["counts"][:, :4, 1] == 0)
+    assert np.all(result["counts"][:, 4, 1] > 0)
+    assert len(result["Herbivore"]["age"]) == result["counts"][:, -1, 0].sum()
+    assert np.all(result["Carnivore"]["fitness"] <= 1)
+
+
+def test_extinction_years():
+    """Test that a species is extinct the first year without animals after it had animals."""
+    counts = np.array([[[0, 0], [3, 0], [0, 2], [1, 0]], [[2, 0], [2, 0], [2, 0], [2, 1]]])
+    assert extinction_years(counts).tolist() == [[2, 3], [4, 4]]
+
+
+def test_cliffs_delta():
+    """Test Cliff's delta for separated, equal and mixed samples."""
+    assert cliffs_delta([4, 5, 6], [1, 2, 3]) == 1
+    assert cliffs_delta([1, 2, 3], [4, 5, 6]) == -1
+    assert cliffs_delta([1, 2], [1, 2]) == 0
+
+
+def test_same_engine_passes(scenario):
+    """Test that an engine compared with itself passes."""
+    report = validate_engine("vectorized", scenario, range(8), reference="vectorized", every=4)
+    assert report.passed
+    assert bool(report)
+    assert report.failures == []
+    frame = report.to_frame()
+    assert "Herbivore count, year 4" in frame.index
+    assert "Carnivore weight, last year" in frame.index
+    assert "PASSED" in str(report)
+
+
+def test_changed_ecology_fails(scenario, monkeypatch):
+    """Test that an engine where the food does not grow fails the validation."""
+    monkeypatch.setitem(BioSim.engines, "starving", StarvingIsland)
+    report = validate_engine("starving", scenario, range(8), reference="vectorized", every=4)
+    assert not report.passed
+    assert "Herbivore count, year 8" in [check["check"] for check in report.failures]
+    assert "FAILED" in str(report)
+
+
+def test_unknown_scenario():
+    """Test that an unknown scenario gives a KeyError."""
+    with pytest.raises(KeyError):
+        validate_engine("vectorized", "atlantis", range(2))
+
+
+def test_scenarios():
+    """Test that the named scenarios have the keys of a scenario."""
+    for make_scenario in SCENARIOS.values():
+        scenario = make_scenario()
+        assert set(scenario) == {"island_map", "ini_pop", "years", "additions", "parameters"}
+    assert SCENARIOS["check_sim"]()["years"] == 500
+
+
+def test_main(monkeypatch, capsys):
+    """Test that the command line interface prints the report and returns the exit status."""
+    monkeypatch.setitem(SCENARIOS, "default_geography", lambda: _tiny_scenario())
+    assert main(["vectorized", "--seeds", "3", "--reference", "vectorized"]) == 0
+    assert "vectorized against vectorized, 3 seeds" in capsys.readouterr().out
+
+
+def _tiny_scenario():
+    """One cell of herbivores for a few years."""
+    return {
+        "island_map": "WWW\nWLW\nWWW",
+        "ini_pop": [
+            {"loc": (2, 2), "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0}] * 10}
+        ],
+        "years": 3,
+        "additions": {},
+        "parameters": {},
+    }
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Johan Stabekk, Sabina Langås"
+__email__ = "johansta@nmbu.no, sabinal@nmbu.no"
+
+import numpy as np
+import pytest
+from biosim import compiled
+from biosim.animals import Herbivore
+from biosim.checkpoint import get_parameters, set_parameters
+from biosim.compiled import CompiledIsland
+from biosim.profiler import PhaseProfiler
+from biosim.simulation import BioSim
+from biosim.vectorized import VectorizedIsland
+
+ENGINES = ["reference", "vectorized", "compiled", "threaded"]
+
+
+def _population(loc, herbivores, carnivores=0):
+    """Population of one cell, with herbivores and carnivores of age 5 and weight 20."""
+    return [
+        {
+            "loc": loc,
+            "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0}] * herbivores
+            + [{"species": "Carnivore", "age": 5, "weight": 20.0}] * carnivores,
+        }
+    ]
+
+
+@pytest.fixture
+def params():
+    """Sets the parameters back after the test."""
+    params = get_parameters()
+    yield params
+    set_parameters(params)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_engines_run_simulations(engine):
+    """Test that all engines simulate, and that their statistics agree with each other."""
+    sim = BioSim(
+        island_map="WWWWW\nWLHLW\nWDLHW\nWWWWW",
+        ini_pop=_population((2, 2), 40, 10),
+        seed=3,
+        engine=engine,
+    )
+    sim.simulate(10, vis_years=None)
+    counts = sim.island.count_grid()
+    assert sim.engine == engine
+    assert sim.num_animals == counts.sum()
+    assert list(sim.num_animals_per_species.values()) == list(counts.sum(axis=(0, 1)))
+    assert counts[0].sum() == counts[-1].sum() == 0
+    assert sim.animal_distribution["Herbivore"].sum() == counts[..., 0].sum()
+    herbivores, carnivores = sim.island.fitness_age_weight
+    assert len(herbivores["age"]) == counts[..., 0].sum()
+    assert np.all((herbivores["fitness"] >= 0) & (herbivores["fitness"] <= 1))
+
+
+def test_unknown_engine():
+    """Test that an unknown engine gives a ValueError."""
+    with pytest.raises(ValueError):
+        BioSim(island_map="WWW\nWLW\nWWW", ini_pop=[], seed=1, engine="gpu")
+
+
+@pytest.mark.parametrize("island_class", [VectorizedIsland, CompiledIsland])
+def test_invalid_population(island_class):
+    """Test that the array engines check the population like the reference engine."""
+    island = island_class("WWW\nWLW\nWWW")
+    with pytest.raises(ValueError):
+        island.set_population_in_cell(_population((1, 1), 1))
+    with pytest.raises(ValueError):
+        island.set_population_in_cell(_population((4, 2), 1))
+    with pytest.raises(ValueError):
+        island.set_population_in_cell(
+            [{"loc": (2, 2), "pop": [{"species": "Herbivore", "age": -1, "weight": 5.0}]}]
+        )
+    with pytest.raises(ValueError):
+        island_class("WWW\nWLX\nWWW")
+
+
+@pytest.mark.parametrize("engine", ENGINES[1:])
+def test_state_moves_between_engines(engine):
+    """Test that the state of a simulation can be continued by another engine."""
+    sim = BioSim(island_map="WWWW\nWLHW\nWWWW", ini_pop=_population((2, 2), 20, 5), seed=2)
+    sim.simulate(3, vis_years=None)
+    state = sim.get_state()
+
+    fast = BioSim(island_map="WWW\nWLW\nWWW", ini_pop=[], seed=1, engine=engine)
+    fast.set_state(state)
+    assert isinstance(fast.island, VectorizedIsland)
+    assert fast.num_animals_per_species == sim.num_animals_per_species
+    assert np.array_equal(fast.island.count_grid(), sim.island.count_grid())
+
+    back = BioSim(island_map="WWW\nWLW\nWWW", ini_pop=[], seed=1)
+    back.set_state(fast.get_state())
+    assert back.num_animals_per_species == sim.num_animals_per_species
+
+
+@pytest.mark.parametrize("engine", ENGINES[1:])
+def test_fast_engines_are_reproducible(engine):
+    """Test that a seed and a fork give the same simulation with the array engines."""
+    sims = [
+        BioSim(
+            island_map="WWWW\nWLHW\nWWWW",
+            ini_pop=_population((2, 2), 30, 5),
+            seed=4,
+            engine=engine,
+        )
+        for _ in range(2)
+    ]
+    fork = sims[0].fork()
+    for sim in sims + [fork]:
+        sim.simulate(5, vis_years=None)
+    assert sims[0].num_animals_per_species == sims[1].num_animals_per_species
+    assert fork.num_animals_per_species == sims[0].num_animals_per_species
+    assert fork.engine == engine
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_migration_follows_order_of_cells(engine, params):
+    """Test that an animal that migrates to an earlier cell does not age that year, and that an
+    animal that migrates to a later cell ages once, like in the reference engine."""
+    Herbivore.set_params({"mu": 100.0, "omega": 0.0, "gamma": 0.0, "eta": 0.0})
+    for seed in range(8):
+        sim = BioSim(
+            island_map="WWWW\nWLLW\nWLLW\nWWWW",
+            ini_pop=_population((2, 3), 1) + _population((3, 2), 1),
+            seed=seed,
+            engine=engine,
+        )
+        sim.simulate(1, vis_years=None)
+        state = sim.island.get_state()["Herbivore"]
+        for cell, age in zip(state["cell"], state["age"]):
+            assert age == (5 if cell == 5 else 6)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_engines_agree_on_one_cell(engine):
+    """Test that the mean populations of a cell without migration agree between the engines."""
+    means = []
+    for seed in range(10):
+        sim = BioSim(
+            island_map="WWW\nWLW\nWWW",
+            ini_pop=_population((2, 2), 50, 20),
+            seed=seed,
+            engine=engine,
+        )
+        sim.simulate(15, vis_years=None)
+        means.append(list(sim.num_animals_per_species.values()))
+    herbivores, carnivores = np.mean(means, axis=0)
+    assert 25 < herbivores < 50
+    assert 30 < carnivores < 46
+
+
+def test_profiler_with_vectorized_engine():
+    """Test that the phases of the array engines are profiled."""
+    sim = BioSim(
+        island_map="WWWW\nWLHW\nWWWW",
+        ini_pop=_population((2, 2), 20, 5),
+        seed=5,
+        engine="vectorized",
+    )
+    sim.profiler = PhaseProfiler()
+    sim.simulate(3, vis_years=None)
+    for phase in ("food_grows", "herbivore_eats", "carnivore_eats", "migrate_animals"):
+        assert phase in sim.profiler
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_population_export(engine):
+    """Test that the population is exported as arrays and as a DataFrame by all engines, and
+    that the array engines do not copy the ages and weights."""
+    sim = BioSim(
+        island_map="WWWWW\nWLHLW\nWWWWW",
+        ini_pop=_population((2, 3), 20, 5),
+        seed=2,
+        engine=engine,
+    )
+    sim.simulate(2, vis_years=None)
+    arrays = sim.population_arrays()
+    state = sim.island.get_state()
+    for name in ("Herbivore", "Carnivore"):
+        for key in ("cell", "age", "weight"):
+            assert np.array_equal(arrays[name][key], state[name][key])
+
+    frame = sim.population_frame("Carnivore")
+    assert list(frame.columns) == ["row", "col", "age", "weight", "fitness"]
+    assert len(frame) == sim.num_animals_per_species["Carnivore"]
+    assert set(frame["row"]) <= {2} and set(frame["col"]) <= {2, 3, 4}
+    assert np.all((frame["fitness"] >= 0) & (frame["fitness"] <= 1))
+    if engine != "reference":
+        weights = sim.island._animals["Carnivore"]["weight"]
+        assert np.shares_memory(frame["weight"].to_numpy(), weights)
+        with pytest.raises(ValueError):
+            arrays["Herbivore"]["weight"][0] = 1.0
+    with pytest.raises(ValueError):
+        sim.population_frame("Omnivore")
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_population_frame_indented_map(engine):
+    """Test that the DataFrame gives the locations of the animals on an indented map, like
+    BioSim.default_geography."""
+    sim = BioSim(
+        island_map=BioSim.default_geography,
+        ini_pop=_population((4, 4), 10, 3),
+        seed=2,
+        engine=engine,
+    )
+    for species in ("Herbivore", "Carnivore"):
+        frame = sim.population_frame(species)
+        assert set(frame["row"]) == {4} and set(frame["col"]) == {4}
+
+
+def test_compiled_hunt_without_shared_cells(monkeypatch):
+    """Test that the compiled engine with random streams does a diagonal with both species, but
+    no cell with both, without indexing the empty seeds. The kernel is run as Python, which
+    checks the bounds."""
+    monkeypatch.setattr(compiled, "hunt_kernel", compiled.hunt_kernel.py_func)
+    sim = BioSim(
+        island_map="WWWWW\nWLLLW\nWLLLW\nWLLLW\nWWWWW",
+        ini_pop=_population((2, 3), 10) + _population((3, 2), 0, 5),
+        seed=3,
+        engine="compiled",
+        random_streams=True,
+    )
+    weights = sim.island._animals["Carnivore"]["weight"].copy()
+    cells = {name: dict(animals) for name, animals in sim.island._animals.items()}
+    sim.island._carnivores_eat(cells)
+    assert np.array_equal(sim.island._animals["Carnivore"]["weight"], weights)
+    sim.simulate(2, vis_years=None)
+
+
+@pytest.mark.parametrize("engine", ENGINES[1:])
+def test_resume_uses_engine_of_checkpoint(engine, tmp_path):
+    """Test that a checkpoint is resumed with the engine it was saved with, and continues like
+    the simulation that was saved."""
+    sim = BioSim(
+        island_map="WWWWW\nWLLHW\nWLDLW\nWWWWW",
+        ini_pop=_population((2, 2), 30, 5),
+        seed=6,
+        engine=engine,
+        random_streams=True,
+    )
+    sim.simulate(2, vis_years=None)
+    name = str(tmp_path / "sim")
+    sim.save_simulation(name)
+    resumed = BioSim.resume_simulation(name)
+    assert resumed.engine == engine
+    for copy in (sim, resumed):
+        copy.simulate(3, vis_years=None)
+    assert np.array_equal(resumed.island.count_grid(), sim.island.count_grid())
+    weights = [copy.island.get_state()["Herbivore"]["weight"] for copy in (sim, resumed)]
+    assert np.array_equal(weights[0], weights[1])